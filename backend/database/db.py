@@ -1,5 +1,6 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 import os
 from dotenv import load_dotenv
 
@@ -18,7 +19,9 @@ if DATABASE_TYPE == "mysql":
     DB_NAME = os.getenv("DB_NAME", "scanner_eyes")
     
     DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    ASYNC_DATABASE_URL = f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     engine = create_engine(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True)
 elif DATABASE_TYPE == "postgresql":
     # PostgreSQL configuration
     DB_USER = os.getenv("DB_USER", "postgres")
@@ -28,15 +31,22 @@ elif DATABASE_TYPE == "postgresql":
     DB_NAME = os.getenv("DB_NAME", "iot_scanner")
     
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     engine = create_engine(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True)
 else:
     # SQLite configuration (for development)
     DATABASE_URL = "sqlite:///./scanner.db"
+    ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./scanner.db"
     engine = create_engine(
         DATABASE_URL, connect_args={"check_same_thread": False}
     )
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# Async sessions for read-heavy routers so slow queries don't block the event loop.
+# expire_on_commit=False keeps loaded rows usable after commit without lazy IO.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Dependency to get database session
@@ -46,3 +56,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,13 @@
+"""Dialect helpers shared by the write paths that rely on native upserts."""
+
+
+def dialect_insert(db):
+    """Return (dialect_name, insert) where insert supports ON CONFLICT / ON DUPLICATE KEY"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return dialect, insert
@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from .models import Base
 from .db import DATABASE_URL
+from .migrations import run_migrations
 
 def init_database():
     """Initialize the database with all tables"""
@@ -10,6 +11,9 @@ def init_database():
     # Create all tables
     Base.metadata.create_all(bind=engine)
     
+    # Bring existing tables up to date with the models
+    run_migrations(engine)
+    
     print("Database initialized successfully!")
 
 if __name__ == "__main__":
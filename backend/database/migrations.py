@@ -0,0 +1,164 @@
+"""
+Lightweight, idempotent schema migrations.
+
+create_all() only creates missing tables, so columns and indexes added to
+existing tables are brought up to date here. Every step checks the live
+schema first and is safe to run on each startup.
+"""
+
+from sqlalchemy import inspect, text, select, func, delete, update
+
+from .models import Vulnerability, ScanResult, Suggestion, Device
+
+
+def _columns(engine, table_name):
+    return {column["name"] for column in inspect(engine).get_columns(table_name)}
+
+
+def _indexes(engine, table_name):
+    return {index["name"] for index in inspect(engine).get_indexes(table_name)}
+
+
+def _create_missing_indexes(engine, table):
+    existing = _indexes(engine, table.name)
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(bind=engine)
+
+
+def _add_column(conn, table_name, column):
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"))
+
+
+def migrate_vulnerability_dedup(engine):
+    """Add first_seen/last_seen/occurrence_count and collapse duplicate findings"""
+    table = Vulnerability.__table__
+    existing = _columns(engine, table.name)
+
+    with engine.begin() as conn:
+        for name in ("first_seen", "last_seen", "occurrence_count"):
+            if name not in existing:
+                _add_column(conn, table.name, table.c[name])
+
+        conn.execute(
+            update(table)
+            .where(table.c.first_seen.is_(None))
+            .values(first_seen=table.c.detected_at)
+        )
+        conn.execute(
+            update(table)
+            .where(table.c.last_seen.is_(None))
+            .values(last_seen=table.c.detected_at)
+        )
+        conn.execute(
+            update(table)
+            .where(table.c.occurrence_count.is_(None))
+            .values(occurrence_count=1)
+        )
+
+    if "uq_vulnerability_finding" in _indexes(engine, table.name):
+        _create_missing_indexes(engine, table)
+        return
+
+    key = (table.c.ip, table.c.port, table.c.vulnerability_type)
+    with engine.begin() as conn:
+        duplicates = conn.execute(
+            select(*key).group_by(*key).having(func.count() > 1)
+        ).all()
+
+        for ip, port, vulnerability_type in duplicates:
+            rows = conn.execute(
+                select(table)
+                .where(table.c.ip == ip, table.c.port == port, table.c.vulnerability_type == vulnerability_type)
+                .order_by(table.c.detected_at, table.c.id)
+            ).all()
+            keep, latest = rows[0], rows[-1]
+            conn.execute(
+                update(table)
+                .where(table.c.id == keep.id)
+                .values(
+                    first_seen=keep.detected_at,
+                    last_seen=latest.detected_at,
+                    occurrence_count=sum(row.occurrence_count or 1 for row in rows),
+                    description=latest.description,
+                    severity=latest.severity,
+                    status=latest.status,
+                    fixed_at=latest.fixed_at,
+                )
+            )
+            conn.execute(delete(table).where(table.c.id.in_([row.id for row in rows[1:]])))
+
+    _create_missing_indexes(engine, table)
+
+
+def migrate_scan_result_indexes(engine):
+    """Create scan_results indexes added after the table was first created"""
+    _create_missing_indexes(engine, ScanResult.__table__)
+
+
+def migrate_scan_result_device_count(engine, batch_size=500):
+    """Add scan_results.device_count and backfill it from the stored device lists"""
+    table = ScanResult.__table__
+    if "device_count" not in _columns(engine, table.name):
+        with engine.begin() as conn:
+            _add_column(conn, table.name, table.c.device_count)
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.result)
+                .where(table.c.device_count.is_(None))
+                .limit(batch_size)
+            ).all()
+            for row in rows:
+                conn.execute(
+                    update(table)
+                    .where(table.c.id == row.id)
+                    .values(device_count=len(row.result or []))
+                )
+        if len(rows) < batch_size:
+            break
+
+
+def migrate_scan_result_codec_column(engine):
+    """
+    Switch scan_results.result from a native JSON column to a binary one.
+
+    SQLite stores bytes in any column, so only PostgreSQL and MySQL need DDL.
+    Existing rows keep their plain JSON bytes (still readable) until
+    scripts/migrate_result_codec.py compresses them.
+    """
+    column = next(c for c in inspect(engine).get_columns("scan_results") if c["name"] == "result")
+    type_name = type(column["type"]).__name__.upper()
+    if "JSON" not in type_name and "TEXT" not in type_name:
+        return
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(
+                "ALTER TABLE scan_results ALTER COLUMN result TYPE BYTEA "
+                "USING convert_to(result::text, 'UTF8')"
+            ))
+        elif engine.dialect.name == "mysql":
+            conn.execute(text("ALTER TABLE scan_results MODIFY result LONGBLOB"))
+
+
+def migrate_suggestion_indexes(engine):
+    """Create suggestions indexes added after the table was first created"""
+    _create_missing_indexes(engine, Suggestion.__table__)
+
+
+def migrate_device_indexes(engine):
+    """Create devices indexes added after the table was first created"""
+    _create_missing_indexes(engine, Device.__table__)
+
+
+def run_migrations(engine):
+    """Apply all migrations in order"""
+    migrate_vulnerability_dedup(engine)
+    migrate_scan_result_indexes(engine)
+    migrate_scan_result_codec_column(engine)
+    migrate_scan_result_device_count(engine)
+    migrate_suggestion_indexes(engine)
+    migrate_device_indexes(engine)
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Date, JSON, Text, Boolean, Index
+from sqlalchemy.orm import deferred
 from datetime import datetime
 from .db import Base
-import hashlib
-import secrets
+from .types import CompressedJSON
+from .passwords import hash_password, verify_password
 
 class User(Base):
     __tablename__ = "users"
@@ -18,39 +19,54 @@ class User(Base):
     
     def set_password(self, password: str):
         """Hash and set the user's password"""
-        salt = secrets.token_hex(16)
-        pwd_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000)
-        self.hashed_password = f"{salt}:{pwd_hash.hex()}"
+        self.hashed_password = hash_password(password)
     
     def check_password(self, password: str) -> bool:
         """Check if the provided password matches the user's password"""
-        if not self.hashed_password or ':' not in self.hashed_password:
-            return False
-        
-        salt, stored_hash = self.hashed_password.split(':')
-        pwd_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000)
-        return pwd_hash.hex() == stored_hash
+        return verify_password(password, self.hashed_password)
 
 class ScanResult(Base):
     __tablename__ = "scan_results"
+    __table_args__ = (
+        Index("ix_scan_results_type_timestamp", "scan_type", "timestamp"),
+        Index("ix_scan_results_timestamp_id", "timestamp", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     ip = Column(String, index=True)
     ports = Column(String)  # JSON string of ports
-    result = Column(JSON)   # Scan results
+    # Compressed device list; deferred so it is only fetched and decoded when read
+    result = deferred(Column(CompressedJSON))
     timestamp = Column(DateTime, default=datetime.utcnow)
     scan_type = Column(String, default="full_scan")  # full_scan, quick_scan, etc.
     status = Column(String, default="completed")  # completed, failed, in_progress
+    device_count = Column(Integer, default=0)  # len(result), so listings can skip the blob
 
 class Suggestion(Base):
     __tablename__ = "suggestions"
+    __table_args__ = (
+        Index("ix_suggestions_created_at_id", "created_at", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     vulnerability_type = Column(String, index=True)  # RTSP, FTP, Telnet, etc.
     suggestion_text = Column(Text)
     severity = Column(String)  # Critical, High, Medium, Low
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class SuggestionRequestCount(Base):
+    """Suggestion requests served per category, added in batches by services.suggestions"""
+    __tablename__ = "suggestion_request_counts"
+    category = Column(String(50), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    last_requested = Column(DateTime, nullable=True)
+
 class Vulnerability(Base):
     __tablename__ = "vulnerabilities"
+    # One row per finding; repeated detections update last_seen/occurrence_count
+    __table_args__ = (
+        Index("uq_vulnerability_finding", "ip", "port", "vulnerability_type", unique=True),
+        # Covers the /analytics range aggregates without touching the table
+        Index("ix_vulnerabilities_detected_severity_status", "detected_at", "severity", "status"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     ip = Column(String, index=True)
     port = Column(Integer)
@@ -60,3 +76,143 @@ class Vulnerability(Base):
     status = Column(String, default="open")  # open, fixed, ignored
     detected_at = Column(DateTime, default=datetime.utcnow)
     fixed_at = Column(DateTime, nullable=True)
+    first_seen = Column(DateTime, default=datetime.utcnow)
+    last_seen = Column(DateTime, default=datetime.utcnow, index=True)
+    occurrence_count = Column(Integer, default=1)
+
+class VulnerabilityRollup(Base):
+    """
+    Hourly and daily finding counts per severity, bucketed by detected_at.
+
+    detected counts findings first detected in the bucket; fixed counts those
+    of them that are currently fixed. Maintained on every insert and status
+    change by services.rollups.
+    """
+    __tablename__ = "vulnerability_rollups"
+    __table_args__ = (
+        Index("uq_vulnerability_rollup", "granularity", "bucket_start", "severity", unique=True),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(4), nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)  # naive UTC
+    severity = Column(String(20), nullable=False)
+    detected = Column(Integer, default=0, nullable=False)
+    fixed = Column(Integer, default=0, nullable=False)
+
+class DeviceScore(Base):
+    """
+    Running per-device finding tallies and weighted severity sum, maintained
+    with the vulnerability rollups. Scores are derived from these at read time.
+    """
+    __tablename__ = "device_scores"
+    ip = Column(String(45), primary_key=True)
+    critical = Column(Integer, default=0, nullable=False)
+    high = Column(Integer, default=0, nullable=False)
+    medium = Column(Integer, default=0, nullable=False)
+    low = Column(Integer, default=0, nullable=False)
+    total = Column(Integer, default=0, nullable=False)
+    fixed = Column(Integer, default=0, nullable=False)
+    weighted = Column(Integer, default=0, nullable=False, index=True)
+
+class ScanDeviceDailyRollup(Base):
+    """Per-device daily summary of scan_results rows removed by the retention job"""
+    __tablename__ = "scan_device_daily_rollups"
+    __table_args__ = (
+        Index("uq_scan_device_daily", "day", "scan_type", "ip", unique=True),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    scan_type = Column(String(50), nullable=False)
+    ip = Column(String(45), nullable=False)
+    device_type = Column(String(100))
+    times_seen = Column(Integer, default=0)
+    max_open_ports = Column(Integer, default=0)
+    max_risk_level = Column(String(20))  # Critical, High, Medium, Low
+    vulnerability_count = Column(Integer, default=0)
+
+class ScanSeverityDailyRollup(Base):
+    """Per-severity daily finding counts of scan_results rows removed by the retention job"""
+    __tablename__ = "scan_severity_daily_rollups"
+    __table_args__ = (
+        Index("uq_scan_severity_daily", "day", "scan_type", "severity", unique=True),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    scan_type = Column(String(50), nullable=False)
+    severity = Column(String(20), nullable=False)
+    findings = Column(Integer, default=0)
+
+class Device(Base):
+    """Latest known state of each device, updated incrementally by every scan"""
+    __tablename__ = "devices"
+    __table_args__ = (
+        # Covers the per-type breakdown (GROUP BY device_type joined on ip)
+        Index("ix_devices_type_ip", "device_type", "ip"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    ip = Column(String(45), unique=True, index=True, nullable=False)
+    mac = Column(String(17), unique=True, index=True, nullable=True)  # preferred key once known
+    device_name = Column(String(150))
+    device_type = Column(String(100), index=True)
+    risk_level = Column(String(20), index=True)  # Critical, High, Medium, Low
+    open_ports = Column(JSON)  # sorted list of open port numbers
+    status = Column(String(20), default="Active")
+    first_seen = Column(DateTime, default=datetime.utcnow, index=True)
+    last_seen = Column(DateTime, default=datetime.utcnow, index=True)
+    last_scan_id = Column(Integer, nullable=True)
+
+class DeviceChange(Base):
+    """Append-only log of inventory changes (appeared, port_opened, port_closed, ...)"""
+    __tablename__ = "device_changes"
+    __table_args__ = (
+        Index("ix_device_changes_detected_at_id", "detected_at", "id"),
+        Index("ix_device_changes_type_detected_at", "change_type", "detected_at"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, index=True, nullable=False)
+    ip = Column(String(45), index=True)
+    change_type = Column(String(30), nullable=False)  # appeared, port_opened, port_closed, risk_changed, type_changed, ip_changed
+    old_value = Column(String(150), nullable=True)
+    new_value = Column(String(150), nullable=True)
+    scan_id = Column(Integer, nullable=True)
+    detected_at = Column(DateTime, default=datetime.utcnow)
+
+class DataGeneration(Base):
+    """
+    Monotonic counters bumped by write paths in the same transaction as the
+    write. Every API worker reads them to invalidate its local caches.
+    """
+    __tablename__ = "data_generations"
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+
+
+class RateLimitCounter(Base):
+    """
+    Request counts per client and fixed window, used by the rate limiter's
+    database backend so limits hold across API workers. Rows older than the
+    previous window are deleted as the limiter goes.
+    """
+    __tablename__ = "rate_limit_counters"
+    __table_args__ = (
+        Index("ix_rate_limit_counters_window", "window_seconds", "window_index"),
+    )
+    key = Column(String(160), primary_key=True)
+    window_seconds = Column(Integer, primary_key=True)
+    window_index = Column(BigInteger, primary_key=True)  # epoch seconds // window_seconds
+    count = Column(Integer, default=0, nullable=False)
+
+
+class RemediationCache(Base):
+    """
+    Remediation advice generated by the AI backend, keyed by a hash of the
+    normalized (issue, device type, model), so the same advice is never
+    paid for twice. Written once per key and shared by every worker.
+    """
+    __tablename__ = "remediation_cache"
+    cache_key = Column(String(64), primary_key=True)  # sha256 hex
+    model = Column(String(100), nullable=False)
+    device_type = Column(String(100), nullable=True)
+    issue = Column(Text, nullable=False)
+    response = Column(JSON, nullable=False)  # suggestion, steps, priority
+    created_at = Column(DateTime, default=datetime.utcnow)
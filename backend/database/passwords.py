@@ -0,0 +1,77 @@
+"""
+Password hash format for users.hashed_password.
+
+Hashes are stored as pbkdf2_<digest>$<iterations>$<salt>$<hash>, so the
+parameters can change over time; verify_and_update() tells the login path
+when a stored hash should be upgraded to the current parameters. The
+original salt:hash format (sha256, 100,000 iterations) is still accepted.
+
+These are the plain, blocking primitives; request handlers go through
+services.passwords, which runs them on a bounded pool.
+"""
+
+import hashlib
+import hmac
+import os
+import secrets
+from typing import Optional, Tuple
+
+PASSWORD_HASH_ALGORITHM = os.getenv("PASSWORD_HASH_ALGORITHM", "sha256")
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "100000"))
+
+LEGACY_ALGORITHM = "sha256"
+LEGACY_ITERATIONS = 100000
+
+
+def _derive(password: str, salt: str, algorithm: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac(algorithm, password.encode("utf-8"), salt.encode("utf-8"), iterations).hex()
+
+
+def _parse(stored: str) -> Optional[Tuple[str, int, str, str]]:
+    """Split a stored hash into (algorithm, iterations, salt, hash)"""
+    if not stored:
+        return None
+    if stored.startswith("pbkdf2_"):
+        try:
+            scheme, iterations, salt, digest = stored.split("$")
+            return scheme[len("pbkdf2_"):], int(iterations), salt, digest
+        except ValueError:
+            return None
+    if ":" in stored:
+        salt, digest = stored.split(":", 1)
+        return LEGACY_ALGORITHM, LEGACY_ITERATIONS, salt, digest
+    return None
+
+
+def hash_password(password: str, algorithm: str = None, iterations: int = None) -> str:
+    """Hash a password with the configured (or given) parameters"""
+    algorithm = algorithm or PASSWORD_HASH_ALGORITHM
+    iterations = iterations or PASSWORD_HASH_ITERATIONS
+    salt = secrets.token_hex(16)
+    return f"pbkdf2_{algorithm}${iterations}${salt}${_derive(password, salt, algorithm, iterations)}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Check a password against a stored hash in constant time"""
+    parsed = _parse(stored)
+    if parsed is None:
+        return False
+    algorithm, iterations, salt, digest = parsed
+    return hmac.compare_digest(_derive(password, salt, algorithm, iterations), digest)
+
+
+def needs_rehash(stored: str) -> bool:
+    """Whether a stored hash uses other parameters than the current ones"""
+    parsed = _parse(stored)
+    return parsed is None or parsed[:2] != (PASSWORD_HASH_ALGORITHM, PASSWORD_HASH_ITERATIONS)
+
+
+def verify_and_update(password: str, stored: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; on success also return a new hash if the parameters changed"""
+    if not verify_password(password, stored):
+        return False, None
+    return True, hash_password(password) if needs_rehash(stored) else None
+
+
+# Verified against when the user does not exist, so unknown emails take as long as wrong passwords
+_DUMMY_HASH = hash_password(secrets.token_hex(16))
@@ -52,10 +52,16 @@ class VulnerabilityOut(VulnerabilityBase):
     id: int
     detected_at: datetime
     fixed_at: Optional[datetime]
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+    occurrence_count: Optional[int] = None
 
     class Config:
         orm_mode = True
 
+class VulnerabilityStatusUpdate(BaseModel):
+    status: str  # open, fixed, ignored
+
 # API Request/Response Schemas
 class ScanRequest(BaseModel):
     ip: str
@@ -82,3 +88,24 @@ class AssistantResponse(BaseModel):
     suggestion: str
     steps: List[str]
     priority: str
+
+class AssistantFixRequest(BaseModel):
+    vulnerability_type: Optional[str] = None
+    description: Optional[str] = None
+    device_ip: Optional[str] = None
+    device_type: Optional[str] = None
+
+class AssistantFixResponse(BaseModel):
+    suggestion: str
+    fix_steps: List[str]
+    priority: str
+    source: str  # ai or template
+
+class AssistantBatchRequest(BaseModel):
+    issues: List[AssistantRequest]
+
+class AssistantBatchItem(AssistantResponse):
+    category: str
+
+class AssistantBatchResponse(BaseModel):
+    results: List[AssistantBatchItem]
@@ -0,0 +1,105 @@
+"""
+Custom column types.
+
+CompressedJSON stores JSON documents as compressed bytes behind a small
+header so the codec can change without rewriting old rows:
+
+    b"SEJ" | version (1 byte) | codec (1 byte) | compressed UTF-8 JSON
+
+Values written before the column was compressed (plain JSON text, or
+already-parsed JSON from a native JSON column) are still read transparently.
+"""
+
+import json
+import os
+import zlib
+
+from sqlalchemy.types import TypeDecorator, LargeBinary
+from sqlalchemy.dialects.mysql import LONGBLOB
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+MAGIC = b"SEJ"
+FORMAT_VERSION = 1
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+CODECS = {"zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+RESULT_CODEC = os.getenv("RESULT_CODEC", "zlib")
+RESULT_COMPRESSION_LEVEL = int(os.getenv("RESULT_COMPRESSION_LEVEL", "6"))
+
+
+def _codec_id(codec: str) -> int:
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec}")
+    if codec == "zstd" and zstandard is None:
+        raise ValueError("zstd codec requires the 'zstandard' package")
+    return CODECS[codec]
+
+
+def encode_json(value, codec: str = None, level: int = None) -> bytes:
+    """Serialize value to JSON and compress it behind the versioned header"""
+    codec_id = _codec_id(codec or RESULT_CODEC)
+    level = RESULT_COMPRESSION_LEVEL if level is None else level
+    raw = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+
+    if codec_id == CODEC_ZSTD:
+        payload = zstandard.ZstdCompressor(level=level).compress(raw)
+    else:
+        payload = zlib.compress(raw, level)
+    return MAGIC + bytes([FORMAT_VERSION, codec_id]) + payload
+
+
+def is_encoded(data) -> bool:
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:3]) == MAGIC
+
+
+def decode_json(data):
+    """Inverse of encode_json; legacy uncompressed values are parsed as plain JSON"""
+    if data is None:
+        return None
+    if isinstance(data, (list, dict)):
+        return data
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    if isinstance(data, str):
+        return json.loads(data)
+    if not is_encoded(data):
+        return json.loads(data.decode("utf-8"))
+
+    version, codec_id = data[3], data[4]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported payload version: {version}")
+    payload = data[5:]
+    if codec_id == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd payload requires the 'zstandard' package")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec_id == CODEC_ZLIB:
+        raw = zlib.decompress(payload)
+    else:
+        raise ValueError(f"Unknown codec id: {codec_id}")
+    return json.loads(raw)
+
+
+class CompressedJSON(TypeDecorator):
+    """JSON column stored as compressed bytes (bytea / LONGBLOB / BLOB)"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "mysql":
+            # Plain BLOB tops out at 64KB, device lists are larger than that
+            return dialect.type_descriptor(LONGBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_json(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_json(value)
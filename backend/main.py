@@ -10,11 +10,25 @@ from routers import scan, suggestions, vulnerabilities, assistant, analytics, au
 from routers import device
 from routers import net
 from database.init_db import init_database
+from database.db import SessionLocal
+from services.rollups import backfill_if_missing
+from services.user_cache import user_cache
+from services.passwords import password_hasher
+from services.rate_limit import RateLimitMiddleware, rate_limit_stats
+from services.suggestions import suggestion_counter
+from services.assistant import cache_metrics as assistant_cache_metrics
+from services.ai_bot import remediation_service
+from services.device_probe import device_prober
 
 app = FastAPI(title="IoT Security Scanner API")
 
 # Initialize database
 init_database()
+# Databases that predate the vulnerability rollups get them built once
+backfill_if_missing(SessionLocal)
+
+# Per-client rate limits (added first so CORS headers also reach 429 responses)
+app.add_middleware(RateLimitMiddleware, token_subject=auth.token_subject)
 
 # Enable CORS
 app.add_middleware(
@@ -23,6 +37,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After"],
 )
 
 # Include routers
@@ -43,6 +58,20 @@ def read_root():
 def health_check():
     return {"status": "healthy", "service": "IoT Security Scanner"}
 
+@app.get("/metrics")
+def metrics():
+    """In-process cache and worker pool counters for this worker"""
+    return {
+        "auth_user_cache": user_cache.metrics(),
+        "analytics_cache": analytics.analytics_cache.metrics(),
+        "password_hasher": dict(password_hasher.stats),
+        "rate_limit": dict(rate_limit_stats),
+        "suggestion_counter": dict(suggestion_counter.stats),
+        "assistant_cache": assistant_cache_metrics(),
+        "ai_remediation": remediation_service.metrics(),
+        "device_probe": device_prober.metrics(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
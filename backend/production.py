@@ -98,6 +98,10 @@ LOGGING_CONFIG = {
 # Rate Limiting
 RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
 RATE_LIMIT_PER_HOUR = int(os.getenv("RATE_LIMIT_PER_HOUR", "1000"))
+# Scans, logins and exports have their own, smaller budget
+RATE_LIMIT_SCAN_PER_MINUTE = int(os.getenv("RATE_LIMIT_SCAN_PER_MINUTE", "10"))
+RATE_LIMIT_SCAN_PER_HOUR = int(os.getenv("RATE_LIMIT_SCAN_PER_HOUR", "100"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # opt-in "database" shares limits across workers, one write per request
 
 # Security Headers
 SECURITY_HEADERS = {
@@ -114,6 +118,17 @@ BACKUP_SCHEDULE = os.getenv("BACKUP_SCHEDULE", "0 2 * * *")  # Daily at 2 AM
 BACKUP_RETENTION_DAYS = int(os.getenv("BACKUP_RETENTION_DAYS", "30"))
 BACKUP_PATH = os.getenv("BACKUP_PATH", "/backups")
 
+# Retention Settings (scan_results older than the policy are rolled up and archived)
+RETENTION_DEFAULT_DAYS = int(os.getenv("RETENTION_DEFAULT_DAYS", "90"))
+RETENTION_POLICIES = os.getenv("RETENTION_POLICIES", "auto_scan:14,quick_scan:30")  # scan_type:days, 0 keeps forever
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH", "/backups/archive")
+
+# Parquet export (day-partitioned history for offline analysis)
+PARQUET_EXPORT_PATH = os.getenv("PARQUET_EXPORT_PATH", "/backups/parquet")
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "50000"))
+PARQUET_READ_CHUNK_SIZE = int(os.getenv("PARQUET_READ_CHUNK_SIZE", "500"))  # rows loaded per query
+
 # Monitoring Settings
 HEALTH_CHECK_INTERVAL = int(os.getenv("HEALTH_CHECK_INTERVAL", "300"))  # 5 minutes
 METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
@@ -130,6 +145,10 @@ NOTIFICATION_EMAIL = os.getenv("NOTIFICATION_EMAIL", "")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
 OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "1000"))
+# OpenAI-compatible endpoint for the remediation service (default: the OpenAI API)
+AI_BOT_BASE_URL = os.getenv("AI_BOT_BASE_URL", "")
+AI_BOT_TIMEOUT = float(os.getenv("AI_BOT_TIMEOUT", "30"))
+AI_BOT_MAX_CONCURRENCY = int(os.getenv("AI_BOT_MAX_CONCURRENCY", "4"))
 
 # Scan Settings
 MAX_CONCURRENT_SCANS = int(os.getenv("MAX_CONCURRENT_SCANS", "5"))
@@ -1,146 +1,217 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, select
+from datetime import date, datetime, timedelta
 from io import StringIO
-from database.db import get_db
-from database.models import ScanResult, Vulnerability, Suggestion
+import csv
+import gzip
+import json
+from database.db import get_async_db, AsyncSessionLocal
+from database.models import ScanResult, DeviceScore, Device
+from services.rollups import rollup_range_query
+from services.cache import AsyncTTLCache
+from services.generations import get_generation
+from services.conditional import make_etag, check_etag
+from services.export import EXPORT_DATASETS, EXPORT_FORMATS, export_fields, iter_export_rows, stream_export
+from services.columnar_export import export_parquet, read_watermark, PARQUET_EXPORT_PATH
+from services.scoring import SEVERITY_WEIGHTS, calculate_security_score, device_score_out
 from typing import Optional
 from pytz import utc
+import os
+import threading
+import time
 
-router = APIRouter(prefix="/analytics", tags=["analytics"])
+router = APIRouter(tags=["analytics"])
+
+RANGE_DAYS = {"7d": 7, "30d": 30, "90d": 90, "1y": 365}
+SEVERITIES = ("Critical", "High", "Medium", "Low")
+SCAN_HISTORY_LIMIT = 100
+
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "60"))
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "64"))
+
+# Keyed by (range, generation): scan and vulnerability writes bump the
+# generation in the database, which invalidates entries in every worker
+analytics_cache = AsyncTTLCache(max_entries=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+
+def get_range_bounds(range: str):
+    """Return (start_date, end_date) in UTC for a 7d/30d/90d/1y range (default 7d)"""
+    end_date = datetime.utcnow().replace(tzinfo=utc)
+    return end_date - timedelta(days=RANGE_DAYS.get(range, 7)), end_date
+
+async def summarize_vulnerabilities(db: AsyncSession, start_date: datetime, end_date: datetime):
+    """
+    Severity totals, fixed count and daily trends for findings detected in range.
+
+    Reads the hourly/daily rollups, so the cost depends on the number of
+    buckets in the range rather than on the size of the vulnerabilities table.
+    """
+    severity_counts = dict.fromkeys(SEVERITIES, 0)
+    total = 0
+    fixed = 0
+    trends = {}
+    for bucket, _, severity, detected, fixed_count in (await db.execute(
+        rollup_range_query(start_date, end_date)
+    )).all():
+        total += detected
+        fixed += fixed_count
+        if severity not in SEVERITIES:
+            continue
+        severity_counts[severity] += detected
+        counts = trends.setdefault(bucket.date().isoformat(), {"critical": 0, "high": 0, "medium": 0, "low": 0})
+        counts[severity.lower()] += detected
+    return {
+        "severity_counts": severity_counts,
+        "total": total,
+        "fixed": fixed,
+        "trends": [{"date": day, **counts} for day, counts in sorted(trends.items())],
+    }
+
+async def device_type_breakdown(db: AsyncSession):
+    """
+    Device and unresolved-finding counts per device type, from the inventory.
+
+    One indexed aggregate over devices joined to the per-device score tallies,
+    so it reflects the latest state of each device without reading scan blobs.
+    """
+    rows = (await db.execute(
+        select(
+            Device.device_type,
+            func.count(Device.id),
+            func.coalesce(func.sum(DeviceScore.total - DeviceScore.fixed), 0),
+        )
+        .select_from(Device)
+        .outerjoin(DeviceScore, DeviceScore.ip == Device.ip)
+        .group_by(Device.device_type)
+    )).all()
+    breakdown = [
+        {"type": device_type or "Unknown", "count": count, "vulnerabilities": int(vulnerabilities)}
+        for device_type, count, vulnerabilities in rows
+    ]
+    return sorted(breakdown, key=lambda item: (-item["count"], item["type"]))
 
 @router.get("/")
 async def get_analytics(
+    request: Request,
+    response: Response,
     range: str = Query("7d", description="Time range: 7d, 30d, 90d, 1y"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get comprehensive analytics data from the database"""
     try:
-        end_date = datetime.utcnow().replace(tzinfo=utc)
-        if range == "7d":
-            start_date = end_date - timedelta(days=7)
-        elif range == "30d":
-            start_date = end_date - timedelta(days=30)
-        elif range == "90d":
-            start_date = end_date - timedelta(days=90)
-        elif range == "1y":
-            start_date = end_date - timedelta(days=365)
-        else:
-            start_date = end_date - timedelta(days=7)
-
-        scans = db.query(ScanResult).filter(ScanResult.timestamp >= start_date, ScanResult.timestamp <= end_date).order_by(ScanResult.timestamp.desc()).all()
-        total_scans = len(scans)
-        scan_history = [
-            {
-                "id": scan.id,
-                "type": scan.scan_type,
-                "status": scan.status,
-                "devices_found": len(scan.result) if scan.result else 0,
-                "vulnerabilities_found": 0,
-                "timestamp": scan.timestamp.astimezone(utc).isoformat() if scan.timestamp else None
-            }
-            for scan in scans
-        ]
-        vulns = db.query(Vulnerability).filter(Vulnerability.detected_at >= start_date, Vulnerability.detected_at <= end_date).all()
-        total_vulns = len(vulns)
-        critical_vulns = sum(1 for v in vulns if v.severity == "Critical")
-        high_vulns = sum(1 for v in vulns if v.severity == "High")
-        medium_vulns = sum(1 for v in vulns if v.severity == "Medium")
-        low_vulns = sum(1 for v in vulns if v.severity == "Low")
-        fixed_vulns = sum(1 for v in vulns if v.status == "fixed")
-        recent_activity = [
-            {
-                "id": scan.id,
-                "type": "scan",
-                "description": f"{scan.scan_type.capitalize()} scan completed",
-                "timestamp": scan.timestamp.astimezone(utc).isoformat() if scan.timestamp else None,
-                "severity": "info"
-            }
-            for scan in scans[:5]
-        ]
-        device_types = []
-        trends = {}
-        for v in vulns:
-            day = v.detected_at.astimezone(utc).date().isoformat() if v.detected_at else None
-            if not day:
-                continue
-            if day not in trends:
-                trends[day] = {"critical": 0, "high": 0, "medium": 0, "low": 0}
-            if v.severity == "Critical":
-                trends[day]["critical"] += 1
-            elif v.severity == "High":
-                trends[day]["high"] += 1
-            elif v.severity == "Medium":
-                trends[day]["medium"] += 1
-            elif v.severity == "Low":
-                trends[day]["low"] += 1
-        vulnerability_trends = [
-            {"date": day, **counts} for day, counts in sorted(trends.items())
-        ]
-        max_score = max(1, total_vulns + fixed_vulns)
-        score = max(0, 100 - ((critical_vulns * 10 + high_vulns * 7 + medium_vulns * 4 + low_vulns * 1) / (max_score * 10) * 100))
-        analytics_data = {
-            "totalScans": total_scans,
-            "totalVulnerabilities": total_vulns,
-            "criticalVulnerabilities": critical_vulns,
-            "highVulnerabilities": high_vulns,
-            "mediumVulnerabilities": medium_vulns,
-            "lowVulnerabilities": low_vulns,
-            "fixedVulnerabilities": fixed_vulns,
-            "securityScore": int(score),
-            "recentActivity": recent_activity,
-            "vulnerabilityTrends": vulnerability_trends,
-            "deviceTypes": device_types,
-            "scanHistory": scan_history
-        }
-        return analytics_data
+        if range not in RANGE_DAYS:
+            range = "7d"
+        # Ranges slide with the clock, so the ETag also turns over once per cache
+        # TTL (every second when ANALYTICS_CACHE_TTL=0 disables the cache)
+        window = int(time.time() // max(ANALYTICS_CACHE_TTL, 1))
+        etag = make_etag("analytics", range, await get_generation(db), window)
+        not_modified = check_etag(request, response, etag)
+        if not_modified:
+            return not_modified
+        return await get_cached_analytics(db, range)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analytics error: {str(e)}")
 
-@router.get("/export")
-async def export_analytics(
-    format: str = Query("pdf", description="Export format: pdf, csv, json"),
-    range: str = Query("7d", description="Time range: 7d, 30d, 90d, 1y")
-):
-    """Export analytics data in various formats"""
-    try:
-        # Get analytics data
-        analytics_data = await get_analytics(range)
-        
-        if format == "json":
-            return {
-                "content": json.dumps(analytics_data, indent=2),
-                "filename": f"security_report_{datetime.now().strftime('%Y%m%d')}.json",
-                "content_type": "application/json"
-            }
-        
-        elif format == "csv":
-            # Create CSV content
-            output = StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow(["Metric", "Value"])
-            writer.writerow(["Total Scans", analytics_data["totalScans"]])
-            writer.writerow(["Total Vulnerabilities", analytics_data["totalVulnerabilities"]])
-            writer.writerow(["Critical Vulnerabilities", analytics_data["criticalVulnerabilities"]])
-            writer.writerow(["High Vulnerabilities", analytics_data["highVulnerabilities"]])
-            writer.writerow(["Medium Vulnerabilities", analytics_data["mediumVulnerabilities"]])
-            writer.writerow(["Low Vulnerabilities", analytics_data["lowVulnerabilities"]])
-            writer.writerow(["Fixed Vulnerabilities", analytics_data["fixedVulnerabilities"]])
-            writer.writerow(["Security Score", analytics_data["securityScore"]])
-            
-            return {
-                "content": output.getvalue(),
-                "filename": f"security_report_{datetime.now().strftime('%Y%m%d')}.csv",
-                "content_type": "text/csv"
-            }
-        
-        elif format == "pdf":
-            # For PDF, we'll return a simple text representation
-            # In production, you'd use a library like reportlab or weasyprint
-            pdf_content = f"""
+async def get_cached_analytics(db: AsyncSession, range: str):
+    """The /analytics payload for a range, recomputed only after a write"""
+    if range not in RANGE_DAYS:
+        range = "7d"
+    generation = await get_generation(db)
+    return await analytics_cache.get_or_compute((range, generation), lambda: _build_analytics_own_session(range))
+
+async def _build_analytics_own_session(range: str):
+    # Runs detached from the request (and is shared by coalesced callers),
+    # so it must not use the request's session, which closes with the request
+    async with AsyncSessionLocal() as db:
+        return await build_analytics(db, range)
+
+async def build_analytics(db: AsyncSession, range: str):
+    """Compute the /analytics payload for a range"""
+    start_date, end_date = get_range_bounds(range)
+    in_scan_range = (ScanResult.timestamp >= start_date, ScanResult.timestamp <= end_date)
+
+    total_scans = (await db.execute(
+        select(func.count()).select_from(ScanResult).filter(*in_scan_range)
+    )).scalar_one()
+    scans = (await db.execute(
+        select(ScanResult.id, ScanResult.scan_type, ScanResult.status, ScanResult.device_count, ScanResult.timestamp)
+        .filter(*in_scan_range)
+        .order_by(ScanResult.timestamp.desc())
+        .limit(SCAN_HISTORY_LIMIT)
+    )).all()
+    scan_history = [
+        {
+            "id": scan.id,
+            "type": scan.scan_type,
+            "status": scan.status,
+            "devices_found": scan.device_count or 0,
+            "vulnerabilities_found": 0,
+            "timestamp": scan.timestamp.astimezone(utc).isoformat() if scan.timestamp else None
+        }
+        for scan in scans
+    ]
+
+    summary = await summarize_vulnerabilities(db, start_date, end_date)
+    severity_counts = summary["severity_counts"]
+    total_vulns = summary["total"]
+    fixed_vulns = summary["fixed"]
+    critical_vulns = severity_counts["Critical"]
+    high_vulns = severity_counts["High"]
+    medium_vulns = severity_counts["Medium"]
+    low_vulns = severity_counts["Low"]
+
+    recent_activity = [
+        {
+            "id": scan.id,
+            "type": "scan",
+            "description": f"{scan.scan_type.capitalize()} scan completed",
+            "timestamp": scan.timestamp.astimezone(utc).isoformat() if scan.timestamp else None,
+            "severity": "info"
+        }
+        for scan in scans[:5]
+    ]
+    device_types = await device_type_breakdown(db)
+
+    vulnerability_trends = summary["trends"]
+
+    return {
+        "totalScans": total_scans,
+        "totalVulnerabilities": total_vulns,
+        "criticalVulnerabilities": critical_vulns,
+        "highVulnerabilities": high_vulns,
+        "mediumVulnerabilities": medium_vulns,
+        "lowVulnerabilities": low_vulns,
+        "fixedVulnerabilities": fixed_vulns,
+        "securityScore": calculate_security_score(critical_vulns, high_vulns, medium_vulns, low_vulns, fixed_vulns, total_vulns),
+        "recentActivity": recent_activity,
+        "vulnerabilityTrends": vulnerability_trends,
+        "deviceTypes": device_types,
+        "scanHistory": scan_history
+    }
+
+def _summary_export(analytics_data, format: str, range: str):
+    """Render the /analytics summary as (content, extension, content_type)"""
+    if format == "json":
+        return json.dumps(analytics_data, indent=2), "json", "application/json"
+
+    if format == "csv":
+        output = StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["Metric", "Value"])
+        writer.writerow(["Total Scans", analytics_data["totalScans"]])
+        writer.writerow(["Total Vulnerabilities", analytics_data["totalVulnerabilities"]])
+        writer.writerow(["Critical Vulnerabilities", analytics_data["criticalVulnerabilities"]])
+        writer.writerow(["High Vulnerabilities", analytics_data["highVulnerabilities"]])
+        writer.writerow(["Medium Vulnerabilities", analytics_data["mediumVulnerabilities"]])
+        writer.writerow(["Low Vulnerabilities", analytics_data["lowVulnerabilities"]])
+        writer.writerow(["Fixed Vulnerabilities", analytics_data["fixedVulnerabilities"]])
+        writer.writerow(["Security Score", analytics_data["securityScore"]])
+        return output.getvalue(), "csv", "text/csv"
+
+    # For PDF, we'll return a simple text representation
+    # In production, you'd use a library like reportlab or weasyprint
+    pdf_content = f"""
 Security Report - {datetime.now().strftime('%Y-%m-%d')}
 Generated for range: {range}
 
@@ -156,66 +227,139 @@ SUMMARY:
 
 DEVICE TYPES:
 """
-            for device in analytics_data["deviceTypes"]:
-                pdf_content += f"- {device['type']}: {device['count']} devices, {device['vulnerabilities']} vulnerabilities\n"
-            
-            return {
-                "content": pdf_content,
-                "filename": f"security_report_{datetime.now().strftime('%Y%m%d')}.txt",
-                "content_type": "text/plain"
-            }
-        
-        else:
+    for device in analytics_data["deviceTypes"]:
+        pdf_content += f"- {device['type']}: {device['count']} devices, {device['vulnerabilities']} vulnerabilities\n"
+    return pdf_content, "txt", "text/plain"
+
+@router.get("/export")
+async def export_analytics(
+    format: str = Query("pdf", description="Export format: pdf, csv, json (summary); csv, ndjson, json (datasets)"),
+    range: str = Query("7d", description="Time range: 7d, 30d, 90d, 1y, all (datasets only)"),
+    dataset: str = Query("summary", description="summary, scans, devices, vulnerabilities"),
+    compress: bool = Query(False, alias="gzip", description="Gzip-compress the download"),
+    include_results: bool = Query(False, description="Include each scan's device list (scans dataset, json/ndjson)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Export the analytics summary, or stream a full dataset, as a file download"""
+    stamp = datetime.now().strftime('%Y%m%d')
+
+    if dataset == "summary":
+        if format not in ("pdf", "csv", "json"):
             raise HTTPException(status_code=400, detail="Unsupported export format")
-            
+        try:
+            analytics_data = await get_cached_analytics(db, range)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Export error: {str(e)}")
+        content, extension, content_type = _summary_export(analytics_data, format, range)
+        filename = f"security_report_{stamp}.{extension}"
+        body = content.encode("utf-8")
+        if compress:
+            body = gzip.compress(body)
+            filename += ".gz"
+            content_type = "application/gzip"
+        return Response(
+            content=body,
+            media_type=content_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=400, detail="Unsupported export dataset")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+
+    start_date = end_date = None
+    if range != "all":
+        start_date, end_date = get_range_bounds(range)
+    include_results = include_results and format != "csv"
+    rows = iter_export_rows(dataset, start_date, end_date, include_results=include_results)
+    filename = f"{dataset}_{range}_{stamp}.{format}"
+    content_type = EXPORT_FORMATS[format]
+    if compress:
+        filename += ".gz"
+        content_type = "application/gzip"
+    # The generator is synchronous, so Starlette iterates it in the threadpool
+    return StreamingResponse(
+        stream_export(rows, export_fields(dataset, include_results), format, gzip=compress),
+        media_type=content_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+_parquet_export_lock = threading.Lock()
+
+@router.post("/export/parquet")
+def export_parquet_history(
+    since: Optional[date] = Query(None, description="Re-export from this day instead of the watermark"),
+    until: Optional[date] = Query(None, description="Stop before this day (default: today)")
+):
+    """Write day-partitioned Parquet files for the complete days since the last export"""
+    if not _parquet_export_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A Parquet export is already running")
+    try:
+        return export_parquet(PARQUET_EXPORT_PATH, since=since, until=until)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Parquet export error: {str(e)}")
+    finally:
+        _parquet_export_lock.release()
+
+@router.get("/export/parquet")
+def get_parquet_watermark():
+    """Last day exported per source"""
+    return {"path": PARQUET_EXPORT_PATH, "watermark": read_watermark(PARQUET_EXPORT_PATH)}
 
 @router.get("/security-score")
-async def get_security_score():
-    """Calculate and return the current security score"""
+async def get_security_score(
+    range: str = Query("7d", description="Time range: 7d, 30d, 90d, 1y"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Current security score for a range, the same one /analytics reports"""
     try:
-        # Mock calculation (replace with actual logic)
-        total_vulns = 15
-        critical_vulns = 3
-        high_vulns = 5
-        medium_vulns = 4
-        low_vulns = 3
-        fixed_vulns = 8
-        
-        # Calculate score (simplified algorithm)
-        total_weight = critical_vulns * 10 + high_vulns * 7 + medium_vulns * 4 + low_vulns * 1
-        max_possible = (total_vulns + fixed_vulns) * 10
-        score = max(0, 100 - (total_weight / max_possible * 100))
-        
+        analytics_data = await get_cached_analytics(db, range)
         return {
-            "score": int(score),
+            "score": analytics_data["securityScore"],
             "breakdown": {
-                "critical_weight": critical_vulns * 10,
-                "high_weight": high_vulns * 7,
-                "medium_weight": medium_vulns * 4,
-                "low_weight": low_vulns * 1,
-                "fixed_count": fixed_vulns
+                "critical_weight": analytics_data["criticalVulnerabilities"] * SEVERITY_WEIGHTS["Critical"],
+                "high_weight": analytics_data["highVulnerabilities"] * SEVERITY_WEIGHTS["High"],
+                "medium_weight": analytics_data["mediumVulnerabilities"] * SEVERITY_WEIGHTS["Medium"],
+                "low_weight": analytics_data["lowVulnerabilities"] * SEVERITY_WEIGHTS["Low"],
+                "fixed_count": analytics_data["fixedVulnerabilities"]
             }
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Security score calculation error: {str(e)}")
 
+@router.get("/security-score/devices")
+async def get_device_scores(
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Per-device security scores, worst first"""
+    rows = (await db.execute(
+        select(DeviceScore)
+        .filter(DeviceScore.total > 0)
+        .order_by(DeviceScore.weighted.desc(), DeviceScore.ip)
+        .limit(limit)
+    )).scalars().all()
+    return {"devices": [device_score_out(row) for row in rows]}
+
+@router.get("/security-score/devices/{ip}")
+async def get_device_score(ip: str, db: AsyncSession = Depends(get_async_db)):
+    """Security score of one device"""
+    row = await db.get(DeviceScore, ip)
+    if row is None:
+        raise HTTPException(status_code=404, detail="No findings recorded for this device")
+    return device_score_out(row)
+
 @router.get("/trends")
-async def get_vulnerability_trends(range: str = Query("7d")):
-    """Get vulnerability trends over time"""
+async def get_vulnerability_trends(
+    range: str = Query("7d", description="Time range: 7d, 30d, 90d, 1y"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get daily vulnerability counts per severity over a range"""
     try:
-        # Mock trend data (replace with actual database queries)
-        trends = [
-            {"date": "2024-01-09", "critical": 2, "high": 3, "medium": 2, "low": 1},
-            {"date": "2024-01-10", "critical": 3, "high": 4, "medium": 3, "low": 2},
-            {"date": "2024-01-11", "critical": 3, "high": 5, "medium": 4, "low": 2},
-            {"date": "2024-01-12", "critical": 2, "high": 4, "medium": 3, "low": 2},
-            {"date": "2024-01-13", "critical": 3, "high": 5, "medium": 4, "low": 3},
-            {"date": "2024-01-14", "critical": 3, "high": 5, "medium": 4, "low": 3},
-            {"date": "2024-01-15", "critical": 3, "high": 5, "medium": 4, "low": 3}
-        ]
-        
-        return {"trends": trends}
+        analytics_data = await get_cached_analytics(db, range)
+        return {"trends": analytics_data["vulnerabilityTrends"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Trends error: {str(e)}")
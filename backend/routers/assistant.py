@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from database import models, schemas, db
 from typing import List
-import random
+import os
+from services.assistant import AI_RESPONSES, classify_issue
+from services.ai_bot import remediation_service, AIBotUnavailable
 
 router = APIRouter()
 
@@ -14,93 +18,53 @@ def get_db():
     finally:
         db_session.close()
 
-# AI-like response templates
-AI_RESPONSES = {
-    "weak_password": {
-        "suggestion": "I've detected a weak password vulnerability. This is a critical security issue that needs immediate attention.",
-        "steps": [
-            "1. Change the default password immediately",
-            "2. Use a strong password with at least 12 characters",
-            "3. Include uppercase, lowercase, numbers, and special characters",
-            "4. Avoid common words or patterns",
-            "5. Consider using a password manager"
-        ],
-        "priority": "Critical"
-    },
-    "open_port": {
-        "suggestion": "I found an open port that could be a security risk. Let's secure this immediately.",
-        "steps": [
-            "1. Identify if the port is necessary for device operation",
-            "2. Close unnecessary ports using firewall rules",
-            "3. Restrict port access to specific IP addresses",
-            "4. Monitor port access logs regularly",
-            "5. Consider using a VPN for remote access"
-        ],
-        "priority": "High"
-    },
-    "default_credentials": {
-        "suggestion": "Default credentials detected! This is one of the most common attack vectors for IoT devices.",
-        "steps": [
-            "1. Change default username and password immediately",
-            "2. Use unique credentials for each device",
-            "3. Enable two-factor authentication if available",
-            "4. Document credentials securely",
-            "5. Regularly rotate passwords"
-        ],
-        "priority": "Critical"
-    },
-    "firmware": {
-        "suggestion": "Your device firmware appears to be outdated. This could expose you to known vulnerabilities.",
-        "steps": [
-            "1. Check manufacturer's website for latest firmware",
-            "2. Download firmware from official sources only",
-            "3. Backup current configuration before updating",
-            "4. Test firmware update in safe environment",
-            "5. Schedule regular firmware update checks"
-        ],
-        "priority": "High"
-    },
-    "general": {
-        "suggestion": "I can help you improve your IoT device security. Let me provide some general recommendations.",
-        "steps": [
-            "1. Perform regular security audits",
-            "2. Keep all devices updated",
-            "3. Use strong, unique passwords",
-            "4. Enable security features like encryption",
-            "5. Monitor network traffic for anomalies"
-        ],
-        "priority": "Medium"
-    }
-}
+ASSISTANT_BATCH_LIMIT = int(os.getenv("ASSISTANT_BATCH_LIMIT", "1000"))
+
+def build_response(category: str) -> dict:
+    response = AI_RESPONSES[category]
+    return {"suggestion": response["suggestion"], "steps": response["steps"], "priority": response["priority"]}
 
 @router.post("/", response_model=schemas.AssistantResponse)
-def ai_fix_assistant(request: schemas.AssistantRequest, db: Session = Depends(get_db)):
+def ai_fix_assistant(request: schemas.AssistantRequest):
     """AI assistant for fixing vulnerabilities"""
-    
-    issue_lower = request.issue.lower()
-    
-    # Determine the type of issue
-    if any(word in issue_lower for word in ["password", "credential", "login"]):
-        response_type = "weak_password"
-    elif any(word in issue_lower for word in ["port", "open", "exposed"]):
-        response_type = "open_port"
-    elif any(word in issue_lower for word in ["default", "factory"]):
-        response_type = "default_credentials"
-    elif any(word in issue_lower for word in ["firmware", "update", "version"]):
-        response_type = "firmware"
-    else:
-        response_type = "general"
-    
-    response = AI_RESPONSES[response_type]
-    
-    # Store the interaction in database (optional)
-    # You could add a new model for assistant interactions if needed
-    
-    return schemas.AssistantResponse(
-        suggestion=response["suggestion"],
-        steps=response["steps"],
-        priority=response["priority"]
-    )
+    return build_response(classify_issue(request.issue))
+
+@router.post("/batch", response_model=schemas.AssistantBatchResponse)
+def ai_fix_assistant_batch(request: schemas.AssistantBatchRequest):
+    """Classify many issues in one call; results are in request order"""
+    if len(request.issues) > ASSISTANT_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {ASSISTANT_BATCH_LIMIT} issues per batch")
+    results = []
+    for item in request.issues:
+        category = classify_issue(item.issue)
+        results.append({**build_response(category), "category": category})
+    return {"results": results}
+
+@router.post("/fix", response_model=schemas.AssistantFixResponse)
+async def get_fix_steps(request: schemas.AssistantFixRequest, db_session: AsyncSession = Depends(db.get_async_db)):
+    """Remediation steps for one finding, from the AI backend when configured, else the templates"""
+    issue = " - ".join(part for part in (request.vulnerability_type, request.description) if part)
+    if not issue:
+        raise HTTPException(status_code=400, detail="vulnerability_type or description is required")
+
+    device_type = request.device_type
+    if device_type is None and request.device_ip:
+        device_type = (await db_session.execute(
+            select(models.Device.device_type).filter(models.Device.ip == request.device_ip)
+        )).scalar_one_or_none()
+
+    try:
+        advice = await remediation_service.remediate(issue, device_type)
+        source = "ai"
+    except AIBotUnavailable:
+        advice = build_response(classify_issue(issue))
+        source = "template"
+    return {
+        "suggestion": advice["suggestion"],
+        "fix_steps": advice["steps"],
+        "priority": advice["priority"],
+        "source": source,
+    }
 
 @router.get("/quick-fixes")
 def get_quick_fixes(db: Session = Depends(get_db)):
@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
 import os
 from dotenv import load_dotenv
 
-from database.db import get_db
+from database.db import get_db, get_async_db
 from database.models import User
+from services.passwords import password_hasher, PasswordHasherBusy
+from services.user_cache import CachedUser, get_cached_user, invalidate_user
 from schemas.auth import UserCreate, UserLogin, UserResponse, Token, PasswordReset, PasswordResetConfirm
 
 load_dotenv()
@@ -44,8 +48,26 @@ def verify_token(token: str, credentials_exception):
     except jwt.PyJWTError:
         raise credentials_exception
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get current authenticated user"""
+def token_subject(token: str) -> Optional[str]:
+    """Email a valid token was issued for, or None"""
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except jwt.PyJWTError:
+        return None
+
+async def run_hasher(operation, *args):
+    """Run a password hasher operation, answering 503 when the hash pool is saturated"""
+    try:
+        return await operation(*args)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CachedUser:
+    """Get current authenticated user (a cached snapshot of the row)"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -53,16 +75,16 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     )
     
     email = verify_token(token, credentials_exception)
-    user = db.query(User).filter(User.email == email).first()
+    user = await get_cached_user(email)
     if user is None:
         raise credentials_exception
     return user
 
 @router.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user.email).first()
+    existing_user = (await db.execute(select(User.id).filter(User.email == user.email))).first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -76,21 +98,26 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         is_active=True,
         is_verified=False
     )
-    db_user.set_password(user.password)
+    db_user.hashed_password = await run_hasher(password_hasher.hash, user.password)
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_user(db_user.email)
     
     return db_user
 
 @router.post("/login", response_model=Token)
-def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login user and return access token"""
     # Find user by email
-    user = db.query(User).filter(User.email == user_credentials.email).first()
+    user = (await db.execute(select(User).filter(User.email == user_credentials.email))).scalars().first()
     
-    if not user or not user.check_password(user_credentials.password):
+    # Unknown emails are checked against a dummy hash so they take as long as wrong passwords
+    valid, new_hash = await run_hasher(
+        password_hasher.verify_and_update, user_credentials.password, user.hashed_password if user else None
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -103,9 +130,14 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
             detail="Inactive user account"
         )
     
+    # Upgrade the stored hash if the hashing parameters changed
+    if new_hash:
+        user.hashed_password = new_hash
+    
     # Update last login
     user.last_login = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    invalidate_user(user.email)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -120,42 +152,44 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: CachedUser = Depends(get_current_user)):
     """Get current user information"""
     return current_user
 
 @router.put("/me", response_model=UserResponse)
-def update_current_user(
+async def update_current_user(
     name: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user information"""
     if name is not None:
-        current_user.name = name
+        await db.execute(update(User).where(User.id == current_user.id).values(name=name))
+        await db.commit()
+        invalidate_user(current_user.email)
     
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    return await db.get(User, current_user.id)
 
 @router.post("/change-password")
-def change_password(
+async def change_password(
     current_password: str,
     new_password: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Change user password"""
     # Verify current password
-    if not current_user.check_password(current_password):
+    if not await run_hasher(password_hasher.verify, current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
     # Set new password
-    current_user.set_password(new_password)
-    db.commit()
+    hashed_password = await run_hasher(password_hasher.hash, new_password)
+    await db.execute(update(User).where(User.id == current_user.id).values(hashed_password=hashed_password))
+    await db.commit()
+    invalidate_user(current_user.email)
     
     return {"message": "Password changed successfully"}
 
@@ -179,21 +213,22 @@ def reset_password(reset_data: PasswordResetConfirm, db: Session = Depends(get_d
     return {"message": "Password reset successfully"}
 
 @router.delete("/me")
-def delete_account(
+async def delete_account(
     password: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete user account"""
     # Verify password
-    if not current_user.check_password(password):
+    if not await run_hasher(password_hasher.verify, password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password is incorrect"
         )
     
     # Deactivate account instead of deleting
-    current_user.is_active = False
-    db.commit()
+    await db.execute(update(User).where(User.id == current_user.id).values(is_active=False))
+    await db.commit()
+    invalidate_user(current_user.email)
     
     return {"message": "Account deactivated successfully"}
@@ -1,6 +1,14 @@
 # routers/device.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import List, Optional
+
+from database.db import get_async_db
+from database.models import Device, DeviceChange
+from services.device_probe import device_prober
 
 router = APIRouter()
 
@@ -8,21 +16,86 @@ router = APIRouter()
 class DeviceScanRequest(BaseModel):
     ip: str
     port: int = 554  # Default RTSP port
+    refresh: bool = False  # bypass the cached result
+
+class DeviceOut(BaseModel):
+    id: int
+    ip: str
+    mac: Optional[str] = None
+    device_name: Optional[str] = None
+    device_type: Optional[str] = None
+    risk_level: Optional[str] = None
+    open_ports: List[int] = []
+    status: Optional[str] = None
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class DeviceChangeOut(BaseModel):
+    id: int
+    device_id: int
+    ip: Optional[str] = None
+    change_type: str
+    old_value: Optional[str] = None
+    new_value: Optional[str] = None
+    scan_id: Optional[int] = None
+    detected_at: datetime
+
+    class Config:
+        from_attributes = True
 
-# Example response when scanning a device
 @router.post("/scan")
-def scan_device(request: DeviceScanRequest):
+async def scan_device(request: DeviceScanRequest):
     """
-    Simulates scanning a single device (IP camera).
-    Later we’ll extend this to check RTSP, ONVIF, etc.
+    Deep probe of a single device (IP camera): camera ports, RTSP
+    OPTIONS/DESCRIBE, HTTP headers and ONVIF device info, run concurrently
+    under a per-device deadline. Results are cached per (ip, port) for a
+    short TTL unless refresh is set.
     """
-    result = {
-        "ip": request.ip,
-        "port": request.port,
-        "status": "open",   # Placeholder: later we’ll run a real check
-        "vulnerabilities": [
-            "Weak/default password possible",
-            "RTSP stream not encrypted"
-        ]
-    }
-    return result
+    if not 1 <= request.port <= 65535:
+        raise HTTPException(status_code=400, detail=f"invalid port {request.port}")
+    try:
+        return await device_prober.probe(request.ip, request.port, refresh=request.refresh)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"invalid IP address {request.ip}")
+
+@router.get("/inventory", response_model=List[DeviceOut])
+async def get_inventory(
+    device_type: Optional[str] = Query(None, description="Filter by device type, e.g. 'IP Camera (RTSP)'"),
+    risk_level: Optional[str] = Query(None, description="Filter by risk level"),
+    seen_since: Optional[datetime] = Query(None, description="Only devices seen at or after this time"),
+    first_seen_since: Optional[datetime] = Query(None, description="Only devices that appeared at or after this time"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Current state of every known device"""
+    query = select(Device).order_by(Device.last_seen.desc()).limit(limit)
+    if device_type:
+        query = query.filter(Device.device_type == device_type)
+    if risk_level:
+        query = query.filter(Device.risk_level == risk_level)
+    if seen_since:
+        query = query.filter(Device.last_seen >= seen_since)
+    if first_seen_since:
+        query = query.filter(Device.first_seen >= first_seen_since)
+    return (await db.execute(query)).scalars().all()
+
+@router.get("/changes", response_model=List[DeviceChangeOut])
+async def get_device_changes(
+    since: Optional[datetime] = Query(None, description="Only changes at or after this time"),
+    change_type: Optional[str] = Query(None, description="appeared, port_opened, port_closed, risk_changed, type_changed, ip_changed"),
+    ip: Optional[str] = Query(None),
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Inventory change log, newest first"""
+    query = select(DeviceChange).order_by(DeviceChange.detected_at.desc(), DeviceChange.id.desc()).limit(limit)
+    if since:
+        query = query.filter(DeviceChange.detected_at >= since)
+    if change_type:
+        query = query.filter(DeviceChange.change_type == change_type)
+    if ip:
+        query = query.filter(DeviceChange.ip == ip)
+    return (await db.execute(query)).scalars().all()
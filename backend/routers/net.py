@@ -1,31 +1,85 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import subprocess
+from typing import List
+
+from services.firewall import firewall, FirewallError, ACTION_TARGETS, TARGET_ACTIONS
 
 router = APIRouter()
 
+PROTOCOLS = ("tcp", "udp")
+
 class PortRule(BaseModel):
     port: int
     action: str  # "open" or "close"
     proto: str = "tcp"
 
-def run(cmd):
-    p = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    return p.returncode, p.stdout.strip(), p.stderr.strip()
+class PortRuleBatch(BaseModel):
+    rules: List[PortRule]
+    replace: bool = False  # also remove managed rules for ports not listed
+    dry_run: bool = False
+    refresh: bool = False  # dry_run only: re-read iptables instead of using the cached snapshot
+
+def desired_state(rules: List[PortRule]):
+    """Validate rules into {(proto, port): target}"""
+    desired = {}
+    for rule in rules:
+        if rule.action not in ACTION_TARGETS:
+            raise ValueError("action must be open|close")
+        if not 1 <= rule.port <= 65535:
+            raise ValueError(f"invalid port {rule.port}")
+        proto = rule.proto.lower()
+        if proto not in PROTOCOLS:
+            raise ValueError(f"proto must be {'|'.join(PROTOCOLS)}")
+        key = (proto, int(rule.port))
+        target = ACTION_TARGETS[rule.action]
+        if desired.get(key, target) != target:
+            raise ValueError(f"conflicting actions for {key[1]}/{key[0]}")
+        desired[key] = target
+    return desired
+
+def rule_out(rule):
+    return {"port": rule.port, "proto": rule.proto, "action": TARGET_ACTIONS.get(rule.target, rule.target)}
 
 @router.post("/port")
 def port_control(rule: PortRule):
-    port = int(rule.port)
-    proto = "tcp" if rule.proto.lower() == "tcp" else "udp"
-    if rule.action == "open":
-        cmd = f"sudo iptables -I INPUT -p {proto} --dport {port} -j ACCEPT"
-    elif rule.action == "close":
-        cmd = f"sudo iptables -I INPUT -p {proto} --dport {port} -j DROP"
-    else:
-        return {"ok": False, "message": "action must be open|close"}
-
-    code, out, err = run(cmd)
-    if code != 0:
-        return {"ok": False, "cmd": cmd, "error": err or out}
+    if rule.proto.lower() not in PROTOCOLS:
+        raise HTTPException(status_code=400, detail=f"proto must be {'|'.join(PROTOCOLS)}")
+    try:
+        desired = desired_state([rule])
+    except ValueError as e:
+        return {"ok": False, "message": str(e)}
+    try:
+        result = firewall.apply(desired)
+    except FirewallError as e:
+        return {"ok": False, "error": str(e)}
+    (proto, port), = desired
     # Persist rules if you like (raspi use iptables-persistent)
-    return {"ok": True, "applied": {"action": rule.action, "port": port, "proto": proto}}
+    return {"ok": True, "applied": {"action": rule.action, "port": port, "proto": proto}, "changed": result["applied"]}
+
+@router.post("/rules")
+def apply_port_rules(batch: PortRuleBatch):
+    """Apply many port rules in one atomic iptables-restore run, skipping rules already in place"""
+    try:
+        desired = desired_state(batch.rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        result = firewall.apply(desired, replace=batch.replace, dry_run=batch.dry_run, refresh=batch.refresh)
+    except FirewallError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return {
+        "ok": True,
+        "applied": result["applied"],
+        "added": [rule_out(r) for r in result["added"]],
+        "removed": [rule_out(r) for r in result["removed"]],
+        "unchanged": len(desired) - len(result["added"]),
+        "script": result["script"] if batch.dry_run else None,
+    }
+
+@router.get("/rules")
+def list_port_rules(refresh: bool = False):
+    """Port rules managed by this service, in chain order"""
+    try:
+        return {"rules": [rule_out(r) for r in firewall.rules(refresh)]}
+    except FirewallError as e:
+        raise HTTPException(status_code=502, detail=str(e))
@@ -1,17 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
 import json
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 import time
 
-from database.db import get_db
-from database.models import ScanResult, Vulnerability
+from database.db import get_db, get_async_db
+from database.models import ScanResult, Vulnerability, Device
 from schemas.scan import ScanRequest, ScanResponse, ScanResultOut, ScanStats, DeviceInfo, PortResult
 from services.scanner import scanner
+from services.inventory import update_inventory
+from services.write_behind import write_behind
+from services.pagination import keyset_filter, split_page
+from services.generations import bump_generation, get_generation
+from services.conditional import make_etag, check_etag
 
 router = APIRouter()
 
+def run_persisted_scan(db: Session, scan_record: ScanResult, scanned_ports: List[int], run_scan):
+    """
+    Run a scan while the write-behind buffer persists devices as they are found.
+
+    The scan row is committed up front as in_progress, so a crash leaves a
+    partial scan (with its inventory and findings) rather than nothing.
+    """
+    db.add(scan_record)
+    db.commit()
+    scan_id, seen_at = scan_record.id, scan_record.timestamp
+    found = []
+
+    def on_device(device):
+        found.append(device)
+        write_behind.submit(scan_id, device, scanned_ports, seen_at)
+
+    devices = None
+    try:
+        devices = run_scan(on_device)
+        write_behind.flush(scan_id)
+    except Exception:
+        # Keep what the scan found even if some of it could not be persisted
+        result = devices if devices is not None else found
+        scan_record.result = result
+        scan_record.device_count = len(result)
+        scan_record.status = "failed"
+        bump_generation(db)
+        db.commit()
+        raise
+
+    scan_record.result = devices
+    scan_record.device_count = len(devices)
+    scan_record.status = "completed"
+    bump_generation(db)
+    db.commit()
+    return devices
+
 @router.post("/", response_model=ScanResponse)
 def perform_scan(request: ScanRequest, db: Session = Depends(get_db)):
     """Perform network scan with specified parameters"""
@@ -26,35 +70,19 @@ def perform_scan(request: ScanRequest, db: Session = Depends(get_db)):
             local_ip = scanner.get_local_ip()
             target_ips = scanner.get_network_range(local_ip)
         
-        # Perform scan
-        devices = scanner.scan_network(target_ips, request.ports, request.scan_type)
-        
-        # Save scan results to database
+        # Perform scan, saving devices and vulnerabilities in batches as they are found
         from datetime import timezone
         scan_record = ScanResult(
             ip=request.ip or "auto",
             ports=json.dumps(request.ports),
-            result=[device for device in devices],
             timestamp=datetime.now(timezone.utc),
             scan_type=request.scan_type,
-            status="completed"
+            status="in_progress"
+        )
+        devices = run_persisted_scan(
+            db, scan_record, request.ports,
+            lambda on_device: scanner.scan_network(target_ips, request.ports, request.scan_type, on_device=on_device)
         )
-        db.add(scan_record)
-        
-        # Save vulnerabilities
-        for device in devices:
-            for vuln in device.get('vulnerabilities', []):
-                vulnerability = Vulnerability(
-                    ip=device['ip'],
-                    port=vuln['port'],
-                    vulnerability_type=vuln['type'],
-                    description=vuln['description'],
-                    severity=vuln['severity'],
-                    status="open"
-                )
-                db.add(vulnerability)
-        
-        db.commit()
         
         scan_duration = time.time() - start_time
         
@@ -79,35 +107,19 @@ def perform_auto_scan(db: Session = Depends(get_db)):
         local_ip = scanner.get_local_ip()
         target_ips = scanner.get_network_range(local_ip)
         
-        # Perform camera-specific scan
-        devices = scanner.camera_scan(target_ips)
-        
-        # Save scan results
+        # Perform camera-specific scan, saving results in batches as they are found
         from datetime import timezone
         scan_record = ScanResult(
             ip="auto",
             ports=json.dumps(scanner.camera_ports),
-            result=[device for device in devices],
             timestamp=datetime.now(timezone.utc),
             scan_type="auto_scan",
-            status="completed"
+            status="in_progress"
+        )
+        devices = run_persisted_scan(
+            db, scan_record, scanner.camera_ports,
+            lambda on_device: scanner.camera_scan(target_ips, on_device=on_device)
         )
-        db.add(scan_record)
-        
-        # Save vulnerabilities
-        for device in devices:
-            for vuln in device.get('vulnerabilities', []):
-                vulnerability = Vulnerability(
-                    ip=device['ip'],
-                    port=vuln['port'],
-                    vulnerability_type=vuln['type'],
-                    description=vuln['description'],
-                    severity=vuln['severity'],
-                    status="open"
-                )
-                db.add(vulnerability)
-        
-        db.commit()
         
         scan_duration = time.time() - start_time
         
@@ -120,39 +132,95 @@ def perform_auto_scan(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Auto scan failed: {str(e)}")
 
+# Columns returned by the history listing; the device blob is only loaded on request
+async def scan_data_version(db: AsyncSession):
+    """Changes whenever a scan is created, finished or removed"""
+    max_id = (await db.execute(select(func.max(ScanResult.id)))).scalar()
+    return max_id, await get_generation(db)
+
+SCAN_SUMMARY_COLUMNS = (
+    ScanResult.id, ScanResult.ip, ScanResult.ports, ScanResult.timestamp,
+    ScanResult.scan_type, ScanResult.status, ScanResult.device_count,
+)
+
 @router.get("/history", response_model=List[ScanResultOut])
-def get_scan_history(db: Session = Depends(get_db)):
-    """Get scan history"""
-    history = db.query(ScanResult).order_by(ScanResult.timestamp.desc()).limit(50).all()
-    return history
+async def get_scan_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    include: Optional[str] = Query(None, description="Set to 'devices' to include the device list"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get scan history, newest first, one keyset page at a time"""
+    etag = make_etag("scan-history", await scan_data_version(db), limit, cursor, include)
+    not_modified = check_etag(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    columns = SCAN_SUMMARY_COLUMNS + ((ScanResult.result,) if include == "devices" else ())
+    query = select(*columns).order_by(ScanResult.timestamp.desc(), ScanResult.id.desc()).limit(limit + 1)
+
+    try:
+        after = keyset_filter(ScanResult.timestamp, ScanResult.id, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if after is not None:
+        query = query.filter(after)
+
+    rows, next_cursor = split_page((await db.execute(query)).all(), limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [row._asdict() for row in rows]
+
+@router.get("/history/{scan_id}", response_model=ScanResultOut)
+async def get_scan_detail(scan_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get a single scan including its device list"""
+    scan = await db.get(ScanResult, scan_id, options=[undefer(ScanResult.result)])
+    if scan is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    return scan
 
 @router.get("/stats", response_model=ScanStats)
-def get_scan_stats(db: Session = Depends(get_db)):
+async def get_scan_stats(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Get scanning statistics for dashboard"""
-    total_scans = db.query(ScanResult).count()
+    # today_scans rolls over at midnight even without writes
+    etag = make_etag("scan-stats", await scan_data_version(db), datetime.utcnow().date())
+    not_modified = check_etag(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    async def count(*criteria):
+        return (await db.execute(select(func.count()).select_from(ScanResult).filter(*criteria))).scalar_one()
+
+    total_scans = await count()
     
     # Today's scans
     today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_scans = db.query(ScanResult).filter(ScanResult.timestamp >= today).count()
+    today_scans = await count(ScanResult.timestamp >= today)
     
     # Vulnerable devices
-    vulnerable_devices = db.query(Vulnerability).filter(Vulnerability.status == "open").count()
+    vulnerable_devices = (await db.execute(
+        select(func.count()).select_from(Vulnerability).filter(Vulnerability.status == "open")
+    )).scalar_one()
     
     # Last scan
-    last_scan = db.query(ScanResult).order_by(ScanResult.timestamp.desc()).first()
-    last_scan_time = last_scan.timestamp if last_scan else None
+    last_scan_time = (await db.execute(select(func.max(ScanResult.timestamp)))).scalar()
     
-    # Count devices by risk level
-    high_risk = db.query(ScanResult).filter(ScanResult.result.contains([{"risk_level": "High"}])).count()
-    medium_risk = db.query(ScanResult).filter(ScanResult.result.contains([{"risk_level": "Medium"}])).count()
-    low_risk = db.query(ScanResult).filter(ScanResult.result.contains([{"risk_level": "Low"}])).count()
+    # Count devices by risk level from the inventory (Critical counts as high risk)
+    risk_counts = dict((await db.execute(
+        select(Device.risk_level, func.count()).group_by(Device.risk_level)
+    )).all())
+    high_risk = risk_counts.get("Critical", 0) + risk_counts.get("High", 0)
+    medium_risk = risk_counts.get("Medium", 0)
+    low_risk = risk_counts.get("Low", 0)
     
     return ScanStats(
         total_scans=total_scans,
         today_scans=today_scans,
         vulnerable_devices=vulnerable_devices,
         last_scan=last_scan_time,
-        total_devices_found=high_risk + medium_risk + low_risk,
+        total_devices_found=sum(risk_counts.values()),
         high_risk_devices=high_risk,
         medium_risk_devices=medium_risk,
         low_risk_devices=low_risk
@@ -173,9 +241,13 @@ def quick_scan_ip(ip: str, db: Session = Depends(get_db)):
                 result=[device],
                 timestamp=datetime.now(timezone.utc),
                 scan_type="quick_scan",
+                device_count=1,
                 status="completed"
             )
             db.add(scan_record)
+            db.flush()
+            update_inventory(db, [device], scan_record.id, scanner.quick_scan_ports, scan_record.timestamp)
+            bump_generation(db)
             db.commit()
             
             return {"message": f"Quick scan completed for {ip}", "device": device}
@@ -1,74 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import datetime
 from database import models, schemas, db
+from services.pagination import keyset_filter, split_page
+from services.conditional import make_etag, check_etag
+from services.suggestions import classify_keyword, suggestion_counter
 
 router = APIRouter()
 
-# Dependency to get DB session
-def get_db():
-    db_session = db.SessionLocal()
-    try:
-        yield db_session
-    finally:
-        db_session.close()
-
-# ------------------------------
-# Mock Suggestion Database
-# ------------------------------
-SUGGESTION_DB = {
-    "RTSP": [
-        "Disable RTSP if not in use.",
-        "Use authentication on RTSP streams.",
-        "Change default RTSP ports.",
-        "Use RTSP over HTTPS when possible.",
-        "Implement IP whitelisting for RTSP access."
-    ],
-    "FTP": [
-        "Replace FTP with SFTP or FTPS.",
-        "Use strong credentials and limit access to internal networks.",
-        "Disable anonymous FTP access.",
-        "Use firewall rules to restrict FTP access.",
-        "Regularly audit FTP access logs."
-    ],
-    "TELNET": [
-        "Avoid using Telnet. Prefer SSH.",
-        "Disable Telnet on all IoT devices.",
-        "Use encrypted protocols for remote access.",
-        "Implement key-based authentication.",
-        "Monitor for unauthorized Telnet attempts."
-    ],
-    "DEFAULT_CREDENTIALS": [
-        "Change default login credentials immediately.",
-        "Use strong, unique passwords for each device.",
-        "Implement password rotation policies.",
-        "Use password managers for credential storage.",
-        "Enable two-factor authentication where possible."
-    ],
-    "UNPATCHED_FIRMWARE": [
-        "Regularly check for firmware updates.",
-        "Subscribe to vendor security notifications.",
-        "Test firmware updates in a safe environment.",
-        "Maintain a firmware update schedule.",
-        "Keep backup configurations before updates."
-    ],
-    "OPEN_PORTS": [
-        "Close unnecessary open ports.",
-        "Use firewall rules to restrict port access.",
-        "Implement port scanning detection.",
-        "Monitor port access logs regularly.",
-        "Use VPN for remote access instead of open ports."
-    ],
-    "WEAK_PASSWORDS": [
-        "Use strong passwords with mixed characters.",
-        "Implement password complexity requirements.",
-        "Use password managers for secure storage.",
-        "Enable account lockout after failed attempts.",
-        "Regularly audit password policies."
-    ]
-}
-
 # ------------------------------
 # Models
 # ------------------------------
@@ -77,69 +19,67 @@ class SuggestionResponse(BaseModel):
     suggestions: List[str]
     severity: str
 
+class SuggestionStat(BaseModel):
+    category: str
+    count: int
+    last_requested: Optional[datetime]
+
 # ------------------------------
 # API Endpoint
 # ------------------------------
 @router.post("/", response_model=SuggestionResponse)
-def get_suggestions(request: schemas.SuggestionRequest, db: Session = Depends(get_db)):
-    keyword_upper = request.keyword.strip().upper()
-    
-    # Map keywords to suggestion categories
-    keyword_mapping = {
-        "RTSP": "RTSP",
-        "FTP": "FTP", 
-        "TELNET": "TELNET",
-        "SSH": "TELNET",  # SSH suggestions for secure alternatives
-        "DEFAULT": "DEFAULT_CREDENTIALS",
-        "PASSWORD": "WEAK_PASSWORDS",
-        "CREDENTIALS": "DEFAULT_CREDENTIALS",
-        "FIRMWARE": "UNPATCHED_FIRMWARE",
-        "UPDATE": "UNPATCHED_FIRMWARE",
-        "PORT": "OPEN_PORTS",
-        "OPEN": "OPEN_PORTS"
-    }
-    
-    # Find matching category
-    matched_category = None
-    for key, category in keyword_mapping.items():
-        if key in keyword_upper:
-            matched_category = category
-            break
-    
-    if matched_category and matched_category in SUGGESTION_DB:
-        suggestions = SUGGESTION_DB[matched_category]
-        severity = "Critical" if matched_category in ["TELNET", "DEFAULT_CREDENTIALS"] else "High"
-    else:
-        # Default suggestions for unknown keywords
-        suggestions = [
-            "Perform a comprehensive security audit.",
-            "Update all device firmware to latest versions.",
-            "Change default passwords on all devices.",
-            "Enable firewall rules and access controls.",
-            "Implement network segmentation for IoT devices."
-        ]
-        severity = "Medium"
-        matched_category = "GENERAL"
+async def get_suggestions(request: schemas.SuggestionRequest):
+    entry = classify_keyword(request.keyword)
     
-    # Store suggestion request in database
-    for suggestion in suggestions:
-        suggestion_record = models.Suggestion(
-            vulnerability_type=matched_category,
-            suggestion_text=suggestion,
-            severity=severity
-        )
-        db.add(suggestion_record)
-    
-    db.commit()
+    # Count the request; the counter adds it to the database in batches
+    suggestion_counter.record(entry.category)
     
     return SuggestionResponse(
-        keyword=matched_category,
-        suggestions=suggestions,
-        severity=severity
+        keyword=entry.category,
+        suggestions=list(entry.suggestions),
+        severity=entry.severity
+    )
+
+@router.get("/stats", response_model=List[SuggestionStat])
+async def get_suggestion_stats(db_session: AsyncSession = Depends(db.get_async_db)):
+    """Suggestion requests served per category, most requested first"""
+    Count = models.SuggestionRequestCount
+    rows = await db_session.execute(
+        select(Count.category, Count.count, Count.last_requested).order_by(Count.count.desc())
+    )
+    return [row._asdict() for row in rows]
+
+@router.get("/history", response_model=List[schemas.SuggestionOut])
+async def get_suggestion_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    db_session: AsyncSession = Depends(db.get_async_db)
+):
+    """Get suggestion history from database, newest first, one keyset page at a time"""
+    Suggestion = models.Suggestion
+    # Suggestions are only ever appended, so the newest id versions the table
+    max_id = (await db_session.execute(select(func.max(Suggestion.id)))).scalar()
+    not_modified = check_etag(request, response, make_etag("suggestion-history", max_id, limit, cursor))
+    if not_modified:
+        return not_modified
+
+    query = (
+        select(Suggestion.id, Suggestion.vulnerability_type, Suggestion.suggestion_text,
+               Suggestion.severity, Suggestion.created_at)
+        .order_by(Suggestion.created_at.desc(), Suggestion.id.desc())
+        .limit(limit + 1)
     )
 
-@router.get("/history")
-def get_suggestion_history(db: Session = Depends(get_db)):
-    """Get suggestion history from database"""
-    suggestions = db.query(models.Suggestion).order_by(models.Suggestion.created_at.desc()).limit(50).all()
-    return suggestions
+    try:
+        after = keyset_filter(Suggestion.created_at, Suggestion.id, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if after is not None:
+        query = query.filter(after)
+
+    rows, next_cursor = split_page((await db_session.execute(query)).all(), limit, "created_at")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [row._asdict() for row in rows]
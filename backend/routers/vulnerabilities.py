@@ -1,9 +1,22 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from sqlalchemy.orm import Session
+from typing import Any, Iterator, List, Optional
+import json
+import os
+
+from database.db import get_db
+from database.schemas import VulnerabilityOut, VulnerabilityStatusUpdate
+from services.vulnerability_store import set_vulnerability_status
 
 router = APIRouter()
 
+VULNERABILITY_BATCH_LIMIT = int(os.getenv("VULNERABILITY_BATCH_LIMIT", "10000"))
+VULNERABILITY_BATCH_MAX_BYTES = int(os.getenv("VULNERABILITY_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))
+# Records assessed per streamed piece of a batch response
+BATCH_CHUNK_SIZE = 500
+
 # ------------------------------
 # Data Models
 # ------------------------------
@@ -20,29 +33,37 @@ class VulnerabilityReport(BaseModel):
 # ------------------------------
 # Risk Assessment Logic
 # ------------------------------
+# Known risky ports
+RISKY_PORTS = {
+    21: "FTP port is open, which is insecure if not protected.",
+    23: "Telnet is open and unencrypted.",
+    554: "RTSP stream might be exposed.",
+    80: "HTTP open - use HTTPS instead.",
+    8080: "Commonly used for unsecured admin portals.",
+    445: "SMB port open - target for ransomware.",
+    22: "SSH open - secure with strong credentials."
+}
+
+# Precomputed per-port (weight, issue); ports not listed weigh 1 and add no issue
+PORT_ASSESSMENT = {port: (2, issue) for port, issue in RISKY_PORTS.items()}
+UNKNOWN_PORT = (1, None)
+
+# Suggestions per risk level
+RISK_SUGGESTIONS = {
+    "High": ("Disable unused ports immediately.", "Update firmware and enforce authentication."),
+    "Medium": ("Use firewall rules to limit access.", "Verify firmware and monitor device traffic."),
+    "Low": ("Device appears safe, but continue regular scans.",),
+}
+
 def assess_risk(open_ports: List[int]) -> (str, List[str], List[str]):
     issues = []
-    suggestions = []
-
-    # Known risky ports
-    risky_ports = {
-        21: "FTP port is open, which is insecure if not protected.",
-        23: "Telnet is open and unencrypted.",
-        554: "RTSP stream might be exposed.",
-        80: "HTTP open - use HTTPS instead.",
-        8080: "Commonly used for unsecured admin portals.",
-        445: "SMB port open - target for ransomware.",
-        22: "SSH open - secure with strong credentials."
-    }
-
     risk_score = 0
 
     for port in open_ports:
-        if port in risky_ports:
-            issues.append(risky_ports[port])
-            risk_score += 2
-        else:
-            risk_score += 1  # Unknown ports count as small risk
+        weight, issue = PORT_ASSESSMENT.get(port, UNKNOWN_PORT)
+        risk_score += weight  # Unknown ports count as small risk
+        if issue is not None:
+            issues.append(issue)
 
     # Determine risk level
     if risk_score >= 8:
@@ -52,17 +73,81 @@ def assess_risk(open_ports: List[int]) -> (str, List[str], List[str]):
     else:
         risk_level = "Low"
 
-    # Suggestions
-    if risk_level == "High":
-        suggestions.append("Disable unused ports immediately.")
-        suggestions.append("Update firmware and enforce authentication.")
-    elif risk_level == "Medium":
-        suggestions.append("Use firewall rules to limit access.")
-        suggestions.append("Verify firmware and monitor device traffic.")
-    else:
-        suggestions.append("Device appears safe, but continue regular scans.")
+    return risk_level, issues, list(RISK_SUGGESTIONS[risk_level])
+
+def assess_record(record) -> dict:
+    """VulnerabilityReport fields for one {ip_address|ip, open_ports} record, or an error entry"""
+    ip = record.get("ip_address", record.get("ip")) if isinstance(record, dict) else None
+    try:
+        if not isinstance(record, dict):
+            raise ValueError("record must be a JSON object")
+        scan = PortScanResult(ip_address=ip, open_ports=record.get("open_ports"))
+    except ValueError as e:
+        return {"ip_address": ip, "error": f"Invalid record: {e}"}
+    if not scan.open_ports:
+        return {"ip_address": scan.ip_address, "error": "No open ports provided."}
+
+    risk_level, issues, suggestions = assess_risk(scan.open_ports)
+    return {"ip_address": scan.ip_address, "risk_level": risk_level, "issues": issues, "suggestions": suggestions}
+
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=detail)
+
+async def read_body(request: Request) -> bytes:
+    """The request body, refusing more than VULNERABILITY_BATCH_MAX_BYTES"""
+    if int(request.headers.get("content-length") or 0) > VULNERABILITY_BATCH_MAX_BYTES:
+        raise _too_large(f"Body exceeds {VULNERABILITY_BATCH_MAX_BYTES} bytes")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > VULNERABILITY_BATCH_MAX_BYTES:
+            raise _too_large(f"Body exceeds {VULNERABILITY_BATCH_MAX_BYTES} bytes")
+    return bytes(body)
 
-    return risk_level, issues, suggestions
+async def read_ndjson(request: Request) -> List[Any]:
+    """
+    Parse an NDJSON request body line by line as it arrives (malformed lines
+    become None), refusing more than VULNERABILITY_BATCH_LIMIT records or
+    VULNERABILITY_BATCH_MAX_BYTES bytes
+    """
+    if int(request.headers.get("content-length") or 0) > VULNERABILITY_BATCH_MAX_BYTES:
+        raise _too_large(f"Body exceeds {VULNERABILITY_BATCH_MAX_BYTES} bytes")
+    records = []
+    pending = b""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > VULNERABILITY_BATCH_MAX_BYTES:
+            raise _too_large(f"Body exceeds {VULNERABILITY_BATCH_MAX_BYTES} bytes")
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        records.extend(_parse_line(line) for line in lines if line.strip())
+        if len(records) > VULNERABILITY_BATCH_LIMIT:
+            raise _too_large(f"At most {VULNERABILITY_BATCH_LIMIT} records per batch")
+    if pending.strip():
+        records.append(_parse_line(pending))
+        if len(records) > VULNERABILITY_BATCH_LIMIT:
+            raise _too_large(f"At most {VULNERABILITY_BATCH_LIMIT} records per batch")
+    return records
+
+def _parse_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def report_stream(records: List[Any], json_array: bool) -> Iterator[bytes]:
+    """Assess records and yield their reports as NDJSON (or a JSON array), BATCH_CHUNK_SIZE per piece"""
+    if json_array:
+        yield b"["
+    for start in range(0, len(records), BATCH_CHUNK_SIZE):
+        reports = [json.dumps(assess_record(record)) for record in records[start:start + BATCH_CHUNK_SIZE]]
+        if json_array:
+            yield (("," if start else "") + ",".join(reports)).encode("utf-8")
+        else:
+            yield ("\n".join(reports) + "\n").encode("utf-8")
+    if json_array:
+        yield b"]"
 
 # ------------------------------
 # API Endpoint
@@ -80,3 +165,40 @@ def analyze_device(scan: PortScanResult):
         issues=issues,
         suggestions=suggestions
     )
+
+@router.post("/batch")
+async def analyze_devices(request: Request):
+    """
+    Assess many hosts in one call.
+
+    The body is either a JSON list of {ip_address (or ip), open_ports} records
+    or, with Content-Type application/x-ndjson, one record per line. Reports
+    stream back in the same format and order; a record that cannot be
+    assessed yields {ip_address, error}. Either format is limited to
+    VULNERABILITY_BATCH_LIMIT records and VULNERABILITY_BATCH_MAX_BYTES
+    bytes (413 past either).
+    """
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        return StreamingResponse(report_stream(await read_ndjson(request), False), media_type="application/x-ndjson")
+
+    try:
+        records = json.loads(await read_body(request))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON list of records or NDJSON")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON list of records or NDJSON")
+    if len(records) > VULNERABILITY_BATCH_LIMIT:
+        raise _too_large(f"At most {VULNERABILITY_BATCH_LIMIT} records per batch")
+    return StreamingResponse(report_stream(records, True), media_type="application/json")
+
+@router.api_route("/{vuln_id}/status", methods=["PUT", "PATCH"], response_model=VulnerabilityOut)
+def update_vulnerability_status(vuln_id: int, update: VulnerabilityStatusUpdate, db: Session = Depends(get_db)):
+    """Mark a finding as open, fixed or ignored"""
+    try:
+        vulnerability = set_vulnerability_status(db, vuln_id, update.status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if vulnerability is None:
+        raise HTTPException(status_code=404, detail="Vulnerability not found")
+    return vulnerability
@@ -34,10 +34,11 @@ class ScanResultOut(BaseModel):
     id: int
     ip: str
     ports: str
-    result: List[Dict[str, Any]]
+    result: Optional[List[Dict[str, Any]]] = None  # only with ?include=devices or on the detail endpoint
     timestamp: datetime
     scan_type: str
     status: str
+    device_count: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Rebuild the hourly/daily vulnerability rollups and per-device scores
+Recounts every finding from the vulnerabilities table; run after restoring a
+backup or editing vulnerabilities by hand
+"""
+
+import os
+import sys
+import argparse
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import SessionLocal
+from database.init_db import init_database
+from services.rollups import backfill_rollups
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Rebuild vulnerability rollups from the vulnerabilities table")
+    parser.add_argument('--batch-size', type=int, default=5000, help='Findings per transaction')
+    args = parser.parse_args()
+
+    init_database()
+    counted = backfill_rollups(SessionLocal, batch_size=args.batch_size)
+    print(f"Rollups rebuilt from {counted} findings")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Login throughput benchmark
+Fires concurrent /auth/login requests at the app in-process while polling
+/health, and reports login throughput, login latency and how much the burst
+slows down other endpoints. Uses the configured database (DATABASE_TYPE)
+and creates its own benchmark user.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import uuid
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+# The benchmark is a deliberate login burst; don't let the rate limiter reject it
+os.environ.setdefault("RATE_LIMIT_ENABLED", "False")
+
+from main import app
+from services.passwords import password_hasher, PASSWORD_HASH_ITERATIONS, PASSWORD_HASH_WORKERS
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000 if ordered else 0.0
+
+async def probe_health(client, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+async def run(args):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+        password = "Bench-Passw0rd"
+        response = await client.post("/auth/register", json={"name": "Bench", "email": email, "password": password})
+        response.raise_for_status()
+
+        idle = []
+        for _ in range(50):
+            start = time.perf_counter()
+            await client.get("/health")
+            idle.append(time.perf_counter() - start)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies, statuses = [], {}
+
+        async def login(i):
+            async with semaphore:
+                wrong = args.wrong_every and i % args.wrong_every == 0
+                body = {"email": email, "password": "wrong-password" if wrong else password}
+                start = time.perf_counter()
+                response = await client.post("/auth/login", json=body)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        stop = asyncio.Event()
+        busy = []
+        prober = asyncio.create_task(probe_health(client, stop, busy))
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+
+    print(f"PBKDF2 iterations: {PASSWORD_HASH_ITERATIONS}, hash workers: {PASSWORD_HASH_WORKERS}")
+    print(f"{args.logins} logins, concurrency {args.concurrency}: {elapsed:.2f}s, {args.logins / elapsed:.1f} logins/s")
+    print(f"Responses: {dict(sorted(statuses.items()))}, hasher rejected: {password_hasher.stats['rejected']}")
+    print("-" * 60)
+    print(f"{'Latency (ms)':<28} {'p50':>10} {'p95':>10} {'max':>10}")
+    print("-" * 60)
+    for name, values in (("Login", latencies), ("/health, idle", idle), ("/health, during burst", busy)):
+        print(f"{name:<28} {percentile(values, 50):>10.1f} {percentile(values, 95):>10.1f} {max(values) * 1000:>10.1f}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark login throughput")
+    parser.add_argument('--logins', type=int, default=200, help='Login requests to send')
+    parser.add_argument('--concurrency', type=int, default=32, help='Logins in flight at once')
+    parser.add_argument('--wrong-every', type=int, default=0, help='Send a wrong password every N logins')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
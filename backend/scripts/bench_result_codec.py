@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the scan_results.result storage codec
+Reports payload size and encode/decode throughput for plain JSON,
+zlib and (if installed) zstd on a synthetic device list
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.types import encode_json, decode_json, zstandard
+
+BANNERS = [
+    "SSH-2.0-dropbear_2019.78",
+    "220 IPCAM FTP server ready",
+    "RTSP/1.0 200 OK\r\nServer: Hipcam RealServer/V1.0",
+    "HTTP/1.1 401 Unauthorized\r\nWWW-Authenticate: Basic realm=\"IP Camera\"",
+    None,
+]
+
+def make_devices(count: int):
+    """Build a device list shaped like NetworkScanner.scan_network output"""
+    rng = random.Random(42)
+    devices = []
+    for i in range(count):
+        ip = f"10.{(i >> 8) & 255}.{i & 255}.{rng.randint(1, 254)}"
+        ports = rng.sample([21, 22, 23, 80, 443, 554, 8000, 8080, 37777], rng.randint(1, 5))
+        devices.append({
+            "ip": ip,
+            "device_name": f"IP Camera (RTSP) ({ip})",
+            "device_type": "IP Camera (RTSP)",
+            "open_ports": [
+                {"port": p, "status": "open", "service": "RTSP", "banner": rng.choice(BANNERS)}
+                for p in sorted(ports)
+            ],
+            "risk_level": rng.choice(["Low", "Medium", "High", "Critical"]),
+            "status": "Active",
+            "last_seen": "2025-01-01T00:00:00",
+            "vulnerabilities": [
+                {"type": "RTSP Service", "severity": "Medium", "port": 554,
+                 "description": "RTSP service detected - check for authentication",
+                 "cve": None, "fix_suggestion": "Ensure RTSP service requires authentication"}
+            ] if 554 in ports else [],
+        })
+    return devices
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - start) / repeat, out
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark the scan result codec")
+    parser.add_argument('--devices', type=int, default=5000, help='Devices per scan payload')
+    parser.add_argument('--repeat', type=int, default=5, help='Iterations per measurement')
+    args = parser.parse_args()
+
+    devices = make_devices(args.devices)
+    raw = json.dumps(devices).encode("utf-8")
+    raw_mb = len(raw) / (1024 * 1024)
+
+    print(f"Payload: {args.devices} devices, {len(raw):,} bytes of JSON")
+    print("-" * 80)
+    print(f"{'Codec':<10} {'Size':>14} {'Ratio':>8} {'Encode MB/s':>14} {'Decode MB/s':>14}")
+    print("-" * 80)
+
+    encode_time, _ = timed(lambda: json.dumps(devices).encode("utf-8"), args.repeat)
+    decode_time, _ = timed(lambda: json.loads(raw), args.repeat)
+    print(f"{'json':<10} {len(raw):>14,} {1.0:>8.2f} {raw_mb / encode_time:>14.1f} {raw_mb / decode_time:>14.1f}")
+
+    codecs = ["zlib"] + (["zstd"] if zstandard is not None else [])
+    for codec in codecs:
+        encode_time, payload = timed(lambda: encode_json(devices, codec=codec), args.repeat)
+        decode_time, decoded = timed(lambda: decode_json(payload), args.repeat)
+        assert decoded == json.loads(json.dumps(devices, separators=(",", ":")))
+        ratio = len(raw) / len(payload)
+        print(f"{codec:<10} {len(payload):>14,} {ratio:>8.2f} {raw_mb / encode_time:>14.1f} {raw_mb / decode_time:>14.1f}")
+
+    if zstandard is None:
+        print("\nzstd skipped: install 'zstandard' to benchmark it")
+
+if __name__ == "__main__":
+    main()
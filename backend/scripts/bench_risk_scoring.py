@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark for vectorized risk scoring
+Compares the per-device Python paths (identify_device_type, assess_risk and
+the security score formula) with services.risk_matrix on a synthetic fleet,
+checking that both give identical results
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from services.scanner import scanner
+from services.scoring import calculate_security_score
+from services.risk_matrix import classify_devices, assess_risk_levels, windowed_scores, findings_arrays, SEVERITIES
+from routers.vulnerabilities import assess_risk, RISKY_PORTS
+
+PORTS = [21, 22, 23, 80, 443, 554, 3389, 8000, 8080, 37777, 5900, 445]
+
+def make_fleet(devices: int, findings_per_device: int, days: int):
+    rng = random.Random(42)
+    port_lists = [sorted(rng.sample(PORTS, rng.randint(1, 8))) for _ in range(devices)]
+    now = datetime(2025, 1, 1)
+    findings = {"ips": [], "detected_at": [], "severities": [], "statuses": []}
+    for d in range(devices):
+        for _ in range(rng.randint(0, findings_per_device * 2)):
+            findings["ips"].append(f"10.{d >> 16}.{(d >> 8) & 255}.{d & 255}")
+            findings["detected_at"].append(now - timedelta(seconds=rng.randint(0, days * 86400)))
+            findings["severities"].append(rng.choice(SEVERITIES))
+            findings["statuses"].append(rng.choice(["open", "open", "fixed", "ignored"]))
+    return port_lists, findings, now
+
+def python_window_scores(findings, windows):
+    """Per-device, per-window scores the way /analytics computes one score"""
+    by_device = {}
+    for ip, ts, severity, status in zip(*findings.values()):
+        by_device.setdefault(ip, []).append((ts, severity, status))
+    scores = {}
+    for ip, rows in by_device.items():
+        per_window = []
+        for start, end in windows:
+            counts = dict.fromkeys(SEVERITIES, 0)
+            fixed = total = 0
+            for ts, severity, status in rows:
+                if start <= ts < end:
+                    counts[severity] += 1
+                    total += 1
+                    fixed += status == "fixed"
+            per_window.append(calculate_security_score(
+                counts["Critical"], counts["High"], counts["Medium"], counts["Low"], fixed, total
+            ))
+        scores[ip] = per_window
+    return scores
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - start, out
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark vectorized risk scoring")
+    parser.add_argument('--devices', type=int, default=20000, help='Devices in the synthetic fleet')
+    parser.add_argument('--findings', type=int, default=5, help='Average findings per device')
+    parser.add_argument('--windows', type=int, default=52, help='Weekly windows to score')
+    parser.add_argument('--from-db', action='store_true', help='Score the findings in the configured database instead')
+    args = parser.parse_args()
+
+    if args.from_db:
+        from database.db import SessionLocal
+        with SessionLocal() as db:
+            load_time, findings = timed(lambda: findings_arrays(db))
+        now = datetime.utcnow()
+        windows = [(now - timedelta(days=7 * (w + 1)), now - timedelta(days=7 * w)) for w in range(args.windows)]
+        score_time, result = timed(lambda: windowed_scores(*findings.values(), windows))
+        print(f"{len(findings['ips'])} findings on {len(result['devices'])} devices: "
+              f"loaded in {load_time:.3f}s, {len(windows)} windows scored in {score_time:.3f}s")
+        print(f"Fleet scores, newest week first: {result['fleet_scores'].tolist()}")
+        return
+
+    port_lists, findings, now = make_fleet(args.devices, args.findings, args.windows * 7)
+    windows = [(now - timedelta(days=7 * (w + 1)), now - timedelta(days=7 * w)) for w in range(args.windows)]
+    print(f"Fleet: {args.devices} devices, {len(findings['ips'])} findings, {len(windows)} windows")
+    print("-" * 72)
+    print(f"{'Task':<28} {'Python (s)':>12} {'NumPy (s)':>12} {'Speed-up':>10}")
+    print("-" * 72)
+
+    def report(name, python_time, numpy_time):
+        print(f"{name:<28} {python_time:>12.3f} {numpy_time:>12.3f} {python_time / numpy_time:>9.1f}x")
+
+    open_ports = [[{"port": p, "status": "open"} for p in ports] for ports in port_lists]
+    python_time, expected = timed(lambda: [scanner.identify_device_type(p) for p in open_ports])
+    numpy_time, (types, risks) = timed(lambda: classify_devices(port_lists))
+    assert [tuple(pair) for pair in expected] == list(zip(types.tolist(), risks.tolist()))
+    report("Device type / risk level", python_time, numpy_time)
+
+    python_time, expected = timed(lambda: [assess_risk(p)[0] for p in port_lists])
+    numpy_time, levels = timed(lambda: assess_risk_levels(port_lists, list(RISKY_PORTS)))
+    assert expected == levels.tolist()
+    report("Port risk assessment", python_time, numpy_time)
+
+    python_time, expected = timed(lambda: python_window_scores(findings, windows))
+    numpy_time, result = timed(lambda: windowed_scores(*findings.values(), windows))
+    for ip, scores in zip(result["devices"], result["device_scores"]):
+        assert expected[ip] == scores.tolist(), ip
+    report("Scores, device x window", python_time, numpy_time)
+
+if __name__ == "__main__":
+    main()
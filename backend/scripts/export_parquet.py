@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Parquet export for IoT Security Scanner
+Writes day-partitioned Parquet files of devices, open ports and
+vulnerabilities for offline analysis; each run only adds the complete days
+since the previous export
+"""
+
+import os
+import sys
+import logging
+import argparse
+from datetime import date
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from production import PARQUET_EXPORT_PATH
+from database.db import SessionLocal
+from services.columnar_export import export_parquet
+
+def setup_logging():
+    """Setup logging for the Parquet export"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('logs/parquet_export.log'),
+            logging.StreamHandler()
+        ]
+    )
+    return logging.getLogger(__name__)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="IoT Security Scanner Parquet Export")
+    parser.add_argument('--output', type=str, default=PARQUET_EXPORT_PATH, help='Directory for the Parquet dataset')
+    parser.add_argument('--since', type=date.fromisoformat, default=None,
+                        help='Re-export from this day (YYYY-MM-DD) instead of the watermark')
+    parser.add_argument('--until', type=date.fromisoformat, default=None,
+                        help='Stop before this day (YYYY-MM-DD, default: today)')
+
+    args = parser.parse_args()
+
+    # Create logs directory
+    Path('logs').mkdir(exist_ok=True)
+    logger = setup_logging()
+
+    try:
+        summary = export_parquet(args.output, since=args.since, until=args.until, session_factory=SessionLocal)
+    except Exception as e:
+        logger.error(f"Parquet export error: {str(e)}")
+        sys.exit(1)
+
+    for table, partitions in summary["partitions"].items():
+        logger.info(f"{table}: {len(partitions)} partitions written")
+    logger.info(f"Parquet export completed, watermark: {summary['watermark']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Compress existing scan_results.result payloads
+Rewrites plain JSON rows into the compressed CompressedJSON format in
+batches; rows that are already compressed are left untouched
+"""
+
+import os
+import sys
+import argparse
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import table, column, select, update, bindparam, LargeBinary
+
+from database.db import engine
+from database.init_db import init_database
+from database.types import encode_json, decode_json, is_encoded
+
+# Untyped view of the table so values come back exactly as stored
+raw_scan_results = table("scan_results", column("id"), column("result"))
+
+def migrate(batch_size: int, codec: str) -> int:
+    """Compress every legacy row and return how many were rewritten"""
+    converted = 0
+    last_id = 0
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(raw_scan_results.c.id, raw_scan_results.c.result)
+                .where(raw_scan_results.c.id > last_id)
+                .order_by(raw_scan_results.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            updates = [
+                {"row_id": row.id, "payload": encode_json(decode_json(row.result), codec=codec)}
+                for row in rows
+                if row.result is not None and not is_encoded(row.result)
+            ]
+            if updates:
+                conn.execute(
+                    update(raw_scan_results)
+                    .where(raw_scan_results.c.id == bindparam("row_id"))
+                    .values(result=bindparam("payload", type_=LargeBinary)),
+                    updates,
+                )
+            converted += len(updates)
+            last_id = rows[-1].id
+
+        print(f"Processed up to id {last_id}: {converted} rows compressed")
+
+    return converted
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Compress scan_results.result payloads")
+    parser.add_argument('--batch-size', type=int, default=200, help='Rows per transaction')
+    parser.add_argument('--codec', choices=['zlib', 'zstd'], default=None, help='Codec (defaults to RESULT_CODEC)')
+    args = parser.parse_args()
+
+    # Make sure the column itself has been converted first
+    init_database()
+
+    converted = migrate(args.batch_size, args.codec)
+    print(f"Migration completed: {converted} rows compressed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Rebuild the device inventory from stored scan results
+Replays scan_results oldest first through the inventory updater; run once
+after upgrading so devices scanned before the inventory existed are known
+"""
+
+import os
+import sys
+import argparse
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import SessionLocal
+from database.init_db import init_database
+from services.inventory import rebuild_inventory
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Rebuild the device inventory from scan history")
+    parser.add_argument('--batch-size', type=int, default=200, help='Scans per transaction')
+    args = parser.parse_args()
+
+    init_database()
+    replayed = rebuild_inventory(SessionLocal, batch_size=args.batch_size)
+    print(f"Inventory rebuilt from {replayed} scans")
+
+if __name__ == "__main__":
+    main()
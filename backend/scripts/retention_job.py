@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Retention job for IoT Security Scanner
+Rolls old scan_results up into daily aggregates, archives the raw rows
+as compressed JSONL and removes them from the live table
+"""
+
+import os
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from production import (
+    RETENTION_DEFAULT_DAYS, RETENTION_POLICIES, RETENTION_BATCH_SIZE, ARCHIVE_PATH
+)
+from database.db import SessionLocal
+from services.retention import parse_policies, run_retention
+
+def setup_logging():
+    """Setup logging for the retention job"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('logs/retention.log'),
+            logging.StreamHandler()
+        ]
+    )
+    return logging.getLogger(__name__)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="IoT Security Scanner Retention Job")
+    parser.add_argument('--policies', type=str, default=RETENTION_POLICIES,
+                        help='Per scan_type retention, e.g. "auto_scan:14,quick_scan:30"')
+    parser.add_argument('--default-days', type=int, default=RETENTION_DEFAULT_DAYS,
+                        help='Retention for scan types without a policy (0 keeps forever)')
+    parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE, help='Rows per transaction')
+    parser.add_argument('--archive-path', type=str, default=ARCHIVE_PATH, help='Directory for compressed archives')
+    parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be removed')
+
+    args = parser.parse_args()
+
+    # Create logs directory
+    Path('logs').mkdir(exist_ok=True)
+    logger = setup_logging()
+
+    try:
+        removed = run_retention(
+            SessionLocal,
+            parse_policies(args.policies),
+            args.default_days,
+            args.archive_path,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+        )
+    except Exception as e:
+        logger.error(f"Retention error: {str(e)}")
+        sys.exit(1)
+
+    action = "would be removed" if args.dry_run else "rolled up and archived"
+    for scan_type, count in removed.items():
+        logger.info(f"{scan_type}: {count} scans {action}")
+    logger.info(f"Retention completed: {sum(removed.values())} scans {action}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+AI remediation advice for the fix assistant.
+
+Advice is generated by a chat-completion backend and cached for good in the
+remediation_cache table, keyed by the normalized (issue, device type,
+model), so the same advice is never paid for twice:
+
+- an in-process TTL cache in front of the table serves hot keys without a
+  query and coalesces identical in-flight requests into one backend call
+- backend calls are bounded by AI_BOT_MAX_CONCURRENCY and AI_BOT_TIMEOUT
+- the backend is pluggable: OpenAIBackend talks to any OpenAI-compatible
+  /chat/completions endpoint (AI_BOT_BASE_URL), so a local stub server can
+  stand in for the real API; anything with an async complete() works
+
+Without OPENAI_API_KEY (or AI_BOT_BASE_URL) the service is disabled and
+callers fall back to the static templates.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import select
+
+from database.db import AsyncSessionLocal
+from database.dialects import dialect_insert
+from database.models import RemediationCache
+from services.assistant import normalize_issue
+from services.cache import AsyncTTLCache
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "1000"))
+AI_BOT_BASE_URL = os.getenv("AI_BOT_BASE_URL", "")
+AI_BOT_TIMEOUT = float(os.getenv("AI_BOT_TIMEOUT", "30"))
+AI_BOT_MAX_CONCURRENCY = int(os.getenv("AI_BOT_MAX_CONCURRENCY", "4"))
+AI_BOT_CACHE_SIZE = int(os.getenv("AI_BOT_CACHE_SIZE", "1024"))
+
+PRIORITIES = ("Critical", "High", "Medium", "Low")
+
+SYSTEM_PROMPT = (
+    "You are an IoT security assistant. Given a vulnerability found on a device, "
+    "reply with JSON only: {\"suggestion\": one or two sentences, "
+    "\"steps\": a list of short numbered remediation steps, "
+    "\"priority\": one of Critical, High, Medium, Low}."
+)
+
+
+class AIBotUnavailable(Exception):
+    """The backend is not configured, failed or timed out"""
+
+
+class OpenAIBackend:
+    """Chat completions over HTTP against the OpenAI API or a compatible server"""
+
+    def __init__(self, api_key: str = OPENAI_API_KEY, base_url: str = None, timeout: float = AI_BOT_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = (base_url or AI_BOT_BASE_URL or "https://api.openai.com/v1").rstrip("/")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def complete(self, messages: List[Dict[str, str]], model: str, max_tokens: int) -> str:
+        response = await self._get_client().post(
+            f"{self.base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": 0},
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+
+def cache_key(issue: str, device_type: Optional[str], model: str) -> str:
+    normalized = [normalize_issue(issue), normalize_issue(device_type or ""), model]
+    return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+
+def build_messages(issue: str, device_type: Optional[str]) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Device type: {device_type or 'unknown'}\nIssue: {issue}"},
+    ]
+
+
+def parse_advice(content: str) -> Dict[str, Any]:
+    """Turn a completion into {suggestion, steps, priority}, tolerating non-JSON replies"""
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip())
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and data.get("suggestion"):
+        steps = data.get("steps") or []
+        priority = str(data.get("priority", "")).capitalize()
+        return {
+            "suggestion": str(data["suggestion"]),
+            "steps": [str(step) for step in steps] if isinstance(steps, list) else [str(steps)],
+            "priority": priority if priority in PRIORITIES else "Medium",
+        }
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        raise ValueError("Empty completion")
+    return {"suggestion": lines[0], "steps": lines[1:], "priority": "Medium"}
+
+
+class RemediationService:
+    def __init__(
+        self,
+        backend=None,
+        model: str = OPENAI_MODEL,
+        max_tokens: int = OPENAI_MAX_TOKENS,
+        max_concurrency: int = AI_BOT_MAX_CONCURRENCY,
+        timeout: float = AI_BOT_TIMEOUT,
+        session_factory=AsyncSessionLocal,
+        cache_size: int = AI_BOT_CACHE_SIZE,
+    ):
+        self.backend = backend
+        self.model = model
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.session_factory = session_factory
+        self._max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Cached advice never goes stale, so the TTL only bounds memory churn
+        self._memory = AsyncTTLCache(max_entries=cache_size, ttl=3600)
+        self.stats = {"backend_calls": 0, "stored_hits": 0, "failures": 0, "store_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        async with self.session_factory() as db:
+            return (await db.execute(
+                select(RemediationCache.response).filter(RemediationCache.cache_key == key)
+            )).scalar_one_or_none()
+
+    async def _store(self, key: str, issue: str, device_type: Optional[str], advice: Dict[str, Any]):
+        async with self.session_factory() as db:
+            dialect, insert = dialect_insert(db)
+            stmt = insert(RemediationCache.__table__).values(
+                cache_key=key, model=self.model, device_type=device_type, issue=issue, response=advice
+            )
+            # Another worker may have stored the same key meanwhile; keep its copy
+            if dialect == "mysql":
+                stmt = stmt.prefix_with("IGNORE")
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=["cache_key"])
+            await db.execute(stmt)
+            await db.commit()
+
+    async def _generate(self, key: str, issue: str, device_type: Optional[str]) -> Dict[str, Any]:
+        try:
+            stored = await self._load(key)
+        except Exception as e:
+            # The table is only a cache; go to the backend without it
+            logger.error(f"Remediation cache lookup failed: {str(e)}")
+            stored = None
+        if stored is not None:
+            self.stats["stored_hits"] += 1
+            return stored
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        try:
+            async with self._semaphore:
+                self.stats["backend_calls"] += 1
+                content = await asyncio.wait_for(
+                    self.backend.complete(build_messages(issue, device_type), self.model, self.max_tokens),
+                    self.timeout,
+                )
+            advice = parse_advice(content)
+        except Exception as e:
+            self.stats["failures"] += 1
+            raise AIBotUnavailable(f"AI backend failed: {type(e).__name__}: {e}") from e
+
+        try:
+            await self._store(key, issue, device_type, advice)
+        except Exception as e:
+            # The advice is already paid for; serve it and let a later miss store it
+            self.stats["store_errors"] += 1
+            logger.error(f"Storing remediation advice failed: {str(e)}")
+        return advice
+
+    async def remediate(self, issue: str, device_type: Optional[str] = None) -> Dict[str, Any]:
+        """Advice for an issue on a device type, generated at most once per normalized key"""
+        if not self.enabled:
+            raise AIBotUnavailable("AI backend is not configured")
+        key = cache_key(issue, device_type, self.model)
+        return await self._memory.get_or_compute(key, lambda: self._generate(key, issue, device_type))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "memory_cache": self._memory.metrics(), "enabled": self.enabled}
+
+
+# Global service; disabled unless an API key or a compatible endpoint is configured
+remediation_service = RemediationService(
+    backend=OpenAIBackend() if OPENAI_API_KEY or AI_BOT_BASE_URL else None
+)
@@ -0,0 +1,168 @@
+"""
+Issue classification for the fix assistant.
+
+Free-text issues are mapped to a response template by one precompiled
+pattern over every category's keywords; as before, the first category with
+a keyword anywhere in the issue wins. Issues no keyword matches can fall
+back to a TF-IDF model trained on the templates themselves (scikit-learn,
+optional): it is built lazily on first use and only consulted when it is
+installed and ASSISTANT_TFIDF is enabled. Results are memoized per
+normalized issue text, so a batch of repeated findings costs one lookup each.
+"""
+
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+ASSISTANT_TFIDF = os.getenv("ASSISTANT_TFIDF", "True").lower() == "true"
+ASSISTANT_TFIDF_MIN_SIMILARITY = float(os.getenv("ASSISTANT_TFIDF_MIN_SIMILARITY", "0.2"))
+ASSISTANT_CACHE_SIZE = int(os.getenv("ASSISTANT_CACHE_SIZE", "4096"))
+
+# AI-like response templates
+AI_RESPONSES = {
+    "weak_password": {
+        "suggestion": "I've detected a weak password vulnerability. This is a critical security issue that needs immediate attention.",
+        "steps": [
+            "1. Change the default password immediately",
+            "2. Use a strong password with at least 12 characters",
+            "3. Include uppercase, lowercase, numbers, and special characters",
+            "4. Avoid common words or patterns",
+            "5. Consider using a password manager"
+        ],
+        "priority": "Critical"
+    },
+    "open_port": {
+        "suggestion": "I found an open port that could be a security risk. Let's secure this immediately.",
+        "steps": [
+            "1. Identify if the port is necessary for device operation",
+            "2. Close unnecessary ports using firewall rules",
+            "3. Restrict port access to specific IP addresses",
+            "4. Monitor port access logs regularly",
+            "5. Consider using a VPN for remote access"
+        ],
+        "priority": "High"
+    },
+    "default_credentials": {
+        "suggestion": "Default credentials detected! This is one of the most common attack vectors for IoT devices.",
+        "steps": [
+            "1. Change default username and password immediately",
+            "2. Use unique credentials for each device",
+            "3. Enable two-factor authentication if available",
+            "4. Document credentials securely",
+            "5. Regularly rotate passwords"
+        ],
+        "priority": "Critical"
+    },
+    "firmware": {
+        "suggestion": "Your device firmware appears to be outdated. This could expose you to known vulnerabilities.",
+        "steps": [
+            "1. Check manufacturer's website for latest firmware",
+            "2. Download firmware from official sources only",
+            "3. Backup current configuration before updating",
+            "4. Test firmware update in safe environment",
+            "5. Schedule regular firmware update checks"
+        ],
+        "priority": "High"
+    },
+    "general": {
+        "suggestion": "I can help you improve your IoT device security. Let me provide some general recommendations.",
+        "steps": [
+            "1. Perform regular security audits",
+            "2. Keep all devices updated",
+            "3. Use strong, unique passwords",
+            "4. Enable security features like encryption",
+            "5. Monitor network traffic for anomalies"
+        ],
+        "priority": "Medium"
+    }
+}
+
+# Categories in priority order with the words that select them
+ISSUE_KEYWORDS = (
+    ("weak_password", ("password", "credential", "login")),
+    ("open_port", ("port", "open", "exposed")),
+    ("default_credentials", ("default", "factory")),
+    ("firmware", ("firmware", "update", "version")),
+)
+GENERAL = "general"
+
+_WORD_PRIORITY = {word: i for i, (_, words) in enumerate(ISSUE_KEYWORDS) for word in words}
+# Lookahead so overlapping keywords are all found in one pass
+_ISSUE_PATTERN = re.compile("(?=(" + "|".join(map(re.escape, _WORD_PRIORITY)) + "))")
+
+
+def normalize_issue(issue: str) -> str:
+    return " ".join(issue.lower().split())
+
+
+def match_keywords(issue: str) -> Optional[str]:
+    """Category of the highest-priority keyword in a normalized issue, if any"""
+    priorities = [_WORD_PRIORITY[match.group(1)] for match in _ISSUE_PATTERN.finditer(issue)]
+    return ISSUE_KEYWORDS[min(priorities)][0] if priorities else None
+
+
+class _TfidfModel:
+    """Nearest-template classifier, trained on first use"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._vectorizer = None
+        self._matrix = None
+        self._labels: List[str] = []
+
+    def _load(self):
+        try:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+        except ImportError:  # scikit-learn is optional
+            return
+        documents, labels = [], []
+        keywords = dict(ISSUE_KEYWORDS)
+        for category, template in AI_RESPONSES.items():
+            if category == GENERAL:
+                continue
+            text = " ".join([template["suggestion"], *template["steps"], *keywords.get(category, ())])
+            documents.append(text.lower())
+            labels.append(category)
+        self._vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)
+        self._matrix = self._vectorizer.fit_transform(documents)
+        self._labels = labels
+
+    def classify(self, issue: str) -> Tuple[Optional[str], float]:
+        """(category, cosine similarity) of the closest template, or (None, 0) without scikit-learn"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+                    self._loaded = True
+        if self._vectorizer is None:
+            return None, 0.0
+        # Rows are L2-normalized, so the dot product is the cosine similarity
+        similarities = (self._matrix @ self._vectorizer.transform([issue]).T).toarray().ravel()
+        best = int(similarities.argmax())
+        return self._labels[best], float(similarities[best])
+
+
+tfidf_model = _TfidfModel()
+
+
+@lru_cache(maxsize=ASSISTANT_CACHE_SIZE)
+def _classify(issue: str) -> str:
+    category = match_keywords(issue)
+    if category is None and ASSISTANT_TFIDF:
+        category, similarity = tfidf_model.classify(issue)
+        if similarity < ASSISTANT_TFIDF_MIN_SIMILARITY:
+            category = None
+    return category or GENERAL
+
+
+def classify_issue(issue: str) -> str:
+    """Response template category for a free-text issue"""
+    return _classify(normalize_issue(issue))
+
+
+def cache_metrics() -> Dict[str, int]:
+    info = _classify.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "entries": info.currsize}
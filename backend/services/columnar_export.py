@@ -0,0 +1,251 @@
+"""
+Columnar (Parquet) export of scan and vulnerability history.
+
+Writes hive-style day partitions for offline analysis:
+
+    <output>/devices/day=YYYY-MM-DD/part-0.parquet          one row per device per scan
+    <output>/open_ports/day=YYYY-MM-DD/part-0.parquet       one row per open port per scan
+    <output>/vulnerabilities/day=YYYY-MM-DD/part-0.parquet  findings by detected_at day
+
+Exports are incremental: a watermark file in the output directory records the
+last complete UTC day exported per source, and each run only writes the
+complete days after it. Rows are read in chunks through server-side cursors
+and written in row groups, so memory stays bounded however much history
+there is. Each partition is written to a temporary file and renamed into
+place, so readers never see a half-written file.
+"""
+
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.db import SessionLocal
+from database.models import ScanResult, Vulnerability
+from production import PARQUET_EXPORT_PATH, PARQUET_ROW_GROUP_SIZE, PARQUET_READ_CHUNK_SIZE
+from services.rollups import to_naive_utc
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+WATERMARK_FILE = "_watermark.json"
+
+
+def _schemas():
+    timestamp = pa.timestamp("us")
+    return {
+        "devices": pa.schema([
+            ("scan_id", pa.int64()), ("scan_type", pa.string()), ("scanned_at", timestamp),
+            ("ip", pa.string()), ("mac", pa.string()), ("device_name", pa.string()),
+            ("device_type", pa.string()), ("risk_level", pa.string()), ("status", pa.string()),
+            ("open_port_count", pa.int32()), ("vulnerability_count", pa.int32()),
+        ]),
+        "open_ports": pa.schema([
+            ("scan_id", pa.int64()), ("scanned_at", timestamp), ("ip", pa.string()),
+            ("port", pa.int32()), ("service", pa.string()), ("status", pa.string()),
+            ("banner", pa.string()),
+        ]),
+        "vulnerabilities": pa.schema([
+            ("id", pa.int64()), ("ip", pa.string()), ("port", pa.int32()),
+            ("vulnerability_type", pa.string()), ("description", pa.string()),
+            ("severity", pa.string()), ("status", pa.string()),
+            ("detected_at", timestamp), ("fixed_at", timestamp),
+            ("first_seen", timestamp), ("last_seen", timestamp),
+            ("occurrence_count", pa.int32()),
+        ]),
+    }
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet export requires the 'pyarrow' package")
+
+
+def read_watermark(output_dir: str) -> Dict[str, str]:
+    """Last exported day (ISO date) per source; empty before the first export"""
+    path = Path(output_dir) / WATERMARK_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def _write_watermark(output_dir: str, watermark: Dict[str, str]):
+    path = Path(output_dir) / WATERMARK_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(watermark, indent=2, sort_keys=True))
+    os.replace(tmp, path)
+
+
+class _PartitionWriter:
+    """Buffers rows for one day partition and writes them in row groups"""
+
+    def __init__(self, output_dir: str, table: str, day: date, schema, row_group_size: int):
+        directory = Path(output_dir) / table / f"day={day.isoformat()}"
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / "part-0.parquet"
+        self._tmp = directory / ".part-0.parquet.tmp"
+        self._schema = schema
+        self._row_group_size = row_group_size
+        self._writer = pq.ParquetWriter(str(self._tmp), schema, compression="zstd")
+        self._rows: List[Dict[str, Any]] = []
+        self.written = 0
+
+    def add(self, row: Dict[str, Any]):
+        self._rows.append(row)
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(pa.Table.from_pylist(self._rows, schema=self._schema))
+            self.written += len(self._rows)
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._writer.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+def _partitioned(
+    rows: Iterable[Tuple[date, str, Dict[str, Any]]],
+    output_dir: str,
+    row_group_size: int,
+) -> Dict[str, List[str]]:
+    """
+    Write (day, table, row) tuples, which must arrive in day order, to their
+    partitions; returns the partition paths written per table.
+    """
+    schemas = _schemas()
+    writers: Dict[str, _PartitionWriter] = {}
+    current_day = None
+    written: Dict[str, List[str]] = {}
+
+    def close_all():
+        for table, writer in writers.items():
+            writer.close()
+            written.setdefault(table, []).append(str(writer.path))
+        writers.clear()
+
+    try:
+        for day, table, row in rows:
+            if day != current_day:
+                close_all()
+                current_day = day
+            if table not in writers:
+                writers[table] = _PartitionWriter(output_dir, table, day, schemas[table], row_group_size)
+            writers[table].add(row)
+        close_all()
+    except Exception:
+        for writer in writers.values():
+            writer.abort()
+        raise
+    return written
+
+
+def _scan_rows(db: Session, start: datetime, end: datetime, chunk_size: int) -> Iterator[Tuple[date, str, Dict[str, Any]]]:
+    scans = db.execute(
+        select(ScanResult.id, ScanResult.scan_type, ScanResult.timestamp, ScanResult.result)
+        .filter(ScanResult.timestamp >= start, ScanResult.timestamp < end,
+                ScanResult.status != "in_progress")
+        .order_by(ScanResult.timestamp, ScanResult.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    for scan in scans:
+        scanned_at = to_naive_utc(scan.timestamp)
+        day = scanned_at.date()
+        for device in scan.result or []:
+            ports = [p for p in device.get('open_ports', []) if p.get('status') == 'open']
+            yield day, "devices", {
+                "scan_id": scan.id,
+                "scan_type": scan.scan_type,
+                "scanned_at": scanned_at,
+                "ip": device.get('ip'),
+                "mac": device.get('mac'),
+                "device_name": device.get('device_name'),
+                "device_type": device.get('device_type'),
+                "risk_level": device.get('risk_level'),
+                "status": device.get('status'),
+                "open_port_count": len(ports),
+                "vulnerability_count": len(device.get('vulnerabilities', [])),
+            }
+            for port in ports:
+                yield day, "open_ports", {
+                    "scan_id": scan.id,
+                    "scanned_at": scanned_at,
+                    "ip": device.get('ip'),
+                    "port": int(port['port']),
+                    "service": port.get('service'),
+                    "status": port.get('status'),
+                    "banner": port.get('banner'),
+                }
+
+
+def _vulnerability_rows(db: Session, start: datetime, end: datetime, chunk_size: int) -> Iterator[Tuple[date, str, Dict[str, Any]]]:
+    findings = db.execute(
+        select(Vulnerability.id, Vulnerability.ip, Vulnerability.port, Vulnerability.vulnerability_type,
+               Vulnerability.description, Vulnerability.severity, Vulnerability.status,
+               Vulnerability.detected_at, Vulnerability.fixed_at, Vulnerability.first_seen,
+               Vulnerability.last_seen, Vulnerability.occurrence_count)
+        .filter(Vulnerability.detected_at >= start, Vulnerability.detected_at < end)
+        .order_by(Vulnerability.detected_at, Vulnerability.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    for finding in findings:
+        row = dict(finding._mapping)
+        for key in ("detected_at", "fixed_at", "first_seen", "last_seen"):
+            if row[key] is not None:
+                row[key] = to_naive_utc(row[key])
+        yield row["detected_at"].date(), "vulnerabilities", row
+
+
+def export_parquet(
+    output_dir: str = PARQUET_EXPORT_PATH,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    session_factory: Callable[[], Session] = SessionLocal,
+    row_group_size: int = PARQUET_ROW_GROUP_SIZE,
+    chunk_size: int = PARQUET_READ_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Export complete UTC days after each source's watermark (or from since),
+    up to but excluding until (default: today), and advance the watermark.
+    """
+    require_pyarrow()
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    until = until or datetime.now(timezone.utc).date()
+    watermark = read_watermark(output_dir)
+    # Watermark source -> reader; scans feed devices and open_ports
+    readers = {"scans": _scan_rows, "vulnerabilities": _vulnerability_rows}
+    summary = {"partitions": {}, "watermark": watermark}
+
+    for source, read_rows in readers.items():
+        if since is not None:
+            first_day = since
+        elif source in watermark:
+            first_day = date.fromisoformat(watermark[source]) + timedelta(days=1)
+        else:
+            first_day = date.min
+        if first_day >= until:
+            continue
+
+        start = datetime.combine(first_day, datetime.min.time())
+        end = datetime.combine(until, datetime.min.time())
+        with session_factory() as db:
+            written = _partitioned(read_rows(db, start, end, chunk_size), output_dir, row_group_size)
+        summary["partitions"].update(written)
+        watermark[source] = (until - timedelta(days=1)).isoformat()
+        _write_watermark(output_dir, watermark)
+
+    return summary
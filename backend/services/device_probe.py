@@ -0,0 +1,298 @@
+"""
+Single-device deep probe for /device/scan.
+
+One probe checks the camera port set with TCP connects, sends RTSP OPTIONS
+and DESCRIBE, reads HTTP(S) response headers and asks ONVIF for device
+information. All of it runs concurrently on the event loop under one
+per-device deadline (DEVICE_PROBE_DEADLINE); checks still running when it
+expires are cancelled and reported as timed out, so a probe never takes
+longer than the deadline however many ports are filtered.
+
+Results are cached per (ip, port) for DEVICE_PROBE_CACHE_TTL seconds and
+concurrent probes of the same device share one run, so repeated clicks on
+the same camera are served from memory.
+"""
+
+import asyncio
+import ipaddress
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from services.cache import AsyncTTLCache
+
+DEVICE_PROBE_PORTS = [int(p) for p in os.getenv("DEVICE_PROBE_PORTS", "21,22,23,80,443,554,8000,8080,8554,37777").split(",") if p.strip()]
+DEVICE_PROBE_DEADLINE = float(os.getenv("DEVICE_PROBE_DEADLINE", "5"))
+DEVICE_PROBE_CONNECT_TIMEOUT = float(os.getenv("DEVICE_PROBE_CONNECT_TIMEOUT", "1.5"))
+DEVICE_PROBE_CACHE_TTL = float(os.getenv("DEVICE_PROBE_CACHE_TTL", "30"))
+DEVICE_PROBE_CACHE_SIZE = int(os.getenv("DEVICE_PROBE_CACHE_SIZE", "256"))
+
+RTSP_PORTS = {554, 8554}
+HTTP_PORTS = {80, 8000, 8080}
+HTTPS_PORTS = {443, 8443}
+MAX_HEADER_BYTES = 16384
+MAX_BODY_BYTES = 65536
+
+ONVIF_PATH = "/onvif/device_service"
+ONVIF_GET_DEVICE_INFORMATION = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope">'
+    '<s:Body xmlns:tds="http://www.onvif.org/ver10/device/wsdl">'
+    "<tds:GetDeviceInformation/>"
+    "</s:Body></s:Envelope>"
+)
+ONVIF_FIELDS = ("Manufacturer", "Model", "FirmwareVersion", "SerialNumber", "HardwareId")
+
+
+def _host(ip: str) -> str:
+    return f"[{ip}]" if ipaddress.ip_address(ip).version == 6 else ip
+
+
+async def _connect(ip: str, port: int, timeout: float):
+    return await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+async def check_port(ip: str, port: int, timeout: float = DEVICE_PROBE_CONNECT_TIMEOUT) -> str:
+    """open, closed (refused) or filtered (no answer within timeout)"""
+    try:
+        _, writer = await _connect(ip, port, timeout)
+    except asyncio.TimeoutError:
+        return "filtered"
+    except OSError:
+        return "closed"
+    await _close(writer)
+    return "open"
+
+
+def parse_rtsp_response(head: bytes) -> Dict[str, Any]:
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("RTSP/") or not parts[1].isdigit():
+        raise ValueError(f"Not an RTSP response: {lines[0][:80]!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return {"status": int(parts[1]), "reason": parts[2] if len(parts) > 2 else "", "headers": headers}
+
+
+async def _rtsp_request(reader, writer, method: str, url: str, cseq: int, extra: str = "") -> Dict[str, Any]:
+    writer.write(
+        f"{method} {url} RTSP/1.0\r\nCSeq: {cseq}\r\nUser-Agent: ScannerEyes\r\n{extra}\r\n".encode("ascii")
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    if len(head) > MAX_HEADER_BYTES:
+        raise ValueError("RTSP response header too large")
+    response = parse_rtsp_response(head)
+    length = int(response["headers"].get("content-length", "0") or 0)
+    body = await reader.readexactly(min(length, MAX_BODY_BYTES)) if length else b""
+    response["body"] = body.decode("utf-8", "replace")
+    return response
+
+
+async def probe_rtsp(ip: str, port: int, timeout: float = DEVICE_PROBE_CONNECT_TIMEOUT) -> Dict[str, Any]:
+    """OPTIONS then DESCRIBE on one connection, as a client would before SETUP"""
+    reader, writer = await _connect(ip, port, timeout)
+    try:
+        url = f"rtsp://{_host(ip)}:{port}/"
+        options = await _rtsp_request(reader, writer, "OPTIONS", url, 1)
+        describe = await _rtsp_request(reader, writer, "DESCRIBE", url, 2, "Accept: application/sdp\r\n")
+    finally:
+        await _close(writer)
+    challenge = describe["headers"].get("www-authenticate")
+    return {
+        "port": port,
+        "server": options["headers"].get("server") or describe["headers"].get("server"),
+        "methods": [m.strip() for m in options["headers"].get("public", "").split(",") if m.strip()],
+        "options_status": options["status"],
+        "describe_status": describe["status"],
+        "auth_required": describe["status"] == 401,
+        "auth_scheme": challenge.split(" ", 1)[0] if challenge else None,
+        "stream_exposed": describe["status"] == 200 and "m=video" in describe["body"],
+    }
+
+
+async def probe_http(client: httpx.AsyncClient, ip: str, port: int, tls: bool) -> Dict[str, Any]:
+    response = await client.get(f"{'https' if tls else 'http'}://{_host(ip)}:{port}/")
+    challenge = response.headers.get("www-authenticate")
+    return {
+        "port": port,
+        "tls": tls,
+        "status": response.status_code,
+        "server": response.headers.get("server"),
+        "auth_scheme": challenge.split(" ", 1)[0] if challenge else None,
+        "location": response.headers.get("location"),
+    }
+
+
+def parse_onvif_device_information(xml: str) -> Dict[str, str]:
+    info = {}
+    for field in ONVIF_FIELDS:
+        match = re.search(rf"<(?:[\w-]+:)?{field}>([^<]*)</", xml)
+        if match:
+            info[field] = match.group(1).strip()
+    return info
+
+
+async def probe_onvif(client: httpx.AsyncClient, ip: str, port: int) -> Dict[str, Any]:
+    response = await client.post(
+        f"http://{_host(ip)}:{port}{ONVIF_PATH}",
+        content=ONVIF_GET_DEVICE_INFORMATION,
+        headers={"Content-Type": "application/soap+xml; charset=utf-8"},
+    )
+    info = parse_onvif_device_information(response.text) if response.status_code == 200 else {}
+    return {
+        "port": port,
+        "status": response.status_code,
+        # Device info answered without credentials
+        "auth_required": response.status_code in (400, 401, 403) and not info,
+        "device_info": info or None,
+    }
+
+
+def detect_vulnerabilities(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Findings in the shape NetworkScanner.detect_vulnerabilities uses"""
+    vulnerabilities = []
+
+    def add(type_, severity, description, port, fix):
+        vulnerabilities.append({
+            "type": type_, "severity": severity, "description": description,
+            "port": port, "cve": None, "fix_suggestion": fix,
+        })
+
+    ports = result["ports"]
+    if ports.get(23) == "open":
+        add("Telnet Service", "Critical", "Telnet service detected - unencrypted communication", 23,
+            "Disable Telnet and use SSH instead")
+    if ports.get(21) == "open":
+        add("FTP Service", "High", "FTP service detected - potentially unencrypted file transfer", 21,
+            "Use SFTP or FTPS for secure file transfer")
+    for rtsp in result["rtsp"]:
+        if rtsp.get("stream_exposed") or (rtsp.get("describe_status") == 200 and not rtsp.get("auth_required")):
+            add("Unauthenticated RTSP Stream", "Critical", "RTSP DESCRIBE answered without credentials", rtsp["port"],
+                "Ensure RTSP service requires authentication")
+        elif rtsp.get("auth_scheme") == "Basic":
+            add("RTSP Basic Authentication", "High", "RTSP accepts Basic auth, sending credentials in clear text",
+                rtsp["port"], "Switch the camera to Digest authentication")
+        if "describe_status" in rtsp:
+            add("RTSP Stream Not Encrypted", "Medium", "RTSP stream is served without TLS (RTSPS/SRTP)", rtsp["port"],
+                "Use RTSPS or tunnel the stream over a VPN")
+    for http in result["http"]:
+        if http.get("status") and not http["tls"] and http["status"] < 400 and not http.get("auth_scheme"):
+            add("Unsecured Camera Web Interface", "High", "Web interface reachable over plain HTTP without authentication",
+                http["port"], "Enable HTTPS and change default credentials")
+        elif http.get("auth_scheme") == "Basic" and not http["tls"]:
+            add("HTTP Basic Authentication", "High", "Web interface uses Basic auth over plain HTTP", http["port"],
+                "Enable HTTPS or switch to Digest authentication")
+    onvif = result["onvif"]
+    if onvif and onvif.get("device_info"):
+        add("Unauthenticated ONVIF", "High", "ONVIF GetDeviceInformation answered without credentials", onvif["port"],
+            "Enable ONVIF user authentication or disable ONVIF if unused")
+    return vulnerabilities
+
+
+class DeviceProber:
+    def __init__(
+        self,
+        ports: List[int] = DEVICE_PROBE_PORTS,
+        deadline: float = DEVICE_PROBE_DEADLINE,
+        connect_timeout: float = DEVICE_PROBE_CONNECT_TIMEOUT,
+        cache_ttl: float = DEVICE_PROBE_CACHE_TTL,
+        cache_size: int = DEVICE_PROBE_CACHE_SIZE,
+    ):
+        self.ports = list(ports)
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self._cache = AsyncTTLCache(max_entries=cache_size, ttl=cache_ttl)
+        self.stats = {"probes": 0, "deadline_hits": 0}
+
+    async def _run(self, ip: str, port: int) -> Dict[str, Any]:
+        self.stats["probes"] += 1
+        started = time.monotonic()
+        ports = sorted(set(self.ports) | {port})
+        rtsp_ports = sorted(RTSP_PORTS & set(ports) | ({port} - HTTP_PORTS - HTTPS_PORTS))
+        http_ports = sorted((HTTP_PORTS | HTTPS_PORTS) & set(ports))
+        onvif_port = port if port in HTTP_PORTS else 80
+
+        async with httpx.AsyncClient(
+            timeout=httpx.Timeout(self.deadline, connect=self.connect_timeout),
+            verify=False,
+            follow_redirects=False,
+        ) as client:
+            tasks = {}
+            for p in ports:
+                tasks[("port", p)] = asyncio.create_task(check_port(ip, p, self.connect_timeout))
+            for p in rtsp_ports:
+                tasks[("rtsp", p)] = asyncio.create_task(probe_rtsp(ip, p, self.connect_timeout))
+            for p in http_ports:
+                tasks[("http", p)] = asyncio.create_task(probe_http(client, ip, p, p in HTTPS_PORTS))
+            tasks[("onvif", onvif_port)] = asyncio.create_task(probe_onvif(client, ip, onvif_port))
+
+            _, pending = await asyncio.wait(tasks.values(), timeout=self.deadline)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self.stats["deadline_hits"] += 1
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        result = {"ports": {}, "rtsp": [], "http": [], "onvif": None}
+        for (kind, p), task in tasks.items():
+            if task.cancelled():
+                outcome = {"port": p, "error": "timeout"}
+            elif task.exception() is not None:
+                # Refused, reset or not speaking the protocol: nothing to report
+                outcome = None
+            else:
+                outcome = task.result()
+            if kind == "port":
+                result["ports"][p] = outcome if isinstance(outcome, str) else "filtered"
+            elif kind == "onvif":
+                result["onvif"] = outcome
+            elif outcome is not None:
+                result[kind].append(outcome)
+
+        open_ports = [p for p, state in result["ports"].items() if state == "open"]
+        status = result["ports"][port]
+        return {
+            "ip": ip,
+            "port": port,
+            "status": status,
+            "open_ports": open_ports,
+            "ports": result["ports"],
+            "rtsp": result["rtsp"],
+            "http": result["http"],
+            "onvif": result["onvif"],
+            "vulnerabilities": detect_vulnerabilities(result),
+            "timed_out": sorted(f"{kind}:{p}" for (kind, p), task in tasks.items() if task.cancelled()),
+            "duration_ms": round((time.monotonic() - started) * 1000),
+            "scanned_at": datetime.utcnow().isoformat(),
+        }
+
+    async def probe(self, ip: str, port: int, refresh: bool = False) -> Dict[str, Any]:
+        """Deep probe of one device, served from the per-(ip, port) cache unless refresh is set"""
+        ip = str(ipaddress.ip_address(ip))
+        key = (ip, port)
+        if refresh:
+            self._cache.invalidate(key)
+        return await self._cache.get_or_compute(key, lambda: self._run(ip, port))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "cache": self._cache.metrics()}
+
+
+# Global prober (one result cache per process)
+device_prober = DeviceProber()
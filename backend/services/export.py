@@ -0,0 +1,159 @@
+"""
+Streaming dataset export.
+
+Scans, devices and vulnerabilities are read with server-side cursors
+(yield_per) and written out chunk by chunk as CSV, NDJSON or a JSON array,
+optionally gzip-compressed on the fly. Memory use stays constant no matter
+how many rows are exported, so the generators can be handed straight to a
+StreamingResponse.
+"""
+
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.db import SessionLocal
+from database.models import Device, ScanResult, Vulnerability
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+# Bytes buffered before a chunk is handed to the response
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+# dataset -> (columns, time column used for range filters)
+EXPORT_DATASETS = {
+    "scans": (
+        (ScanResult.id, ScanResult.ip, ScanResult.scan_type, ScanResult.status,
+         ScanResult.timestamp, ScanResult.device_count, ScanResult.ports),
+        ScanResult.timestamp,
+    ),
+    "devices": (
+        (Device.id, Device.ip, Device.mac, Device.device_name, Device.device_type,
+         Device.risk_level, Device.open_ports, Device.status, Device.first_seen,
+         Device.last_seen, Device.last_scan_id),
+        Device.last_seen,
+    ),
+    "vulnerabilities": (
+        (Vulnerability.id, Vulnerability.ip, Vulnerability.port, Vulnerability.vulnerability_type,
+         Vulnerability.description, Vulnerability.severity, Vulnerability.status,
+         Vulnerability.detected_at, Vulnerability.fixed_at, Vulnerability.first_seen,
+         Vulnerability.last_seen, Vulnerability.occurrence_count),
+        Vulnerability.detected_at,
+    ),
+}
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+def _export_columns(dataset: str, include_results: bool):
+    columns, time_column = EXPORT_DATASETS[dataset]
+    if dataset == "scans" and include_results:
+        columns = columns + (ScanResult.result,)
+    return columns, time_column
+
+
+def export_fields(dataset: str, include_results: bool = False):
+    """Field names of a dataset's rows, in export order"""
+    return [column.key for column in _export_columns(dataset, include_results)[0]]
+
+
+def iter_export_rows(
+    dataset: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_results: bool = False,
+    session_factory: Callable[[], Session] = SessionLocal,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """Yield a dataset's rows as dicts, oldest id first, fetched chunk_size at a time"""
+    columns, time_column = _export_columns(dataset, include_results)
+    query = select(*columns).order_by(columns[0])
+    if start is not None:
+        query = query.filter(time_column >= start)
+    if end is not None:
+        query = query.filter(time_column <= end)
+
+    with session_factory() as db:
+        result = db.execute(query.execution_options(yield_per=chunk_size))
+        for row in result:
+            yield dict(row._mapping)
+
+
+def _buffered(pieces: Iterable[str]) -> Iterator[bytes]:
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= EXPORT_FLUSH_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def _csv_lines(rows: Iterable[Dict[str, Any]], fields: List[str]) -> Iterator[str]:
+    line = io.StringIO()
+    writer = csv.writer(line)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([_csv_value(row[key]) for key in fields])
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+
+
+def _ndjson_lines(rows: Iterable[Dict[str, Any]], fields: List[str]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, default=_json_default) + "\n"
+
+
+def _json_array(rows: Iterable[Dict[str, Any]], fields: List[str]) -> Iterator[str]:
+    yield "["
+    separator = ""
+    for row in rows:
+        yield separator + json.dumps(row, default=_json_default)
+        separator = ","
+    yield "]"
+
+
+WRITERS = {"csv": _csv_lines, "ndjson": _ndjson_lines, "json": _json_array}
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a byte stream incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(rows: Iterable[Dict[str, Any]], fields: List[str], format: str, gzip: bool = False) -> Iterator[bytes]:
+    """Serialize rows to an encoded (and optionally gzipped) byte stream"""
+    chunks = _buffered(WRITERS[format](rows, fields))
+    return gzip_stream(chunks) if gzip else chunks
@@ -0,0 +1,179 @@
+"""
+Batched iptables port rules.
+
+Rules this service manages carry an iptables comment, so they can be told
+apart from everything else in the chain. A snapshot of them (parsed from
+iptables-save) is cached for listing and dry runs. apply() always diffs a
+batch of desired port states against a fresh iptables-save, since other
+workers and admins change the chain too, and applies all resulting
+deletions and insertions in a single iptables-restore --noflush run, which
+commits the table atomically: either every change lands or none does. A
+batch costs one save and one restore. Duplicate rules for a port are
+collapsed to one as a side effect.
+
+Commands run without a shell through an injectable runner; the iptables
+binaries can be pointed at stub scripts with FIREWALL_SAVE_CMD and
+FIREWALL_RESTORE_CMD.
+"""
+
+import os
+import shlex
+import subprocess
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+FIREWALL_SAVE_CMD = os.getenv("FIREWALL_SAVE_CMD", "sudo iptables-save -t filter")
+FIREWALL_RESTORE_CMD = os.getenv("FIREWALL_RESTORE_CMD", "sudo iptables-restore --noflush")
+FIREWALL_CHAIN = os.getenv("FIREWALL_CHAIN", "INPUT")
+FIREWALL_SNAPSHOT_TTL = float(os.getenv("FIREWALL_SNAPSHOT_TTL", "300"))
+RULE_COMMENT = "scanner-eyes"
+
+ACTION_TARGETS = {"open": "ACCEPT", "close": "DROP"}
+TARGET_ACTIONS = {target: action for action, target in ACTION_TARGETS.items()}
+
+# A managed rule as found in iptables-save; line is its exact -A spec
+ManagedRule = namedtuple("ManagedRule", "proto port target line")
+
+# (args, stdin) -> (returncode, stdout, stderr)
+CommandRunner = Callable[[List[str], Optional[str]], Tuple[int, str, str]]
+
+
+class FirewallError(Exception):
+    """iptables-save or iptables-restore failed"""
+
+
+def subprocess_runner(args: List[str], input: Optional[str] = None) -> Tuple[int, str, str]:
+    try:
+        p = subprocess.run(args, input=input, capture_output=True, text=True)
+    except OSError as e:
+        # Missing sudo/iptables binary or no permission to run it: report it like a failed command
+        return 127, "", str(e)
+    return p.returncode, p.stdout.strip(), p.stderr.strip()
+
+
+def rule_spec(chain: str, proto: str, port: int, target: str) -> str:
+    return f"{chain} -p {proto} -m {proto} --dport {port} -m comment --comment {RULE_COMMENT} -j {target}"
+
+
+def parse_managed_rules(saved: str, chain: str = FIREWALL_CHAIN) -> List[ManagedRule]:
+    """Managed rules of chain in iptables-save output, in chain order"""
+    rules = []
+    for line in saved.splitlines():
+        if not line.startswith(f"-A {chain} "):
+            continue
+        tokens = shlex.split(line)
+        options = {}
+        for i, token in enumerate(tokens[:-1]):
+            if token in ("-p", "--dport", "-j", "--comment"):
+                options[token] = tokens[i + 1]
+        if options.get("--comment") != RULE_COMMENT or not options.get("--dport", "").isdigit():
+            continue
+        rules.append(ManagedRule(options.get("-p"), int(options["--dport"]), options.get("-j"), line))
+    return rules
+
+
+class Firewall:
+    def __init__(
+        self,
+        runner: CommandRunner = subprocess_runner,
+        save_cmd: str = FIREWALL_SAVE_CMD,
+        restore_cmd: str = FIREWALL_RESTORE_CMD,
+        chain: str = FIREWALL_CHAIN,
+        snapshot_ttl: float = FIREWALL_SNAPSHOT_TTL,
+    ):
+        self.runner = runner
+        self.save_cmd = shlex.split(save_cmd)
+        self.restore_cmd = shlex.split(restore_cmd)
+        self.chain = chain
+        self.snapshot_ttl = snapshot_ttl
+        self._snapshot: Optional[List[ManagedRule]] = None
+        self._snapshot_at = 0.0
+        self._lock = threading.Lock()
+
+    def _read(self) -> List[ManagedRule]:
+        code, out, err = self.runner(self.save_cmd, None)
+        if code != 0:
+            raise FirewallError(f"{' '.join(self.save_cmd)} failed: {err or out}")
+        return parse_managed_rules(out, self.chain)
+
+    def _current(self, refresh: bool) -> List[ManagedRule]:
+        if refresh or self._snapshot is None or time.monotonic() - self._snapshot_at > self.snapshot_ttl:
+            self._snapshot = self._read()
+            self._snapshot_at = time.monotonic()
+        return self._snapshot
+
+    def rules(self, refresh: bool = False) -> List[ManagedRule]:
+        """Managed rules, from the cached snapshot unless it is stale or refresh is set"""
+        with self._lock:
+            return list(self._current(refresh))
+
+    def plan(self, desired: Dict[Tuple[str, int], str], current: Iterable[ManagedRule], replace: bool = False):
+        """
+        (removed, added) rules turning current into desired.
+
+        desired maps (proto, port) to ACCEPT/DROP. A port already covered by
+        exactly one matching rule is left alone; otherwise its rules are
+        removed and one is inserted. With replace, managed rules for ports
+        not in desired are removed too.
+        """
+        by_key: Dict[Tuple[str, int], List[ManagedRule]] = {}
+        for rule in current:
+            by_key.setdefault((rule.proto, rule.port), []).append(rule)
+
+        removed, added = [], []
+        for key, target in desired.items():
+            existing = by_key.get(key, [])
+            if len(existing) == 1 and existing[0].target == target:
+                continue
+            removed.extend(existing)
+            added.append(ManagedRule(key[0], key[1], target, f"-I {rule_spec(self.chain, key[0], key[1], target)}"))
+        if replace:
+            for key, existing in by_key.items():
+                if key not in desired:
+                    removed.extend(existing)
+        return removed, added
+
+    @staticmethod
+    def restore_script(removed: Iterable[ManagedRule], added: Iterable[ManagedRule]) -> str:
+        lines = ["*filter"]
+        lines += ["-D" + rule.line[2:] for rule in removed]
+        lines += [rule.line for rule in added]
+        lines.append("COMMIT")
+        return "\n".join(lines) + "\n"
+
+    def apply(self, desired: Dict[Tuple[str, int], str], replace: bool = False,
+              dry_run: bool = False, refresh: bool = False) -> Dict[str, object]:
+        """
+        Bring the managed rules to the desired state in one atomic iptables-restore run.
+
+        The diff is taken against a fresh iptables-save; only a dry run may
+        use the cached snapshot (unless refresh is set).
+        """
+        with self._lock:
+            current = self._current(refresh or not dry_run)
+            removed, added = self.plan(desired, current, replace)
+            script = self.restore_script(removed, added)
+            result = {"removed": removed, "added": added, "script": script, "applied": False}
+            if dry_run or not (removed or added):
+                return result
+
+            code, out, err = self.runner(self.restore_cmd, script)
+            if code != 0:
+                # The table is unchanged, but re-read it next time in case it moved underneath us
+                self._snapshot = None
+                raise FirewallError(f"{' '.join(self.restore_cmd)} failed: {err or out}")
+
+            removed_lines = {rule.line for rule in removed}
+            kept = [rule for rule in current if rule.line not in removed_lines]
+            # -I puts each new rule at the top, so the last inserted comes first
+            self._snapshot = [
+                rule._replace(line="-A" + rule.line[2:]) for rule in reversed(added)
+            ] + kept
+            result["applied"] = True
+            return result
+
+
+# Global firewall (one snapshot per process)
+firewall = Firewall()
@@ -0,0 +1,38 @@
+"""
+Database-backed generation counters.
+
+Cached responses are keyed by the current generation, so a bump from any
+worker (or a CLI job) invalidates every worker's cache on its next read.
+Bumps run inside the writer's transaction and only become visible when it
+commits.
+"""
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database.dialects import dialect_insert
+from database.models import DataGeneration
+
+# Scan results, inventory and vulnerability findings
+ANALYTICS = "analytics"
+
+
+def bump_generation(db: Session, name: str = ANALYTICS):
+    """Increment a generation counter, creating it on first use"""
+    table = DataGeneration.__table__
+    dialect, insert = dialect_insert(db)
+    stmt = insert(table).values(name=name, value=1)
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update(value=table.c.value + 1)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=["name"], set_={"value": table.c.value + 1})
+    db.execute(stmt)
+
+
+async def get_generation(db: AsyncSession, name: str = ANALYTICS) -> int:
+    """Current value of a generation counter (0 if never bumped)"""
+    value = (await db.execute(
+        select(DataGeneration.value).filter(DataGeneration.name == name)
+    )).scalar_one_or_none()
+    return value or 0
@@ -0,0 +1,192 @@
+"""
+Device inventory.
+
+Each scan is folded into the devices table, and every difference from the
+previous state is appended to device_changes. Questions such as "which
+cameras appeared this week" or "which ports opened since yesterday" then
+read the change log instead of diffing stored scan results.
+
+devices.ip is unique, so an address is freed before a device moves onto
+it: a row without a MAC holding it is the same device seen before its MAC
+was known and is merged into the moving row; a row with another MAC is
+parked on a placeholder address (unassigned:<id>) until it shows up again,
+which also makes DHCP swaps within one scan work.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Iterable
+
+from sqlalchemy import select, or_, update
+from sqlalchemy.orm import Session, undefer
+
+from database.models import Device, DeviceChange, ScanResult
+
+
+def _open_ports(device: Dict[str, Any]) -> List[int]:
+    return sorted({p['port'] for p in device.get('open_ports', []) if p.get('status') == 'open'})
+
+
+def _find_existing(db: Session, devices: List[Dict[str, Any]]) -> Dict[str, Dict[str, Device]]:
+    """Load the inventory rows matching this batch by MAC or IP in one query"""
+    ips = {d['ip'] for d in devices}
+    macs = {d['mac'] for d in devices if d.get('mac')}
+    criteria = [Device.ip.in_(ips)]
+    if macs:
+        criteria.append(Device.mac.in_(macs))
+    rows = db.execute(select(Device).filter(or_(*criteria))).scalars().all()
+    return {
+        "ip": {row.ip: row for row in rows},
+        "mac": {row.mac: row for row in rows if row.mac},
+    }
+
+
+def _placeholder_ip(row: Device) -> str:
+    return f"unassigned:{row.id}"
+
+
+def _merge_into(db: Session, row: Device, duplicate: Device):
+    """Fold a MAC-less row into the MAC-matched row for the same device and delete it"""
+    row.open_ports = sorted(set(row.open_ports or []) | set(duplicate.open_ports or []))
+    row.first_seen = min(filter(None, (row.first_seen, duplicate.first_seen)), default=row.first_seen)
+    row.device_name = row.device_name or duplicate.device_name
+    row.device_type = row.device_type or duplicate.device_type
+    db.execute(update(DeviceChange).where(DeviceChange.device_id == duplicate.id).values(device_id=row.id))
+    db.delete(duplicate)
+
+
+def update_inventory(
+    db: Session,
+    devices: List[Dict[str, Any]],
+    scan_id: Optional[int] = None,
+    scanned_ports: Optional[Iterable[int]] = None,
+    seen_at: Optional[datetime] = None,
+) -> int:
+    """
+    Fold scanned devices into the inventory and record what changed.
+
+    A port is only reported closed if it was part of this scan, so a quick
+    scan over fewer ports does not look like ports closing.
+    The caller owns the transaction. Returns the number of change events.
+    """
+    if not devices:
+        return 0
+    seen_at = seen_at or datetime.now(timezone.utc)
+    scanned = set(scanned_ports) if scanned_ports is not None else None
+    existing = _find_existing(db, devices)
+    changes = []
+
+    # row id -> (row, address it held) for rows moved off their address
+    parked = {}
+
+    def change(row, change_type, old=None, new=None, ip=None):
+        changes.append(DeviceChange(
+            device_id=row.id, ip=ip or row.ip, change_type=change_type,
+            old_value=None if old is None else str(old),
+            new_value=None if new is None else str(new),
+            scan_id=scan_id, detected_at=seen_at,
+        ))
+
+    for device in devices:
+        ports = _open_ports(device)
+        mac = device.get('mac')
+        row = (mac and existing["mac"].get(mac)) or existing["ip"].get(device['ip'])
+
+        if row is None:
+            row = Device(
+                ip=device['ip'], mac=mac, device_name=device.get('device_name'),
+                device_type=device.get('device_type'), risk_level=device.get('risk_level'),
+                open_ports=ports, status=device.get('status', "Active"),
+                first_seen=seen_at, last_seen=seen_at, last_scan_id=scan_id,
+            )
+            db.add(row)
+            db.flush()  # assigns row.id for the change log
+            existing["ip"][row.ip] = row
+            if mac:
+                existing["mac"][mac] = row
+            change(row, "appeared", new=",".join(map(str, ports)))
+            continue
+
+        if row.ip != device['ip']:
+            holder = existing["ip"].pop(device['ip'], None)
+            if holder is not None and holder.mac is None:
+                _merge_into(db, row, holder)
+            elif holder is not None:
+                parked[holder.id] = (holder, holder.ip)
+                holder.ip = _placeholder_ip(holder)
+                holder.status = "Offline"
+            # Free the address before taking it
+            db.flush()
+            _, old_ip = parked.pop(row.id, (row, row.ip))
+            if existing["ip"].get(old_ip) is row:
+                del existing["ip"][old_ip]
+            if old_ip == _placeholder_ip(row):
+                old_ip = None  # parked by an earlier scan, which logged the release
+            change(row, "ip_changed", old_ip, device['ip'], ip=old_ip or device['ip'])
+            row.ip = device['ip']
+            existing["ip"][row.ip] = row
+            db.flush()
+        if mac and row.mac != mac:
+            row.mac = mac
+
+        previous = set(row.open_ports or [])
+        for port in sorted(set(ports) - previous):
+            change(row, "port_opened", new=port)
+        closed = previous - set(ports)
+        if scanned is not None:
+            closed &= scanned
+        for port in sorted(closed):
+            change(row, "port_closed", old=port)
+
+        if device.get('risk_level') and device['risk_level'] != row.risk_level:
+            change(row, "risk_changed", row.risk_level, device['risk_level'])
+            row.risk_level = device['risk_level']
+        if device.get('device_type') and device['device_type'] != row.device_type:
+            change(row, "type_changed", row.device_type, device['device_type'])
+            row.device_type = device['device_type']
+
+        row.open_ports = sorted((previous - closed) | set(ports))
+        row.device_name = device.get('device_name') or row.device_name
+        row.status = device.get('status', row.status)
+        row.last_seen = seen_at
+        row.last_scan_id = scan_id
+
+    for row, old_ip in parked.values():
+        change(row, "ip_changed", old_ip, None, ip=old_ip)
+
+    db.add_all(changes)
+    return len(changes)
+
+
+def rebuild_inventory(session_factory, batch_size: int = 200) -> int:
+    """Replay stored scans oldest first into an empty inventory; returns scans replayed"""
+    replayed = 0
+    last = None
+
+    while True:
+        with session_factory() as db:
+            query = (
+                select(ScanResult)
+                .options(undefer(ScanResult.result))
+                .order_by(ScanResult.timestamp, ScanResult.id)
+                .limit(batch_size)
+            )
+            if last is not None:
+                query = query.filter(or_(
+                    ScanResult.timestamp > last[0],
+                    (ScanResult.timestamp == last[0]) & (ScanResult.id > last[1]),
+                ))
+            scans = db.execute(query).scalars().all()
+            for scan in scans:
+                update_inventory(
+                    db, scan.result or [], scan_id=scan.id,
+                    scanned_ports=json.loads(scan.ports) if scan.ports else None,
+                    seen_at=scan.timestamp,
+                )
+            if scans:
+                last = (scans[-1].timestamp, scans[-1].id)
+            db.commit()
+            replayed += len(scans)
+
+        if len(scans) < batch_size:
+            return replayed
@@ -0,0 +1,49 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are ordered newest first on (timestamp, id). The cursor is the
+position of the last row of the previous page, so every page is a bounded
+index range scan no matter how deep the client has paged.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    payload = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_filter(timestamp_column, id_column, cursor: Optional[str]):
+    """WHERE clause selecting rows strictly after the cursor in (timestamp, id) DESC order"""
+    if not cursor:
+        return None
+    timestamp, row_id = decode_cursor(cursor)
+    return or_(
+        timestamp_column < timestamp,
+        and_(timestamp_column == timestamp, id_column < row_id),
+    )
+
+
+def split_page(rows, limit: int, timestamp_attr: str = "timestamp"):
+    """Trim a query run with limit + 1 down to one page and return (rows, next_cursor)"""
+    if len(rows) <= limit:
+        return list(rows), None
+    page = list(rows[:limit])
+    last = page[-1]
+    return page, encode_cursor(getattr(last, timestamp_attr), last.id)
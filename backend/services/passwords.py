@@ -0,0 +1,68 @@
+"""
+Password hashing.
+
+PBKDF2 is deliberately slow, so it runs on a small dedicated thread pool
+(hashlib releases the GIL while it works) rather than on the event loop or
+the shared request threadpool. Pending work is capped: when a login burst
+exceeds PASSWORD_HASH_MAX_PENDING, callers get PasswordHasherBusy (served
+as 503) instead of queueing without bound and starving everything else.
+
+The hash format and the blocking primitives live in database.passwords.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from database.passwords import (
+    PASSWORD_HASH_ALGORITHM,
+    PASSWORD_HASH_ITERATIONS,
+    _DUMMY_HASH,
+    hash_password,
+    verify_and_update,
+    verify_password,
+)
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hashes are already pending"""
+
+
+class PasswordHasher:
+    """Runs hashing on a bounded pool and rejects work beyond max_pending"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.stats = {"completed": 0, "rejected": 0}
+
+    async def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.stats["rejected"] += 1
+            raise PasswordHasherBusy("Too many password operations in progress")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._slots.release()
+            self.stats["completed"] += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, stored: Optional[str]) -> bool:
+        return await self._run(verify_password, password, stored or _DUMMY_HASH) and stored is not None
+
+    async def verify_and_update(self, password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+        if stored is None:
+            await self._run(verify_password, password, _DUMMY_HASH)
+            return False, None
+        return await self._run(verify_and_update, password, stored)
+
+
+# Global hasher (one pool per process)
+password_hasher = PasswordHasher()
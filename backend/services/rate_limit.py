@@ -0,0 +1,260 @@
+"""
+Sliding-window rate limiting.
+
+Each client gets two budgets: a small one for expensive endpoints (network
+scans, password hashing, data exports) and a larger one for everything
+else, each limited per minute and per hour. Clients are identified by the
+user a valid bearer token names, falling back to the peer address.
+
+Counts use the sliding-window approximation: a fixed-window counter for the
+current and the previous window, with the previous one weighted by how much
+of it still overlaps the sliding window. That is two integers per client,
+budget and window, however many requests are made.
+
+The memory backend (the default) counts per worker process and costs no
+I/O. RATE_LIMIT_BACKEND=database is opt-in: it keeps the counters in the
+rate_limit_counters table so limits hold exactly across every uvicorn
+worker, at the price of an upsert, a read and a commit on every limited
+request, reads included.
+"""
+
+import logging
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, delete, and_, or_
+from starlette.responses import JSONResponse
+
+from database.db import AsyncSessionLocal
+from database.dialects import dialect_insert
+from database.models import RateLimitCounter
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory or database
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+RATE_LIMIT_PER_HOUR = int(os.getenv("RATE_LIMIT_PER_HOUR", "1000"))
+RATE_LIMIT_SCAN_PER_MINUTE = int(os.getenv("RATE_LIMIT_SCAN_PER_MINUTE", "10"))
+RATE_LIMIT_SCAN_PER_HOUR = int(os.getenv("RATE_LIMIT_SCAN_PER_HOUR", "100"))
+
+# budget -> ((window seconds, limit), ...); a limit of 0 disables that window
+BUDGETS = {
+    "scan": ((60, RATE_LIMIT_SCAN_PER_MINUTE), (3600, RATE_LIMIT_SCAN_PER_HOUR)),
+    "default": ((60, RATE_LIMIT_PER_MINUTE), (3600, RATE_LIMIT_PER_HOUR)),
+}
+
+# (method, path prefix) of endpoints charged to the scan budget
+EXPENSIVE_ROUTES = (
+    ("POST", "/scan/"),
+    ("GET", "/scan/quick/"),
+    ("POST", "/device/scan"),
+    ("POST", "/net/"),
+    ("POST", "/auth/login"),
+    ("POST", "/auth/register"),
+    ("POST", "/auth/change-password"),
+    ("DELETE", "/auth/me"),
+    ("GET", "/analytics/export"),
+    ("POST", "/analytics/export"),
+)
+EXEMPT_PATHS = {"/health", "/metrics", "/docs", "/redoc", "/openapi.json"}
+
+# Stale counters are swept at most this often
+SWEEP_INTERVAL = 60
+
+Limits = Sequence[Tuple[int, int]]
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """The budget a request is charged to, or None if it is not limited"""
+    if method == "OPTIONS" or path in EXEMPT_PATHS:
+        return None
+    for route_method, prefix in EXPENSIVE_ROUTES:
+        if method == route_method and path.startswith(prefix):
+            return "scan"
+    return "default"
+
+
+def sliding_count(previous: int, current: int, elapsed: float, window: int) -> float:
+    """Estimated requests in the window ending now"""
+    return previous * (1 - elapsed / window) + current
+
+
+def retry_after(previous: int, current: int, elapsed: float, window: int, limit: int) -> int:
+    """Whole seconds until one more request fits under limit"""
+    room = limit - 1 - current
+    if room >= 0 and previous > 0:
+        # Later in this window the previous window's share is small enough
+        wait = window * (1 - room / previous) - elapsed
+    else:
+        # In the next window this window's count becomes the decaying one
+        wait = window - elapsed + window * (1 - (limit - 1) / max(current, 1))
+    return max(1, math.ceil(wait))
+
+
+def _check(counts: Dict[int, Tuple[int, int]], limits: Limits, now: float) -> Optional[int]:
+    """None if a request fits every limit, else the longest wait among the exceeded ones"""
+    wait = None
+    for window, limit in limits:
+        previous, current = counts.get(window, (0, 0))
+        elapsed = now % window
+        if sliding_count(previous, current, elapsed, window) + 1 > limit:
+            wait = max(wait or 0, retry_after(previous, current, elapsed, window, limit))
+    return wait
+
+
+class MemoryBackend:
+    """Counters in this process: (key, window) -> [window index, previous count, current count]"""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, int], List[int]] = {}
+        self._last_sweep = 0.0
+
+    def _roll(self, key: str, window: int, index: int) -> List[int]:
+        counter = self._counters.get((key, window))
+        if counter is None:
+            counter = self._counters[(key, window)] = [index, 0, 0]
+        elif counter[0] != index:
+            previous = counter[2] if counter[0] == index - 1 else 0
+            counter[:] = [index, previous, 0]
+        return counter
+
+    def _sweep(self, now: float):
+        self._last_sweep = now
+        stale = [(key, window) for (key, window), (index, _, _) in self._counters.items()
+                 if index < int(now // window) - 1]
+        for entry in stale:
+            del self._counters[entry]
+
+    async def hit(self, key: str, limits: Limits, now: float) -> Optional[int]:
+        """Count a request if it fits every limit; otherwise return the seconds to wait"""
+        if now - self._last_sweep > SWEEP_INTERVAL:
+            self._sweep(now)
+        counters = {window: self._roll(key, window, int(now // window)) for window, _ in limits}
+        wait = _check({window: (c[1], c[2]) for window, c in counters.items()}, limits, now)
+        if wait is None:
+            for counter in counters.values():
+                counter[2] += 1
+        return wait
+
+
+class DatabaseBackend:
+    """Counters in the rate_limit_counters table, shared by every worker"""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._last_sweep = 0.0
+
+    async def hit(self, key: str, limits: Limits, now: float) -> Optional[int]:
+        """
+        Increment first, then decide on the counts including this request:
+        the upsert holds the row lock until commit, so concurrent workers
+        queue behind each other and cannot both take the last slot. A
+        rejected request is rolled back and not counted.
+        """
+        counter = RateLimitCounter
+        table = counter.__table__
+        indexes = {window: int(now // window) for window, _ in limits}
+        async with self._session_factory() as db:
+            dialect, insert = dialect_insert(db)
+            stmt = insert(table).values([
+                {"key": key, "window_seconds": window, "window_index": index, "count": 1}
+                for window, index in indexes.items()
+            ])
+            if dialect == "mysql":
+                stmt = stmt.on_duplicate_key_update(count=table.c["count"] + 1)
+            else:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["key", "window_seconds", "window_index"],
+                    set_={"count": table.c["count"] + 1},
+                )
+            await db.execute(stmt)
+
+            rows = (await db.execute(
+                select(counter.window_seconds, counter.window_index, counter.count).filter(
+                    counter.key == key,
+                    or_(*(and_(counter.window_seconds == window, counter.window_index >= index - 1)
+                          for window, index in indexes.items())),
+                )
+            )).all()
+            counts = {window: [0, 0] for window in indexes}
+            for window, index, count in rows:
+                counts[window][index - indexes[window] + 1] += count
+            # _check asks whether one more request fits, so leave this one out
+            wait = _check({window: (previous, current - 1) for window, (previous, current) in counts.items()},
+                          limits, now)
+            if wait is not None:
+                await db.rollback()
+                return wait
+
+            if now - self._last_sweep > SWEEP_INTERVAL:
+                self._last_sweep = now
+                await db.execute(delete(counter).filter(or_(*(
+                    and_(counter.window_seconds == window, counter.window_index < index - 1)
+                    for window, index in indexes.items()
+                ))))
+            await db.commit()
+        return None
+
+
+BACKENDS = {"memory": MemoryBackend, "database": DatabaseBackend}
+
+# Shared by every RateLimitMiddleware instance in this process
+rate_limit_stats = {"allowed": 0, "limited": 0, "errors": 0}
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware answering 429 with Retry-After once a client exceeds its
+    budget. token_subject maps a bearer token to its user (None if invalid).
+    """
+
+    def __init__(self, app, token_subject: Callable[[str], Optional[str]] = None,
+                 backend=None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.token_subject = token_subject
+        self.backend = backend or BACKENDS[RATE_LIMIT_BACKEND]()
+        self.enabled = enabled
+        self.stats = rate_limit_stats
+
+    def _identity(self, scope) -> str:
+        if self.token_subject is not None:
+            for name, value in scope.get("headers", ()):
+                if name == b"authorization":
+                    scheme, _, token = value.decode("latin-1").partition(" ")
+                    subject = self.token_subject(token) if scheme.lower() == "bearer" else None
+                    if subject:
+                        return f"user:{subject}"
+                    break
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def __call__(self, scope, receive, send):
+        budget = classify(scope.get("method", ""), scope.get("path", "")) if scope["type"] == "http" else None
+        if not self.enabled or budget is None:
+            return await self.app(scope, receive, send)
+
+        limits = [(window, limit) for window, limit in BUDGETS[budget] if limit > 0]
+        if not limits:
+            return await self.app(scope, receive, send)
+        try:
+            wait = await self.backend.hit(f"{budget}:{self._identity(scope)}", limits, time.time())
+        except Exception as e:
+            # Fail open: an unavailable counter store must not take the API down
+            self.stats["errors"] += 1
+            logger.error(f"Rate limiter failed: {str(e)}")
+            wait = None
+
+        if wait is not None:
+            self.stats["limited"] += 1
+            response = JSONResponse(
+                {"detail": "Rate limit exceeded, please retry later"},
+                status_code=429,
+                headers={"Retry-After": str(wait)},
+            )
+            return await response(scope, receive, send)
+
+        self.stats["allowed"] += 1
+        await self.app(scope, receive, send)
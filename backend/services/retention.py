@@ -0,0 +1,174 @@
+"""
+Retention for scan_results.
+
+Raw scans older than their scan_type's policy are folded into daily
+per-device and per-severity rollups, appended to gzip-compressed JSONL
+archives and then deleted. Work is done in small batches, each in its own
+short transaction, so the live table is never locked for long.
+"""
+
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Callable
+
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session, undefer
+
+from database.models import ScanResult, ScanDeviceDailyRollup, ScanSeverityDailyRollup
+from services.generations import bump_generation
+
+RISK_RANK = {"Low": 0, "Medium": 1, "High": 2, "Critical": 3}
+# Policy key, archive directory and rollup scan_type for rows without a scan_type
+UNKNOWN_SCAN_TYPE = "unknown"
+
+
+def parse_policies(spec: str) -> Dict[str, int]:
+    """Parse 'auto_scan:14,quick_scan:30' into {scan_type: days}"""
+    policies = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        scan_type, _, days = item.partition(":")
+        policies[scan_type.strip()] = int(days)
+    return policies
+
+
+def _archive_record(scan: ScanResult) -> Dict[str, Any]:
+    return {
+        "id": scan.id,
+        "ip": scan.ip,
+        "ports": scan.ports,
+        "timestamp": scan.timestamp.isoformat() if scan.timestamp else None,
+        "scan_type": scan.scan_type,
+        "status": scan.status,
+        "result": scan.result or [],
+    }
+
+
+def _write_archives(archive_dir: Path, scans: List[ScanResult]):
+    """Append scans to <archive_dir>/<scan_type>/<YYYY-MM-DD>.jsonl.gz"""
+    by_file = defaultdict(list)
+    for scan in scans:
+        day = scan.timestamp.date().isoformat()
+        by_file[archive_dir / (scan.scan_type or UNKNOWN_SCAN_TYPE) / f"{day}.jsonl.gz"].append(scan)
+
+    for path, batch in by_file.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Each append adds a new gzip member; readers see one continuous stream
+        with gzip.open(path, "at", encoding="utf-8") as archive:
+            for scan in batch:
+                archive.write(json.dumps(_archive_record(scan), default=str) + "\n")
+            archive.flush()
+            os.fsync(archive.fileno())
+
+
+def _rollup(db: Session, scans: List[ScanResult]):
+    """Fold a batch of scans into the daily rollup tables"""
+    devices = {}
+    severities = defaultdict(int)
+
+    for scan in scans:
+        day = scan.timestamp.date()
+        scan_type = scan.scan_type or UNKNOWN_SCAN_TYPE
+        for device in scan.result or []:
+            key = (day, scan_type, device.get("ip"))
+            entry = devices.setdefault(key, {
+                "device_type": None, "times_seen": 0, "max_open_ports": 0,
+                "max_risk_level": None, "vulnerability_count": 0,
+            })
+            entry["device_type"] = device.get("device_type") or entry["device_type"]
+            entry["times_seen"] += 1
+            entry["max_open_ports"] = max(entry["max_open_ports"], len(device.get("open_ports") or []))
+            risk = device.get("risk_level")
+            if risk in RISK_RANK and RISK_RANK[risk] > RISK_RANK.get(entry["max_risk_level"], -1):
+                entry["max_risk_level"] = risk
+            for vuln in device.get("vulnerabilities") or []:
+                entry["vulnerability_count"] += 1
+                severities[(day, scan_type, vuln.get("severity"))] += 1
+
+    for (day, scan_type, ip), entry in devices.items():
+        row = db.execute(
+            select(ScanDeviceDailyRollup).filter_by(day=day, scan_type=scan_type, ip=ip)
+        ).scalar_one_or_none()
+        if row is None:
+            db.add(ScanDeviceDailyRollup(day=day, scan_type=scan_type, ip=ip, **entry))
+            continue
+        row.device_type = entry["device_type"] or row.device_type
+        row.times_seen += entry["times_seen"]
+        row.max_open_ports = max(row.max_open_ports, entry["max_open_ports"])
+        if RISK_RANK.get(entry["max_risk_level"], -1) > RISK_RANK.get(row.max_risk_level, -1):
+            row.max_risk_level = entry["max_risk_level"]
+        row.vulnerability_count += entry["vulnerability_count"]
+
+    for (day, scan_type, severity), findings in severities.items():
+        row = db.execute(
+            select(ScanSeverityDailyRollup).filter_by(day=day, scan_type=scan_type, severity=severity)
+        ).scalar_one_or_none()
+        if row is None:
+            db.add(ScanSeverityDailyRollup(day=day, scan_type=scan_type, severity=severity, findings=findings))
+        else:
+            row.findings += findings
+
+
+def run_retention(
+    session_factory: Callable[[], Session],
+    policies: Dict[str, int],
+    default_days: int,
+    archive_dir: str,
+    batch_size: int = 500,
+    dry_run: bool = False,
+    now: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """
+    Apply retention to every scan_type and return {scan_type: rows_removed}.
+
+    A policy of 0 days keeps that scan_type forever. Rows without a scan_type
+    follow the "unknown" policy.
+    """
+    now = now or datetime.now(timezone.utc)
+    archive_path = Path(archive_dir)
+    removed = {}
+
+    with session_factory() as db:
+        scan_types = db.execute(select(ScanResult.scan_type).distinct()).scalars().all()
+
+    for scan_type in scan_types:
+        name = scan_type or UNKNOWN_SCAN_TYPE
+        days = policies.get(name, default_days)
+        if days <= 0:
+            continue
+        cutoff = now - timedelta(days=days)
+        of_type = ScanResult.scan_type.is_(None) if scan_type is None else ScanResult.scan_type == scan_type
+        removed.setdefault(name, 0)
+
+        while True:
+            with session_factory() as db:
+                scans = db.execute(
+                    select(ScanResult)
+                    .options(undefer(ScanResult.result))
+                    .filter(of_type, ScanResult.timestamp < cutoff)
+                    .order_by(ScanResult.timestamp, ScanResult.id)
+                    .limit(batch_size)
+                ).scalars().all()
+                if not scans:
+                    break
+                if dry_run:
+                    removed[name] = db.query(ScanResult).filter(of_type, ScanResult.timestamp < cutoff).count()
+                    break
+
+                _write_archives(archive_path, scans)
+                _rollup(db, scans)
+                db.execute(delete(ScanResult).where(ScanResult.id.in_([scan.id for scan in scans])))
+                bump_generation(db)
+                db.commit()
+                removed[name] += len(scans)
+
+            if len(scans) < batch_size:
+                break
+
+    return removed
@@ -0,0 +1,218 @@
+"""
+Vectorized risk scoring with NumPy.
+
+Fleet-wide counterparts of the per-device scoring paths, for recomputing
+every device and many historical windows at once (for example after the
+severity weights change):
+
+- classify_devices()    NetworkScanner.identify_device_type over a device x port matrix
+- assess_risk_levels()  the /vulnerabilities port heuristic over the same matrix
+- security_scores()     services.scoring's formula over count arrays of any shape
+- windowed_scores()     per-device and fleet scores for many time windows
+
+Each function gives the same answers as its scalar counterpart;
+scripts/bench_risk_scoring.py checks that and measures the speed-up.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.models import Vulnerability
+from services.rollups import to_naive_utc
+from services.scoring import SEVERITY_WEIGHTS
+
+RISK_LEVELS = np.array(["Low", "Medium", "High", "Critical"])
+SEVERITIES = ("Critical", "High", "Medium", "Low")
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+# identify_device_type's rules in priority order: (device type, risk level index)
+_DEVICE_RULES = (
+    ("IP Camera (RTSP)", 2),
+    ("IP Camera (Web)", 2),
+    ("Web Server", 1),
+    ("Linux Server", 1),
+    ("Network Device (Telnet)", 3),
+    ("FTP Server", 2),
+    ("Windows Server", 1),
+)
+_DEFAULT_DEVICE = ("Network Device", 0)
+_RULE_PORTS = (21, 22, 23, 80, 443, 554, 3389, 8000, 8080)
+
+
+def port_matrix(port_lists: Sequence[Sequence[int]], ports: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build a boolean device x port matrix from each device's open ports.
+
+    Returns (matrix, ports) where matrix[d, j] says whether device d has
+    ports[j] open. ports defaults to every port that appears.
+    """
+    lengths = np.fromiter((len(p) for p in port_lists), dtype=np.int64, count=len(port_lists))
+    flat = np.fromiter((port for p in port_lists for port in p), dtype=np.int64, count=int(lengths.sum()))
+    rows = np.repeat(np.arange(len(port_lists)), lengths)
+
+    ports = np.unique(flat) if ports is None else np.asarray(ports, dtype=np.int64)
+    columns = np.searchsorted(ports, flat) if len(ports) else np.zeros(len(flat), dtype=np.int64)
+    known = columns < len(ports)
+    known[known] &= ports[columns[known]] == flat[known]
+
+    matrix = np.zeros((len(port_lists), len(ports)), dtype=bool)
+    matrix[rows[known], columns[known]] = True
+    return matrix, ports
+
+
+def classify_devices(port_lists: Sequence[Sequence[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Device types and risk levels for every device, as identify_device_type would assign"""
+    matrix, ports = port_matrix(port_lists, sorted(_RULE_PORTS))
+    has = {port: matrix[:, j] for j, port in enumerate(ports)}
+    web = has[80] | has[443]
+    conditions = [
+        has[554],
+        web & (has[8080] | has[8000]),
+        web,
+        has[22],
+        has[23],
+        has[21],
+        has[3389],
+    ]
+    rule = np.select(conditions, np.arange(len(_DEVICE_RULES)), default=len(_DEVICE_RULES))
+
+    types = np.array([name for name, _ in _DEVICE_RULES] + [_DEFAULT_DEVICE[0]])
+    risk = np.array([level for _, level in _DEVICE_RULES] + [_DEFAULT_DEVICE[1]])[rule]
+
+    # More than five open ports raises Low and Medium by one level
+    port_counts = np.fromiter((len(p) for p in port_lists), dtype=np.int64, count=len(port_lists))
+    risk = np.where((port_counts > 5) & (risk < 2), risk + 1, risk)
+    return types[rule], RISK_LEVELS[risk]
+
+
+def assess_risk_levels(port_lists: Sequence[Sequence[int]], risky_ports: Sequence[int]) -> np.ndarray:
+    """
+    Risk levels from the port heuristic used by POST /vulnerabilities/:
+    2 points per risky port and 1 per other port; >= 8 is High, >= 4 Medium.
+    """
+    lengths = np.fromiter((len(p) for p in port_lists), dtype=np.int64, count=len(port_lists))
+    flat = np.fromiter((port for p in port_lists for port in p), dtype=np.int64, count=int(lengths.sum()))
+    points = np.where(np.isin(flat, np.asarray(list(risky_ports), dtype=np.int64)), 2, 1)
+    scores = np.zeros(len(port_lists), dtype=np.int64)
+    np.add.at(scores, np.repeat(np.arange(len(port_lists)), lengths), points)
+    return np.select([scores >= 8, scores >= 4], ["High", "Medium"], default="Low")
+
+
+def _weight_vector(weights: Mapping[str, int]) -> np.ndarray:
+    return np.array([weights[severity] for severity in SEVERITIES], dtype=np.float64)
+
+
+def security_scores(
+    severity_counts: np.ndarray,
+    fixed: np.ndarray,
+    total: np.ndarray,
+    weights: Mapping[str, int] = SEVERITY_WEIGHTS,
+) -> np.ndarray:
+    """
+    services.scoring.calculate_security_score over arrays.
+
+    severity_counts has a trailing axis of (Critical, High, Medium, Low)
+    counts; fixed and total match its leading shape.
+    """
+    weight_vector = _weight_vector(weights)
+    weighted = severity_counts @ weight_vector
+    max_score = np.maximum(1, total + fixed) * weight_vector.max()
+    scores = np.maximum(0.0, 100 - weighted / max_score * 100)
+    return scores.astype(np.int64)
+
+
+def _epoch_seconds(values: Sequence[datetime]) -> np.ndarray:
+    return np.fromiter(((value - _EPOCH) // _SECOND for value in values), dtype=np.int64, count=len(values))
+
+
+def window_counts(groups: np.ndarray, times: np.ndarray, n_groups: int, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    counts[g, w] = number of events in group g with starts[w] <= time < ends[w].
+
+    Events are binned once between the sorted window edges and turned into a
+    cumulative per-group histogram, so each window is a difference of two
+    columns: O(events * log(edges) + groups * edges) for any number of
+    (possibly overlapping) windows.
+    """
+    times = np.asarray(times, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    edges = np.unique(np.concatenate([starts, ends]))
+    slots = len(edges) + 1
+
+    # slot k holds events with edges[k-1] <= time < edges[k]
+    slot = np.searchsorted(edges, times, side="right")
+    histogram = np.bincount(np.asarray(groups, dtype=np.int64) * slots + slot, minlength=n_groups * slots)
+    # below[g, k] = events in group g earlier than edges[k]
+    below = histogram.reshape(n_groups, slots).cumsum(axis=1, dtype=np.int64)
+    return below[:, np.searchsorted(edges, ends)] - below[:, np.searchsorted(edges, starts)]
+
+
+def windowed_scores(
+    ips: Sequence[str],
+    detected_at: Sequence,
+    severities: Sequence[str],
+    statuses: Sequence[str],
+    windows: Sequence[Tuple],
+    weights: Mapping[str, int] = SEVERITY_WEIGHTS,
+) -> Dict[str, object]:
+    """
+    Security scores for every device and the whole fleet in every window.
+
+    Findings are given as parallel sequences; windows as (start, end)
+    datetimes, half-open, compared at one-second resolution. A finding counts
+    in a window when it was detected in it, as in /analytics. Returns devices,
+    per-device scores (devices x windows), fleet scores (windows) and the
+    devices x windows x severities count tensor they were computed from.
+    """
+    device_lookup: Dict[str, int] = {}
+    device_index = np.fromiter((device_lookup.setdefault(ip, len(device_lookup)) for ip in ips), dtype=np.int64, count=len(ips))
+    severity_lookup = {severity: i for i, severity in enumerate(SEVERITIES)}
+    severity_index = np.fromiter((severity_lookup.get(s, -1) for s in severities), dtype=np.int64, count=len(severities))
+    times = _epoch_seconds(detected_at)
+    fixed_mask = np.asarray(statuses, dtype=object) == "fixed"
+
+    starts = _epoch_seconds([start for start, _ in windows])
+    ends = _epoch_seconds([end for _, end in windows])
+    devices = list(device_lookup)
+
+    # Groups per device: one per severity, one for unknown severities, one for fixed
+    slots = len(SEVERITIES) + 2
+    known = severity_index >= 0
+    group = device_index * slots + np.where(known, severity_index, len(SEVERITIES))
+    groups = np.concatenate([group, device_index[fixed_mask] * slots + len(SEVERITIES) + 1])
+    event_times = np.concatenate([times, times[fixed_mask]])
+
+    counts = window_counts(groups, event_times, len(devices) * slots, starts, ends)
+    counts = counts.reshape(len(devices), slots, len(windows))
+    severity_counts = np.moveaxis(counts[:, :len(SEVERITIES), :], 1, -1)  # devices x windows x severities
+    total = counts[:, :len(SEVERITIES) + 1, :].sum(axis=1)
+    fixed = counts[:, -1, :]
+
+    return {
+        "devices": devices,
+        "device_scores": security_scores(severity_counts, fixed, total, weights),
+        "fleet_scores": security_scores(severity_counts.sum(axis=0), fixed.sum(axis=0), total.sum(axis=0), weights),
+        "severity_counts": severity_counts,
+    }
+
+
+def findings_arrays(db: Session, chunk_size: int = 5000) -> Dict[str, List]:
+    """Read every finding's ip, detected_at, severity and status in chunks"""
+    columns = {"ips": [], "detected_at": [], "severities": [], "statuses": []}
+    result = db.execute(
+        select(Vulnerability.ip, Vulnerability.detected_at, Vulnerability.severity, Vulnerability.status)
+        .filter(Vulnerability.detected_at.is_not(None))
+        .execution_options(yield_per=chunk_size)
+    )
+    for ip, detected_at, severity, status in result:
+        columns["ips"].append(ip)
+        columns["detected_at"].append(to_naive_utc(detected_at))
+        columns["severities"].append(severity)
+        columns["statuses"].append(status)
+    return columns
@@ -0,0 +1,168 @@
+"""
+Hourly and daily vulnerability rollups.
+
+Every finding contributes to one hourly and one daily bucket keyed by its
+detected_at. The write paths describe each change as FindingEvents and call
+record_events() inside their own transaction, so rollups stay exact without
+rescanning the raw table; range reads touch at most a few hundred bucket rows.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, and_, or_
+from sqlalchemy.orm import Session
+
+from database.dialects import dialect_insert
+from database.models import Vulnerability, VulnerabilityRollup, DeviceScore
+from services.generations import bump_generation
+from services.scoring import record_device_scores
+
+GRANULARITIES = ("hour", "day")
+
+# counter is "detected" or "fixed"; amount is +1 or -1
+FindingEvent = namedtuple("FindingEvent", "ip detected_at severity counter amount")
+
+
+def to_naive_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    ts = to_naive_utc(ts)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _apply_deltas(db: Session, deltas: Dict[Tuple[str, datetime, str], Dict[str, int]]):
+    """Add detected/fixed deltas to their buckets with a native upsert"""
+    if not deltas:
+        return
+    rows = [
+        {"granularity": granularity, "bucket_start": start, "severity": severity,
+         "detected": delta.get("detected", 0), "fixed": delta.get("fixed", 0)}
+        for (granularity, start, severity), delta in deltas.items()
+    ]
+    table = VulnerabilityRollup.__table__
+    dialect, insert = dialect_insert(db)
+    stmt = insert(table).values(rows)
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update(
+            detected=table.c.detected + stmt.inserted.detected,
+            fixed=table.c.fixed + stmt.inserted.fixed,
+        )
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["granularity", "bucket_start", "severity"],
+            set_={
+                "detected": table.c.detected + stmt.excluded.detected,
+                "fixed": table.c.fixed + stmt.excluded.fixed,
+            },
+        )
+    db.execute(stmt)
+
+
+def record_events(db: Session, events: Iterable[FindingEvent]):
+    """Apply finding events to the hourly and daily buckets of their detected_at"""
+    deltas = defaultdict(lambda: {"detected": 0, "fixed": 0})
+    for event in events:
+        if event.detected_at is None:
+            continue
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(event.detected_at, granularity), event.severity)
+            deltas[key][event.counter] += event.amount
+    _apply_deltas(db, {key: delta for key, delta in deltas.items() if delta["detected"] or delta["fixed"]})
+
+
+def finding_events(ip: str, detected_at: datetime, severity: str, status: str, amount: int = 1) -> List[FindingEvent]:
+    """Events that add (amount=1) or remove (amount=-1) one finding as a whole"""
+    events = [FindingEvent(ip, detected_at, severity, "detected", amount)]
+    if status == "fixed":
+        events.append(FindingEvent(ip, detected_at, severity, "fixed", amount))
+    return events
+
+
+def rollup_range_query(start: datetime, end: datetime):
+    """
+    Select (bucket_start, granularity, severity, detected, fixed) covering [start, end].
+
+    Whole days inside the range come from daily buckets and the partial days
+    at either edge from hourly buckets, so the range is exact to the hour.
+    """
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    first_hour = bucket_start(start, "hour")
+    first_full_day = bucket_start(start, "day")
+    if first_full_day < start:
+        first_full_day += timedelta(days=1)
+    last_full_day_end = bucket_start(end, "day")
+
+    rollup = VulnerabilityRollup
+    columns = (rollup.bucket_start, rollup.granularity, rollup.severity, rollup.detected, rollup.fixed)
+    hourly = and_(rollup.granularity == "hour", rollup.bucket_start >= first_hour, rollup.bucket_start <= end)
+
+    if first_full_day >= last_full_day_end:
+        return select(*columns).filter(hourly)
+
+    return select(*columns).filter(or_(
+        and_(rollup.granularity == "day",
+             rollup.bucket_start >= first_full_day,
+             rollup.bucket_start < last_full_day_end),
+        and_(hourly, or_(rollup.bucket_start < first_full_day, rollup.bucket_start >= last_full_day_end)),
+    ))
+
+
+def backfill_rollups(session_factory: Callable[[], Session], batch_size: int = 5000) -> int:
+    """
+    Rebuild the rollups and device scores from the vulnerabilities table.
+
+    Returns the number of findings counted.
+    """
+    with session_factory() as db:
+        db.execute(delete(VulnerabilityRollup))
+        db.execute(delete(DeviceScore))
+        bump_generation(db)
+        db.commit()
+
+    counted = 0
+    last_id = 0
+    while True:
+        with session_factory() as db:
+            rows = db.execute(
+                select(Vulnerability.id, Vulnerability.ip, Vulnerability.detected_at,
+                       Vulnerability.severity, Vulnerability.status)
+                .filter(Vulnerability.id > last_id)
+                .order_by(Vulnerability.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            events = [
+                event for row in rows
+                for event in finding_events(row.ip, row.detected_at, row.severity, row.status)
+            ]
+            record_events(db, events)
+            record_device_scores(db, events)
+            bump_generation(db)
+            db.commit()
+            counted += len(rows)
+            last_id = rows[-1].id
+    return counted
+
+
+def backfill_if_missing(session_factory: Callable[[], Session]) -> Optional[int]:
+    """
+    Build the rollups and device scores once for databases that predate them.
+
+    Returns the number of findings counted, or None if nothing was needed.
+    """
+    with session_factory() as db:
+        has_rollups = db.execute(select(VulnerabilityRollup.id).limit(1)).first() is not None
+        has_scores = db.execute(select(DeviceScore.ip).limit(1)).first() is not None
+        has_findings = db.execute(select(Vulnerability.id).limit(1)).first() is not None
+    if not has_findings or (has_rollups and has_scores):
+        return None
+    return backfill_rollups(session_factory)
@@ -5,7 +5,7 @@ import json
 import ipaddress
 import subprocess
 import platform
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 from datetime import datetime
@@ -230,8 +230,13 @@ class NetworkScanner:
         
         return vulnerabilities
 
-    def scan_network(self, target_ips: List[str], ports: List[int], scan_type: str = "full_scan") -> List[Dict[str, Any]]:
-        """Scan a network for devices and vulnerabilities"""
+    def scan_network(self, target_ips: List[str], ports: List[int], scan_type: str = "full_scan",
+                     on_device: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """Scan a network for devices and vulnerabilities
+
+        on_device is called with each device as soon as it is found; it may
+        block to apply back-pressure when results can't be persisted fast enough.
+        """
         devices = []
         start_time = time.time()
         
@@ -264,6 +269,8 @@ class NetworkScanner:
                     
                     devices.append(device_info)
                     print(f"Found device: {ip} - {device_type} ({risk_level} risk)")
+                    if on_device:
+                        on_device(device_info)
                 
             except Exception as e:
                 print(f"Error scanning {ip}: {e}")
@@ -297,9 +304,10 @@ class NetworkScanner:
         
         return None
 
-    def camera_scan(self, target_ips: List[str]) -> List[Dict[str, Any]]:
+    def camera_scan(self, target_ips: List[str],
+                    on_device: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
         """Specialized scan for IP cameras"""
-        return self.scan_network(target_ips, self.camera_ports, "camera_scan")
+        return self.scan_network(target_ips, self.camera_ports, "camera_scan", on_device=on_device)
 
 # Global scanner instance
 scanner = NetworkScanner()
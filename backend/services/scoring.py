@@ -0,0 +1,81 @@
+"""
+Security scoring.
+
+The score is a weighted 0-100 value over finding counts. Per-device inputs
+(counts per severity, fixed count and the weighted sum) are kept as running
+tallies in device_scores, updated from the same finding events as the
+vulnerability rollups, so reading any device's score is a single-row lookup.
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable
+
+from sqlalchemy.orm import Session
+
+from database.dialects import dialect_insert
+from database.models import DeviceScore
+
+SEVERITY_WEIGHTS = {"Critical": 10, "High": 7, "Medium": 4, "Low": 1}
+MAX_WEIGHT = max(SEVERITY_WEIGHTS.values())
+
+TALLY_COLUMNS = ("critical", "high", "medium", "low", "total", "fixed", "weighted")
+
+
+def weighted_sum(critical: int, high: int, medium: int, low: int) -> int:
+    return (critical * SEVERITY_WEIGHTS["Critical"] + high * SEVERITY_WEIGHTS["High"]
+            + medium * SEVERITY_WEIGHTS["Medium"] + low * SEVERITY_WEIGHTS["Low"])
+
+
+def score_from_weight(weighted: int, fixed: int, total: int) -> int:
+    """Weighted 0-100 score: findings pull it down, fixed ones dilute the penalty"""
+    max_score = max(1, total + fixed)
+    return int(max(0, 100 - (weighted / (max_score * MAX_WEIGHT) * 100)))
+
+
+def calculate_security_score(critical: int, high: int, medium: int, low: int, fixed: int, total: int) -> int:
+    return score_from_weight(weighted_sum(critical, high, medium, low), fixed, total)
+
+
+def record_device_scores(db: Session, events: Iterable) -> None:
+    """Apply FindingEvents (see services.rollups) to the per-device tallies"""
+    deltas = defaultdict(lambda: dict.fromkeys(TALLY_COLUMNS, 0))
+    for event in events:
+        delta = deltas[event.ip]
+        if event.counter == "fixed":
+            delta["fixed"] += event.amount
+            continue
+        delta["total"] += event.amount
+        if event.severity in SEVERITY_WEIGHTS:
+            delta[event.severity.lower()] += event.amount
+            delta["weighted"] += SEVERITY_WEIGHTS[event.severity] * event.amount
+
+    rows = [{"ip": ip, **delta} for ip, delta in deltas.items() if any(delta.values())]
+    if not rows:
+        return
+
+    table = DeviceScore.__table__
+    dialect, insert = dialect_insert(db)
+    stmt = insert(table).values(rows)
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update(
+            **{column: table.c[column] + stmt.inserted[column] for column in TALLY_COLUMNS}
+        )
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["ip"],
+            set_={column: table.c[column] + stmt.excluded[column] for column in TALLY_COLUMNS},
+        )
+    db.execute(stmt)
+
+
+def device_score_out(row: DeviceScore) -> Dict[str, Any]:
+    return {
+        "ip": row.ip,
+        "score": score_from_weight(row.weighted, row.fixed, row.total),
+        "critical": row.critical,
+        "high": row.high,
+        "medium": row.medium,
+        "low": row.low,
+        "total": row.total,
+        "fixed": row.fixed,
+    }
@@ -0,0 +1,212 @@
+"""
+Suggestion catalogue and request counters.
+
+The catalogue is static, so it is built once at import: each category maps
+to an immutable entry, and keywords are classified by one precompiled
+pattern that finds every keyword occurrence in a single pass. Results are
+memoized per normalized keyword, so repeated lookups are a dict hit.
+
+Instead of inserting a Suggestion row per suggestion served, requests are
+counted per category in memory and a background thread adds the counts to
+suggestion_request_counts every SUGGESTION_FLUSH_INTERVAL seconds (and at
+exit), so serving suggestions does no database writes.
+"""
+
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, Tuple
+
+from sqlalchemy.orm import Session
+
+from database.db import SessionLocal
+from database.dialects import dialect_insert
+from database.models import SuggestionRequestCount
+
+logger = logging.getLogger(__name__)
+
+SUGGESTION_FLUSH_INTERVAL = float(os.getenv("SUGGESTION_FLUSH_INTERVAL", "10"))
+
+SUGGESTION_DB = {
+    "RTSP": [
+        "Disable RTSP if not in use.",
+        "Use authentication on RTSP streams.",
+        "Change default RTSP ports.",
+        "Use RTSP over HTTPS when possible.",
+        "Implement IP whitelisting for RTSP access."
+    ],
+    "FTP": [
+        "Replace FTP with SFTP or FTPS.",
+        "Use strong credentials and limit access to internal networks.",
+        "Disable anonymous FTP access.",
+        "Use firewall rules to restrict FTP access.",
+        "Regularly audit FTP access logs."
+    ],
+    "TELNET": [
+        "Avoid using Telnet. Prefer SSH.",
+        "Disable Telnet on all IoT devices.",
+        "Use encrypted protocols for remote access.",
+        "Implement key-based authentication.",
+        "Monitor for unauthorized Telnet attempts."
+    ],
+    "DEFAULT_CREDENTIALS": [
+        "Change default login credentials immediately.",
+        "Use strong, unique passwords for each device.",
+        "Implement password rotation policies.",
+        "Use password managers for credential storage.",
+        "Enable two-factor authentication where possible."
+    ],
+    "UNPATCHED_FIRMWARE": [
+        "Regularly check for firmware updates.",
+        "Subscribe to vendor security notifications.",
+        "Test firmware updates in a safe environment.",
+        "Maintain a firmware update schedule.",
+        "Keep backup configurations before updates."
+    ],
+    "OPEN_PORTS": [
+        "Close unnecessary open ports.",
+        "Use firewall rules to restrict port access.",
+        "Implement port scanning detection.",
+        "Monitor port access logs regularly.",
+        "Use VPN for remote access instead of open ports."
+    ],
+    "WEAK_PASSWORDS": [
+        "Use strong passwords with mixed characters.",
+        "Implement password complexity requirements.",
+        "Use password managers for secure storage.",
+        "Enable account lockout after failed attempts.",
+        "Regularly audit password policies."
+    ]
+}
+
+# Default suggestions for unknown keywords
+GENERAL_SUGGESTIONS = [
+    "Perform a comprehensive security audit.",
+    "Update all device firmware to latest versions.",
+    "Change default passwords on all devices.",
+    "Enable firewall rules and access controls.",
+    "Implement network segmentation for IoT devices."
+]
+
+# Keyword -> category, in priority order: the first keyword contained in the input wins
+KEYWORD_CATEGORIES = {
+    "RTSP": "RTSP",
+    "FTP": "FTP",
+    "TELNET": "TELNET",
+    "SSH": "TELNET",  # SSH suggestions for secure alternatives
+    "DEFAULT": "DEFAULT_CREDENTIALS",
+    "PASSWORD": "WEAK_PASSWORDS",
+    "CREDENTIALS": "DEFAULT_CREDENTIALS",
+    "FIRMWARE": "UNPATCHED_FIRMWARE",
+    "UPDATE": "UNPATCHED_FIRMWARE",
+    "PORT": "OPEN_PORTS",
+    "OPEN": "OPEN_PORTS"
+}
+CRITICAL_CATEGORIES = {"TELNET", "DEFAULT_CREDENTIALS"}
+
+CatalogEntry = namedtuple("CatalogEntry", "category suggestions severity")
+
+CATALOG: Dict[str, CatalogEntry] = {
+    category: CatalogEntry(category, tuple(suggestions), "Critical" if category in CRITICAL_CATEGORIES else "High")
+    for category, suggestions in SUGGESTION_DB.items()
+}
+GENERAL = CatalogEntry("GENERAL", tuple(GENERAL_SUGGESTIONS), "Medium")
+
+_PRIORITY = {keyword: i for i, keyword in enumerate(KEYWORD_CATEGORIES)}
+# Zero-width lookahead so overlapping keywords (e.g. PORT and RTSP in "PORTSP") are all found
+_KEYWORD_PATTERN = re.compile("(?=(" + "|".join(map(re.escape, KEYWORD_CATEGORIES)) + "))")
+
+
+@lru_cache(maxsize=4096)
+def _classify(keyword: str) -> CatalogEntry:
+    found = {match.group(1) for match in _KEYWORD_PATTERN.finditer(keyword)}
+    if not found:
+        return GENERAL
+    return CATALOG.get(KEYWORD_CATEGORIES[min(found, key=_PRIORITY.__getitem__)], GENERAL)
+
+
+def classify_keyword(keyword: str) -> CatalogEntry:
+    """The catalogue entry for a free-text keyword (GENERAL if nothing matches)"""
+    return _classify(keyword.strip().upper())
+
+
+class SuggestionCounter:
+    """Counts suggestion requests per category and adds them to the database in batches"""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 flush_interval: float = SUGGESTION_FLUSH_INTERVAL):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.stats = {"recorded": 0, "flushes": 0, "errors": 0}
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="suggestion-counter", daemon=True)
+            self._thread.start()
+
+    def record(self, category: str):
+        with self._lock:
+            count, _ = self._pending.get(category, (0, None))
+            self._pending[category] = (count + 1, datetime.utcnow())
+            self.stats["recorded"] += 1
+            self._ensure_started()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Add the pending counts to suggestion_request_counts"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                with self.session_factory() as db:
+                    table = SuggestionRequestCount.__table__
+                    dialect, insert = dialect_insert(db)
+                    stmt = insert(table).values([
+                        {"category": category, "count": count, "last_requested": last}
+                        for category, (count, last) in pending.items()
+                    ])
+                    if dialect == "mysql":
+                        stmt = stmt.on_duplicate_key_update(
+                            count=table.c["count"] + stmt.inserted["count"],
+                            last_requested=stmt.inserted.last_requested,
+                        )
+                    else:
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=["category"],
+                            set_={
+                                "count": table.c["count"] + stmt.excluded["count"],
+                                "last_requested": stmt.excluded.last_requested,
+                            },
+                        )
+                    db.execute(stmt)
+                    db.commit()
+                self.stats["flushes"] += 1
+            except Exception as e:
+                # Put the counts back so the next flush retries them
+                with self._lock:
+                    for category, (count, last) in pending.items():
+                        current, latest = self._pending.get(category, (0, last))
+                        self._pending[category] = (current + count, max(latest, last))
+                self.stats["errors"] += 1
+                logger.error(f"Suggestion counter flush failed: {str(e)}")
+
+
+# Global counter (one flusher thread per process)
+suggestion_counter = SuggestionCounter()
+atexit.register(suggestion_counter.flush)
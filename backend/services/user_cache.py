@@ -0,0 +1,46 @@
+"""
+Authenticated-user cache.
+
+get_current_user runs on every protected request; caching the user row for
+a short TTL saves a database round trip on each of them. Entries are keyed
+by the email a verified token names and hold an immutable snapshot, so
+concurrent requests can share them safely. The auth endpoints invalidate a
+user's entry whenever they change the row (profile update, password change,
+login, deactivation). Invalidation is per process, so other workers may
+serve the old snapshot for up to AUTH_USER_CACHE_TTL seconds.
+"""
+
+import os
+from collections import namedtuple
+from typing import Optional
+
+from sqlalchemy import select
+
+from database.db import AsyncSessionLocal
+from database.models import User
+from services.cache import AsyncTTLCache
+
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "1024"))
+
+USER_FIELDS = ("id", "name", "email", "hashed_password", "is_active", "is_verified", "created_at", "last_login")
+CachedUser = namedtuple("CachedUser", USER_FIELDS)
+
+user_cache = AsyncTTLCache(max_entries=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL)
+
+
+async def _load_user(email: str) -> Optional[CachedUser]:
+    columns = [getattr(User, field) for field in USER_FIELDS]
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(select(*columns).filter(User.email == email))).first()
+    return CachedUser(*row) if row else None
+
+
+async def get_cached_user(email: str) -> Optional[CachedUser]:
+    """The user with this email, from the cache or the database; None if there is none"""
+    return await user_cache.get_or_compute(email, lambda: _load_user(email))
+
+
+def invalidate_user(email: str):
+    """Forget the cached snapshot after the user's row changes"""
+    user_cache.invalidate(email)
@@ -0,0 +1,143 @@
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy import case, select
+from sqlalchemy.orm import Session
+
+from database.dialects import dialect_insert
+from database.models import Vulnerability
+from services.rollups import FindingEvent, finding_events, record_events
+from services.scoring import record_device_scores
+from services.generations import bump_generation
+
+VULNERABILITY_STATUSES = ("open", "fixed", "ignored")
+
+
+def _finding_rows(devices: List[Dict[str, Any]], seen_at: datetime) -> List[Dict[str, Any]]:
+    """Flatten device vulnerabilities into one row per (ip, port, type)"""
+    rows = {}
+    for device in devices:
+        for vuln in device.get('vulnerabilities', []):
+            key = (device['ip'], vuln['port'], vuln['type'])
+            rows[key] = {
+                "ip": device['ip'],
+                "port": vuln['port'],
+                "vulnerability_type": vuln['type'],
+                "description": vuln['description'],
+                "severity": vuln['severity'],
+                "status": "open",
+                "detected_at": seen_at,
+                "first_seen": seen_at,
+                "last_seen": seen_at,
+                "occurrence_count": 1,
+            }
+    return list(rows.values())
+
+
+def _record_events(db: Session, events: List[FindingEvent]):
+    """Keep the rollups and device scores in step with a change to the findings"""
+    record_events(db, events)
+    record_device_scores(db, events)
+
+
+def _upsert_events(db: Session, rows: List[Dict[str, Any]]) -> List[FindingEvent]:
+    """Events for new findings, reopened fixes and severity changes"""
+    existing = {
+        (row.ip, row.port, row.vulnerability_type): row
+        for row in db.execute(
+            select(Vulnerability.ip, Vulnerability.port, Vulnerability.vulnerability_type,
+                   Vulnerability.severity, Vulnerability.status, Vulnerability.detected_at)
+            .filter(Vulnerability.ip.in_({row["ip"] for row in rows}))
+        )
+    }
+
+    events = []
+    for row in rows:
+        old = existing.get((row["ip"], row["port"], row["vulnerability_type"]))
+        if old is None:
+            events += finding_events(row["ip"], row["detected_at"], row["severity"], "open")
+            continue
+        # The finding keeps its original detected_at bucket
+        if old.status == "fixed" or old.severity != row["severity"]:
+            new_status = "open" if old.status == "fixed" else old.status
+            events += finding_events(old.ip, old.detected_at, old.severity, old.status, -1)
+            events += finding_events(old.ip, old.detected_at, row["severity"], new_status)
+    return events
+
+
+def upsert_vulnerabilities(db: Session, devices: List[Dict[str, Any]], seen_at: Optional[datetime] = None) -> int:
+    """
+    Record the findings of a scan, one row per (ip, port, vulnerability_type).
+
+    New findings are inserted as open. Findings that already exist get their
+    last_seen and occurrence_count bumped; a previously fixed finding that is
+    detected again is reopened, while ignored findings stay ignored.
+    Vulnerability rollups and device scores are adjusted in the same
+    transaction, which the caller owns.
+    """
+    seen_at = seen_at or datetime.now(timezone.utc)
+    rows = _finding_rows(devices, seen_at)
+    if not rows:
+        return 0
+
+    _record_events(db, _upsert_events(db, rows))
+
+    table = Vulnerability.__table__
+    dialect, insert = dialect_insert(db)
+    stmt = insert(table).values(rows)
+    was_fixed = table.c.status == "fixed"
+
+    if dialect == "mysql":
+        # MySQL applies assignments left to right, so fixed_at must be
+        # evaluated before status is overwritten.
+        stmt = stmt.on_duplicate_key_update([
+            ("fixed_at", case((was_fixed, None), else_=table.c.fixed_at)),
+            ("status", case((was_fixed, "open"), else_=table.c.status)),
+            ("last_seen", stmt.inserted.last_seen),
+            ("occurrence_count", table.c.occurrence_count + 1),
+            ("description", stmt.inserted.description),
+            ("severity", stmt.inserted.severity),
+        ])
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["ip", "port", "vulnerability_type"],
+            set_={
+                "fixed_at": case((was_fixed, None), else_=table.c.fixed_at),
+                "status": case((was_fixed, "open"), else_=table.c.status),
+                "last_seen": stmt.excluded.last_seen,
+                "occurrence_count": table.c.occurrence_count + 1,
+                "description": stmt.excluded.description,
+                "severity": stmt.excluded.severity,
+            },
+        )
+
+    db.execute(stmt)
+    return len(rows)
+
+
+def set_vulnerability_status(db: Session, vuln_id: int, status: str) -> Optional[Vulnerability]:
+    """Move a finding to open, fixed or ignored (any case) and commit"""
+    status = (status or "").strip().lower()
+    if status not in VULNERABILITY_STATUSES:
+        raise ValueError(f"status must be one of: {', '.join(VULNERABILITY_STATUSES)}")
+
+    vulnerability = db.get(Vulnerability, vuln_id)
+    if vulnerability is None:
+        return None
+
+    was_fixed = vulnerability.status == "fixed"
+    if status == "fixed" and not was_fixed:
+        vulnerability.fixed_at = datetime.now(timezone.utc)
+    elif status != "fixed":
+        vulnerability.fixed_at = None
+    if (status == "fixed") != was_fixed:
+        _record_events(db, [FindingEvent(
+            vulnerability.ip, vulnerability.detected_at, vulnerability.severity,
+            "fixed", 1 if status == "fixed" else -1
+        )])
+    vulnerability.status = status
+    bump_generation(db)
+
+    db.commit()
+    db.refresh(vulnerability)
+    return vulnerability
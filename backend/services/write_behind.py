@@ -0,0 +1,151 @@
+"""
+Write-behind buffer for scan results.
+
+Scans hand each device to the buffer as soon as it is found. One background
+writer thread persists them (inventory + vulnerability findings) in batches
+bounded by size and time, so a crash mid-scan keeps everything found so far
+and no single giant commit stalls other requests. A batch that fails is
+retried one device at a time, so one bad row only loses that device. The queue is bounded:
+when the database falls behind, submit() blocks and the scanner slows down.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterable, Callable
+
+from sqlalchemy.orm import Session
+
+from database.db import SessionLocal
+from services.inventory import update_inventory
+from services.vulnerability_store import upsert_vulnerabilities
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "2.0"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "500"))
+
+
+class _Barrier:
+    """Queue marker: set once every item queued before it has been written"""
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class WriteBehindBuffer:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._errors: Dict[int, Exception] = {}
+        self.stats = {"submitted": 0, "written": 0, "batches": 0, "blocked": 0, "errors": 0}
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def submit(self, scan_id: int, device: Dict[str, Any], scanned_ports: Iterable[int], seen_at: datetime):
+        """Queue one device for persistence; blocks while the queue is full"""
+        self._ensure_started()
+        item = (scan_id, device, list(scanned_ports), seen_at)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stats["blocked"] += 1
+            self._queue.put(item)
+        self.stats["submitted"] += 1
+
+    def flush(self, scan_id: Optional[int] = None, timeout: Optional[float] = None):
+        """
+        Wait until everything submitted so far is written.
+
+        Re-raises the first write error recorded for scan_id, if any.
+        """
+        self._ensure_started()
+        barrier = _Barrier()
+        self._queue.put(barrier)
+        if not barrier.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for scan results to be written")
+        if scan_id is not None and scan_id in self._errors:
+            raise self._errors.pop(scan_id)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        batch = []
+        barriers = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if isinstance(item, _Barrier):
+                    barriers.append(item)
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            if barriers or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._write(batch)
+                for barrier in barriers:
+                    barrier.done.set()
+                batch, barriers = [], []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, batch):
+        by_scan = defaultdict(list)
+        for scan_id, device, scanned_ports, seen_at in batch:
+            by_scan[(scan_id, tuple(scanned_ports), seen_at)].append(device)
+
+        for (scan_id, scanned_ports, seen_at), devices in by_scan.items():
+            try:
+                self._commit(devices, scan_id, scanned_ports, seen_at)
+            except Exception as e:
+                if len(devices) == 1:
+                    self._failed(scan_id, e)
+                    continue
+                # One bad device must not sink the rest of the group: retry them one at a time
+                logger.error(f"Write-behind batch failed for scan {scan_id}, retrying per device: {str(e)}")
+                for device in devices:
+                    try:
+                        self._commit([device], scan_id, scanned_ports, seen_at)
+                    except Exception as device_error:
+                        self._failed(scan_id, device_error, device.get("ip"))
+        self.stats["batches"] += 1
+
+    def _commit(self, devices, scan_id, scanned_ports, seen_at):
+        with self.session_factory() as db:
+            update_inventory(db, devices, scan_id, scanned_ports, seen_at)
+            upsert_vulnerabilities(db, devices, seen_at)
+            db.commit()
+        self.stats["written"] += len(devices)
+
+    def _failed(self, scan_id, error: Exception, ip: Optional[str] = None):
+        self.stats["errors"] += 1
+        self._errors.setdefault(scan_id, error)
+        where = f" (device {ip})" if ip else ""
+        logger.error(f"Write-behind failed for scan {scan_id}{where}: {str(error)}")
+
+
+# Global write-behind instance (one background writer per process)
+write_behind = WriteBehindBuffer()
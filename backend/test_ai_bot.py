@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the AI remediation service against a local stub
+/chat/completions server and a throwaway SQLite cache table
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The service's own engine is never used here; don't require a MySQL driver for it
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.models import RemediationCache
+from services.ai_bot import OpenAIBackend, RemediationService
+
+ADVICE = {"suggestion": "Disable Telnet.", "steps": ["1. Turn off Telnet", "2. Use SSH"], "priority": "critical"}
+
+
+class StubCompletions(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.requests.append(body)
+        time.sleep(0.2)  # long enough for concurrent callers to pile up
+        out = json.dumps({"choices": [{"message": {"content": json.dumps(ADVICE)}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    StubCompletions.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCompletions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+async def make_session_factory(path, create_table=True):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    if create_table:
+        async with engine.begin() as conn:
+            await conn.run_sync(RemediationCache.__table__.create)
+    return async_sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def test_concurrent_calls_coalesce_and_repeat_is_cached(stub_server, tmp_path):
+    async def scenario():
+        sessions = await make_session_factory(tmp_path / "cache.db")
+        service = RemediationService(backend=OpenAIBackend(api_key="test", base_url=stub_server),
+                                     session_factory=sessions)
+        results = await asyncio.gather(*(service.remediate("Telnet open", "IP Camera") for _ in range(5)))
+        again = await service.remediate("  telnet   OPEN ", "ip camera")
+
+        # Another worker shares the table but not the memory cache
+        other = RemediationService(backend=OpenAIBackend(api_key="test", base_url=stub_server),
+                                   session_factory=sessions)
+        stored = await other.remediate("TELNET OPEN", "IP CAMERA")
+        return results, again, stored, service, other
+
+    results, again, stored, service, other = asyncio.run(scenario())
+    assert len(StubCompletions.requests) == 1
+    assert all(result == results[0] for result in results)
+    assert results[0]["priority"] == "Critical"
+    assert again == results[0] and stored == results[0]
+    assert service.stats["backend_calls"] == 1
+    assert service._memory.stats["coalesced"] == 4 and service._memory.stats["hits"] == 1
+    assert other.stats == {"backend_calls": 0, "stored_hits": 1, "failures": 0, "store_errors": 0}
+
+
+def test_store_failure_still_returns_advice(stub_server, tmp_path):
+    async def scenario():
+        # No remediation_cache table: both the lookup and the store fail
+        sessions = await make_session_factory(tmp_path / "empty.db", create_table=False)
+        service = RemediationService(backend=OpenAIBackend(api_key="test", base_url=stub_server),
+                                     session_factory=sessions)
+        return await service.remediate("Telnet open", "IP Camera"), service
+
+    advice, service = asyncio.run(scenario())
+    assert advice["suggestion"] == ADVICE["suggestion"]
+    assert service.stats["backend_calls"] == 1 and service.stats["store_errors"] == 1
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched iptables port rules, run against a stub command runner
+that keeps the filter table in memory instead of calling iptables
+"""
+
+import pytest
+
+from services.firewall import Firewall, FirewallError, rule_spec
+
+
+class StubIptables:
+    """In-memory INPUT chain behind iptables-save / iptables-restore --noflush"""
+
+    def __init__(self, rules=None):
+        self.rules = list(rules or [])  # -A specs, in chain order
+        self.calls = []
+        self.fail_restore = False
+
+    def save(self):
+        return "\n".join(["*filter", ":INPUT ACCEPT [0:0]", *self.rules, "COMMIT"])
+
+    def __call__(self, args, input=None):
+        self.calls.append(args[0])
+        if args[0] == "iptables-save":
+            return 0, self.save(), ""
+        if self.fail_restore:
+            return 1, "", "iptables-restore: line 2 failed"
+        rules = list(self.rules)
+        for line in input.splitlines():
+            if line.startswith("-D "):
+                rules.remove("-A " + line[3:])
+            elif line.startswith("-I "):
+                rules.insert(0, "-A " + line[3:])
+        self.rules = rules
+        return 0, "", ""
+
+
+def managed(port, target, proto="tcp"):
+    return "-A " + rule_spec("INPUT", proto, port, target)
+
+
+def make_firewall(stub):
+    return Firewall(runner=stub, save_cmd="iptables-save", restore_cmd="iptables-restore --noflush", chain="INPUT")
+
+
+def test_plan_skips_rules_already_in_place():
+    stub = StubIptables([managed(22, "ACCEPT"), managed(23, "ACCEPT")])
+    fw = make_firewall(stub)
+    result = fw.apply({("tcp", 22): "ACCEPT", ("tcp", 23): "DROP"})
+    assert result["applied"]
+    assert [(r.port, r.target) for r in result["added"]] == [(23, "DROP")]
+    assert [(r.port, r.target) for r in result["removed"]] == [(23, "ACCEPT")]
+    assert stub.rules == [managed(23, "DROP"), managed(22, "ACCEPT")]
+    assert stub.calls == ["iptables-save", "iptables-restore"]
+
+
+def test_no_changes_skips_restore():
+    stub = StubIptables([managed(80, "ACCEPT")])
+    result = make_firewall(stub).apply({("tcp", 80): "ACCEPT"})
+    assert not result["applied"]
+    assert stub.calls == ["iptables-save"]
+
+
+def test_duplicates_collapse_to_one_rule():
+    stub = StubIptables([managed(554, "ACCEPT"), managed(554, "ACCEPT"), managed(554, "DROP")])
+    make_firewall(stub).apply({("tcp", 554): "DROP"})
+    assert stub.rules == [managed(554, "DROP")]
+
+
+def test_unmanaged_rules_are_left_alone():
+    other = "-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT"
+    stub = StubIptables([other])
+    fw = make_firewall(stub)
+    fw.apply({("tcp", 22): "DROP"}, replace=True)
+    assert stub.rules == [managed(22, "DROP"), other]
+    assert [r.port for r in fw.rules()] == [22]
+
+
+def test_replace_removes_unlisted_managed_rules():
+    stub = StubIptables([managed(21, "ACCEPT"), managed(80, "ACCEPT")])
+    make_firewall(stub).apply({("tcp", 80): "ACCEPT"}, replace=True)
+    assert stub.rules == [managed(80, "ACCEPT")]
+
+
+def test_dry_run_changes_nothing():
+    stub = StubIptables([managed(23, "ACCEPT")])
+    result = make_firewall(stub).apply({("tcp", 23): "DROP"}, dry_run=True)
+    assert not result["applied"]
+    assert result["script"] == "\n".join([
+        "*filter", "-D " + managed(23, "ACCEPT")[3:], "-I " + managed(23, "DROP")[3:], "COMMIT",
+    ]) + "\n"
+    assert stub.rules == [managed(23, "ACCEPT")]
+
+
+def test_apply_rereads_rules_changed_by_another_worker():
+    stub = StubIptables()
+    worker_a, worker_b = make_firewall(stub), make_firewall(stub)
+    worker_a.apply({("tcp", 23): "DROP"})
+    worker_b.apply({("tcp", 23): "ACCEPT"})
+    result = worker_a.apply({("tcp", 23): "DROP"})
+    assert result["applied"]
+    assert stub.rules == [managed(23, "DROP")]
+
+
+def test_restore_failure_drops_snapshot():
+    stub = StubIptables([managed(23, "ACCEPT")])
+    fw = make_firewall(stub)
+    fw.rules()
+    stub.fail_restore = True
+    with pytest.raises(FirewallError):
+        fw.apply({("tcp", 23): "DROP"})
+    assert stub.rules == [managed(23, "ACCEPT")]
+    assert fw._snapshot is None
+    stub.calls.clear()
+    assert [r.target for r in fw.rules()] == ["ACCEPT"]
+    assert stub.calls == ["iptables-save"]
+
+
+def test_missing_binary_is_a_firewall_error():
+    fw = Firewall(save_cmd="/nonexistent/iptables-save", restore_cmd="/nonexistent/iptables-restore")
+    with pytest.raises(FirewallError):
+        fw.apply({("tcp", 23): "DROP"})
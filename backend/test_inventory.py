@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the device inventory against a throwaway in-memory SQLite database:
+devices changing address must never trip the unique devices.ip constraint
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+# Only the test engine below is used; don't require a MySQL driver for the app's
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from database.models import Device, DeviceChange
+from services.inventory import update_inventory
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://")
+    Device.__table__.create(engine)
+    DeviceChange.__table__.create(engine)
+    return sessionmaker(bind=engine)
+
+
+def device(ip, mac=None, ports=(80,)):
+    return {
+        "ip": ip, "mac": mac, "device_type": "IP Camera", "risk_level": "Low", "status": "Active",
+        "open_ports": [{"port": port, "status": "open"} for port in ports],
+    }
+
+
+def scan(session_factory, devices, scan_id, seen_at=None):
+    with session_factory() as db:
+        update_inventory(db, devices, scan_id=scan_id, seen_at=seen_at or datetime(2026, 1, scan_id))
+        db.commit()
+
+
+def inventory(session_factory):
+    with session_factory() as db:
+        return {row.mac: row.ip for row in db.execute(select(Device)).scalars()}
+
+
+def ip_changes(session_factory, scan_id):
+    with session_factory() as db:
+        rows = db.execute(
+            select(DeviceChange).filter_by(change_type="ip_changed", scan_id=scan_id).order_by(DeviceChange.id)
+        ).scalars()
+        return [(row.old_value, row.new_value) for row in rows]
+
+
+def test_dhcp_swap_in_one_scan(session_factory):
+    scan(session_factory, [device("10.0.0.1", "aa"), device("10.0.0.2", "bb")], 1)
+    scan(session_factory, [device("10.0.0.2", "aa"), device("10.0.0.1", "bb")], 2)
+    assert inventory(session_factory) == {"aa": "10.0.0.2", "bb": "10.0.0.1"}
+    assert ip_changes(session_factory, 2) == [("10.0.0.1", "10.0.0.2"), ("10.0.0.2", "10.0.0.1")]
+
+
+def test_move_onto_address_of_macless_row_merges_it(session_factory):
+    scan(session_factory, [device("10.0.0.5", ports=(554,))], 1)
+    scan(session_factory, [device("10.0.0.1", "aa")], 2)
+    scan(session_factory, [device("10.0.0.5", "aa")], 3)
+    with session_factory() as db:
+        rows = db.execute(select(Device)).scalars().all()
+        assert [(row.mac, row.ip) for row in rows] == [("aa", "10.0.0.5")]
+        assert rows[0].open_ports == [80]
+        assert rows[0].first_seen == datetime(2026, 1, 1)
+        # The merged row's history now belongs to the surviving device
+        assert {change.device_id for change in db.execute(select(DeviceChange)).scalars()} == {rows[0].id}
+
+
+def test_move_parks_holder_until_it_reappears(session_factory):
+    scan(session_factory, [device("10.0.0.1", "aa"), device("10.0.0.2", "bb")], 1)
+    scan(session_factory, [device("10.0.0.2", "aa")], 2)
+    with session_factory() as db:
+        bb = db.execute(select(Device).filter_by(mac="bb")).scalar_one()
+        assert (bb.ip, bb.status) == (f"unassigned:{bb.id}", "Offline")
+    assert ip_changes(session_factory, 2) == [("10.0.0.1", "10.0.0.2"), ("10.0.0.2", None)]
+
+    scan(session_factory, [device("10.0.0.1", "bb")], 3)
+    assert inventory(session_factory) == {"aa": "10.0.0.2", "bb": "10.0.0.1"}
+    assert ip_changes(session_factory, 3) == [(None, "10.0.0.1")]
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for the write-behind scan persistence against a throwaway in-memory
+SQLite database: one bad device must not lose the rest of the scan
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+# Only the test engine below is used; don't require a MySQL driver for the app's
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import routers.scan
+from database.db import Base
+from database.models import Device, ScanResult
+from services.write_behind import WriteBehindBuffer
+
+
+@pytest.fixture
+def session_factory():
+    # One shared connection, so the writer thread sees the same in-memory database
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def device(ip):
+    return {"ip": ip, "mac": None, "device_type": "IP Camera", "risk_level": "Low", "status": "Active",
+            "open_ports": [{"port": 554, "status": "open"}], "vulnerabilities": []}
+
+
+def test_failed_batch_is_retried_per_device(session_factory):
+    buffer = WriteBehindBuffer(session_factory=session_factory, batch_size=10, flush_interval=60)
+    seen_at = datetime(2026, 1, 1)
+    for d in (device("10.0.0.1"), device(None), device("10.0.0.3")):  # NULL ip violates devices.ip
+        buffer.submit(1, d, [554], seen_at)
+    with pytest.raises(Exception):
+        buffer.flush(1)
+
+    with session_factory() as db:
+        assert sorted(db.execute(select(Device.ip)).scalars()) == ["10.0.0.1", "10.0.0.3"]
+    assert buffer.stats["written"] == 2 and buffer.stats["errors"] == 1
+
+
+def test_failed_scan_keeps_its_result(session_factory, monkeypatch):
+    monkeypatch.setattr(routers.scan, "write_behind", WriteBehindBuffer(session_factory=session_factory))
+    devices = [device("10.0.0.1"), device(None)]
+
+    def run_scan(on_device):
+        for d in devices:
+            on_device(d)
+        return devices
+
+    with session_factory() as db:
+        record = ScanResult(ip="auto", ports="[554]", timestamp=datetime(2026, 1, 1), scan_type="camera_scan",
+                            status="in_progress")
+        with pytest.raises(Exception):
+            routers.scan.run_persisted_scan(db, record, [554], run_scan)
+        scan_id = record.id
+
+    with session_factory() as db:
+        stored = db.get(ScanResult, scan_id)
+        assert stored.status == "failed"
+        assert stored.device_count == 2
+        assert [d["ip"] for d in stored.result] == ["10.0.0.1", None]
+        assert db.execute(select(Device.ip)).scalars().all() == ["10.0.0.1"]
@@ -35,7 +35,7 @@ export default function Dashboard() {
       const statsResponse = await axios.get("http://localhost:8000/scan/stats");
       
       // Fetch recent scan history
-      const historyResponse = await axios.get("http://localhost:8000/scan/history");
+      const historyResponse = await axios.get("http://localhost:8000/scan/history?include=devices");
       
       // Process the data
       const scanHistory = historyResponse.data || [];